@@ -1,11 +1,7 @@
+import asyncio
 import logging
-import os
 import json
-from typing import Dict, Any, List, Optional
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
-from google.cloud import aiplatform
-from google.oauth2 import service_account
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from config.settings import settings
 from models.schemas import ConversationRequest, ConversationResponse, RAGSource
@@ -15,9 +11,20 @@ from prompts.templates import (
     get_enhanced_conversation_prompt,
     get_state_explanation_prompt
 )
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
+from utils.semantic_cache import Scope, build_scope, semantic_answer_cache
 
 logger = logging.getLogger(__name__)
 
+# Generation settings for tutor answers (shared by guide and guide_stream)
+ANSWER_GENERATION_CONFIG = {
+    "temperature": 0.7,  # Balanced creativity
+    "top_p": 0.9,
+    "top_k": 40,
+    "max_output_tokens": 2048,  # Allow complete, detailed responses
+}
+
 class ConversationGuide:
     """
     Enhanced RAG-powered conversational AI tutor.
@@ -38,31 +45,19 @@ class ConversationGuide:
         Args:
             rag_retriever: Optional RAG retriever instance for NCERT content
         """
-        self.model = None
         self.rag_retriever = rag_retriever
         
-        if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-            try:
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    
-                    vertexai.init(
-                        project=settings.GCP_PROJECT_ID,
-                        location=settings.GCP_LOCATION,
-                        credentials=credentials
-                    )
-                    self.model = GenerativeModel(settings.GENERATION_MODEL)
-                    logger.info(f"✅ Enhanced Conversation Guide initialized with {settings.GENERATION_MODEL}")
-                    logger.info(f"✅ RAG integration: {'Enabled' if rag_retriever else 'Disabled'}")
-                else:
-                    logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Gemini: {e}")
+        if clients.gcp_configured:
+            logger.info(f"✅ Enhanced Conversation Guide initialized with {settings.GENERATION_MODEL}")
+            logger.info(f"✅ RAG integration: {'Enabled' if rag_retriever else 'Disabled'}")
         else:
             logger.warning("⚠️ GCP not configured - AI assistant will not function properly")
     
+    @property
+    def model(self):
+        """Shared Gemini model handle (None if Vertex AI is unavailable)."""
+        return clients.generative_model()
+    
     async def guide(self, request: ConversationRequest) -> ConversationResponse:
         """
         Provide intelligent, context-aware conversational guidance.
@@ -94,26 +89,23 @@ class ConversationGuide:
                 logger.error("❌ Gemini model not initialized")
                 return self._fallback_response()
             
+            # Step 0: Reuse the answer to the same (or a near-identical) question
+            scope = build_scope(topic, grade, subject, simulation_state)
+            cached, question_embedding = await self._find_cached_answer(request.student_input, scope)
+            if cached is not None:
+                return cached
+            
+            pipeline_mode = settings.CONVERSATION_PIPELINE_MODE
+            
             # Step 1: Check topic boundaries (moderate strictness)
-            logger.info(f"🔍 Checking boundaries for topic: {topic}")
-            boundary_check = await self._check_boundaries(
-                question=request.student_input,
-                topic=topic,
-                strictness="moderate"
+            # Step 2: Retrieve NCERT content via RAG (if available)
+            boundary_check, rag_context = await self._check_and_retrieve(
+                request.student_input, topic, grade, subject, pipeline_mode
             )
-            
             if not boundary_check["allowed"]:
                 logger.info(f"🚫 Question blocked/redirected: {boundary_check['category']}")
                 return self._redirect_response(topic, boundary_check)
             
-            # Step 2: Retrieve NCERT content via RAG (if available)
-            rag_context = await self._get_rag_context(
-                question=request.student_input,
-                topic=topic,
-                grade=grade,
-                subject=subject
-            )
-            
             logger.info(f"📚 RAG retrieval: {rag_context['count']} chunks found")
             
             # Step 3: Build intelligent prompt (seamless blending)
@@ -126,12 +118,21 @@ class ConversationGuide:
                 simulation_state=simulation_state
             )
             
-            # Step 4: Generate response from Gemini (real-time, no caching)
-            logger.info("🤖 Generating Gemini response...")
-            response_text = await self._generate_response(prompt)
-            
+            # Step 4: Generate response from Gemini
             # Step 5: Generate follow-up suggestions
-            follow_ups = await self._generate_follow_ups(response_text, topic, grade)
+            logger.info("🤖 Generating Gemini response...")
+            if pipeline_mode == "sequential":
+                response_text = await self._generate_response(prompt)
+                follow_ups = await self._generate_follow_ups(response_text, topic, grade)
+            elif pipeline_mode == "concurrent":
+                # Follow-ups are seeded from the question so they don't wait for the answer
+                response_text, follow_ups = await asyncio.gather(
+                    self._generate_response(prompt),
+                    self._generate_follow_ups(request.student_input, topic, grade, source="question")
+                )
+            else:  # "fast" - skip follow-ups entirely
+                response_text = await self._generate_response(prompt)
+                follow_ups = []
             
             # Step 6: Build enhanced response with metadata
             enhanced_response = self._build_response(
@@ -142,6 +143,7 @@ class ConversationGuide:
             )
             
             logger.info(f"✅ Response generated successfully (RAG: {enhanced_response.rag_used})")
+            self._remember_answer(scope, request.student_input, question_embedding, enhanced_response)
             
             return enhanced_response
             
@@ -150,6 +152,262 @@ class ConversationGuide:
             logger.exception("Full traceback:")
             return self._fallback_response()
     
+    async def guide_stream(self, request: ConversationRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of `guide`.
+        
+        Yields (event, data) tuples:
+        - ("token", {"text": ...}) for each answer chunk as the model produces it
+        - ("sources", {"rag_used": ..., "rag_sources": [...]}) once the answer is done
+        - ("follow_ups", {"follow_up_suggestions": [...]})
+        - ("final", ConversationResponse) - the same payload `guide` returns
+        
+        Redirects, state explanations and fallbacks are not streamed by the
+        model; their whole text is sent as a single token event.
+        
+        Args:
+            request: ConversationRequest with question, context, and simulation state
+        """
+        follow_ups_task: Optional[asyncio.Task] = None
+        try:
+            if request.mode == "state_explanation":
+                response = await self._handle_state_explanation(request)
+                yield "token", {"text": response.response}
+                yield "final", response
+                return
+            
+            logger.info(f"📝 Streaming answer to: '{request.student_input[:50]}...'")
+            
+            context = request.context or {}
+            topic = context.get("topic", "")
+            grade = context.get("grade", 10)
+            subject = context.get("subject", "science")
+            simulation_state = context.get("simulation_state", {})
+            
+            if not self.model:
+                logger.error("❌ Gemini model not initialized")
+                response = self._fallback_response()
+                yield "token", {"text": response.response}
+                yield "final", response
+                return
+            
+            scope = build_scope(topic, grade, subject, simulation_state)
+            cached, question_embedding = await self._find_cached_answer(request.student_input, scope)
+            if cached is not None:
+                yield "token", {"text": cached.response}
+                yield "sources", {
+                    "rag_used": cached.rag_used,
+                    "rag_sources": [source.model_dump() for source in cached.rag_sources or []]
+                }
+                yield "follow_ups", {"follow_up_suggestions": cached.follow_up_suggestions or []}
+                yield "final", cached
+                return
+            
+            pipeline_mode = settings.CONVERSATION_PIPELINE_MODE
+            boundary_check, rag_context = await self._check_and_retrieve(
+                request.student_input, topic, grade, subject, pipeline_mode
+            )
+            if not boundary_check["allowed"]:
+                logger.info(f"🚫 Question blocked/redirected: {boundary_check['category']}")
+                response = self._redirect_response(topic, boundary_check)
+                yield "token", {"text": response.response}
+                yield "final", response
+                return
+            
+            prompt = self._build_enhanced_prompt(
+                question=request.student_input,
+                topic=topic,
+                grade=grade,
+                subject=subject,
+                rag_context=rag_context,
+                simulation_state=simulation_state
+            )
+            
+            if pipeline_mode == "concurrent":
+                # Seeded from the question, so suggestions are ready when the answer ends
+                follow_ups_task = asyncio.create_task(
+                    self._generate_follow_ups(request.student_input, topic, grade, source="question")
+                )
+            
+            # Stream the answer as it is generated
+            parts: List[str] = []
+            stream_complete = False
+            try:
+                async for text in llm_gateway.stream(
+                    self.model,
+                    prompt,
+                    call_site="conversation_answer_stream",
+                    generation_config=ANSWER_GENERATION_CONFIG
+                ):
+                    parts.append(text)
+                    yield "token", {"text": text}
+                stream_complete = True
+            except Exception as e:
+                logger.error(f"Gemini streaming failed after {len(parts)} chunks: {e}")
+                if not parts:
+                    response = self._fallback_response()
+                    yield "token", {"text": response.response}
+                    yield "final", response
+                    return
+            
+            response_text = "".join(parts).strip()
+            
+            if follow_ups_task is not None:
+                follow_ups = await follow_ups_task
+            elif pipeline_mode == "sequential":
+                follow_ups = await self._generate_follow_ups(response_text, topic, grade)
+            else:  # "fast"
+                follow_ups = []
+            
+            response = self._build_response(
+                response_text=response_text,
+                rag_context=rag_context,
+                follow_ups=follow_ups,
+                boundary_check=boundary_check
+            )
+            
+            yield "sources", {
+                "rag_used": response.rag_used,
+                "rag_sources": [source.model_dump() for source in response.rag_sources or []]
+            }
+            yield "follow_ups", {"follow_up_suggestions": response.follow_up_suggestions or []}
+            yield "final", response
+            
+            logger.info(f"✅ Streamed response ({len(parts)} chunks, RAG: {response.rag_used})")
+            if stream_complete:
+                # A partial answer (stream cut off mid-way) is never reused
+                self._remember_answer(scope, request.student_input, question_embedding, response)
+            
+        except Exception as e:
+            logger.error(f"❌ Error in streaming conversation guide: {e}")
+            logger.exception("Full traceback:")
+            response = self._fallback_response()
+            yield "token", {"text": response.response}
+            yield "final", response
+        finally:
+            # The client may disconnect mid-answer
+            if follow_ups_task is not None and not follow_ups_task.done():
+                follow_ups_task.cancel()
+    
+    async def _find_cached_answer(
+        self,
+        question: str,
+        scope: Scope
+    ) -> Tuple[Optional[ConversationResponse], Optional[List[float]]]:
+        """
+        Look a question up in the semantic answer cache.
+        
+        The same question text is answered without an embedding call; other
+        questions are embedded and matched by similarity within the scope.
+        
+        Args:
+            question: Student's question
+            scope: Cache scope from build_scope
+            
+        Returns:
+            (cached response or None, question embedding or None) - the
+            embedding is passed to _remember_answer after a miss
+        """
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None, None
+        
+        cached = semantic_answer_cache.lookup_exact(scope, question)
+        if cached is not None:
+            logger.info("⚡ SEMANTIC CACHE HIT (same question)")
+            return ConversationResponse(**cached), None
+        
+        if not self.rag_retriever or not self.rag_retriever.embedding_provider:
+            return None, None
+        
+        try:
+            embeddings = await llm_gateway.run(
+                "conversation_embed",
+                self.rag_retriever.embed_queries,
+                [question]
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Question embedding failed, skipping semantic cache: {e}")
+            return None, None
+        
+        match = semantic_answer_cache.lookup(scope, embeddings[0])
+        if match is None:
+            return None, embeddings[0]
+        
+        cached, similarity = match
+        logger.info(f"⚡ SEMANTIC CACHE HIT (similarity {similarity:.3f})")
+        return ConversationResponse(**cached), embeddings[0]
+    
+    def _remember_answer(
+        self,
+        scope: Scope,
+        question: str,
+        embedding: Optional[List[float]],
+        response: ConversationResponse
+    ) -> None:
+        """Store a generated answer in the semantic answer cache."""
+        if embedding is None or response.action != "answer" or not response.response:
+            return
+        semantic_answer_cache.store(scope, question, embedding, response.model_dump())
+    
+    async def _check_and_retrieve(
+        self,
+        question: str,
+        topic: str,
+        grade: int,
+        subject: str,
+        pipeline_mode: str
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Run the boundary check and RAG retrieval for a question.
+        
+        In "sequential" mode RAG is skipped when the question is redirected;
+        otherwise both run at the same time and the RAG result is simply
+        dropped on a redirect.
+        
+        Args:
+            question: Student's question
+            topic: Current topic
+            grade: Grade level
+            subject: Subject area
+            pipeline_mode: CONVERSATION_PIPELINE_MODE value
+            
+        Returns:
+            (boundary_check, rag_context)
+        """
+        logger.info(f"🔍 Checking boundaries for topic: {topic} (pipeline: {pipeline_mode})")
+        if pipeline_mode == "sequential":
+            boundary_check = await self._check_boundaries(
+                question=question,
+                topic=topic,
+                strictness="moderate"
+            )
+            if not boundary_check["allowed"]:
+                return boundary_check, {"documents": [], "metadatas": [], "count": 0, "text": ""}
+            
+            rag_context = await self._get_rag_context(
+                question=question,
+                topic=topic,
+                grade=grade,
+                subject=subject
+            )
+            return boundary_check, rag_context
+        
+        # Both are independent network calls - run them at the same time.
+        boundary_check, rag_context = await asyncio.gather(
+            self._check_boundaries(
+                question=question,
+                topic=topic,
+                strictness="moderate"
+            ),
+            self._get_rag_context(
+                question=question,
+                topic=topic,
+                grade=grade,
+                subject=subject
+            )
+        )
+        return boundary_check, rag_context
+    
     async def _check_boundaries(
         self,
         question: str,
@@ -175,8 +433,10 @@ class ConversationGuide:
             if not self.model:
                 raise Exception("Model not initialized")
             
-            response = self.model.generate_content(
+            response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="conversation_boundary",
                 generation_config={
                     "temperature": 0.3,  # Lower temperature for classification
                     "max_output_tokens": 200
@@ -239,8 +499,10 @@ class ConversationGuide:
             # Build enhanced query combining question + topic
             enhanced_query = f"{topic}: {question}"
             
-            # Retrieve from vector store
-            results = self.rag_retriever.retrieve(
+            # Retrieve from vector store (off the event loop)
+            results = await llm_gateway.run(
+                "rag_retrieve",
+                self.rag_retriever.retrieve,
                 query=enhanced_query,
                 grade=None,  # Don't filter by grade for broader context
                 subject=None,  # Don't filter by subject for broader context
@@ -342,8 +604,13 @@ Grade {grade} Indian curriculum. Ensure accuracy and educational value.
     
     async def _generate_response(self, prompt: str) -> str:
         """
-        Generate response using Gemini (real-time, no caching).
-        
+        Generate response using Gemini.
+
+        Only reached on a semantic answer cache miss (checked by guide /
+        guide_stream, which store the result); the RAG context in the prompt
+        may come from the retriever's retrieval cache. The call itself is
+        not cached.
+
         Args:
             prompt: Complete prompt
             
@@ -354,16 +621,11 @@ Grade {grade} Indian curriculum. Ensure accuracy and educational value.
             if not self.model:
                 raise Exception("Model not initialized")
             
-            generation_config = {
-                "temperature": 0.7,  # Balanced creativity
-                "top_p": 0.9,
-                "top_k": 40,
-                "max_output_tokens": 2048,  # Allow complete, detailed responses
-            }
-            
-            response = self.model.generate_content(
+            response = await llm_gateway.generate(
+                self.model,
                 prompt,
-                generation_config=generation_config
+                call_site="conversation_answer",
+                generation_config=ANSWER_GENERATION_CONFIG
             )
             
             if hasattr(response, 'text'):
@@ -379,15 +641,17 @@ Grade {grade} Indian curriculum. Ensure accuracy and educational value.
         self,
         response: str,
         topic: str,
-        grade: int
+        grade: int,
+        source: str = "explanation"
     ) -> List[str]:
         """
         Generate contextual follow-up questions.
         
         Args:
-            response: The AI's response
+            response: The AI's response (or the student's question when source="question")
             topic: Current topic
             grade: Grade level
+            source: What `response` contains - "explanation" or "question"
             
         Returns:
             List of follow-up question suggestions
@@ -396,8 +660,9 @@ Grade {grade} Indian curriculum. Ensure accuracy and educational value.
             if not self.model:
                 return []
             
+            seed_label = "this student question" if source == "question" else "this explanation"
             prompt = f"""
-Based on this explanation about {topic}:
+Based on {seed_label} about {topic}:
 "{response[:200]}..."
 
 Generate 2 short follow-up questions a Grade {grade} student might ask to deepen understanding.
@@ -406,8 +671,10 @@ Format: Return ONLY the questions, one per line. No numbering, no extra text.
 Make them specific to {topic} and encourage exploration.
 """
             
-            follow_up_response = self.model.generate_content(
+            follow_up_response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="conversation_follow_ups",
                 generation_config={
                     "temperature": 0.8,
                     "max_output_tokens": 200
@@ -554,8 +821,10 @@ Make them specific to {topic} and encourage exploration.
                 "max_output_tokens": 8192, # Increased to prevent cutoff
             }
             
-            response = self.model.generate_content(
+            response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="conversation_state",
                 generation_config=generation_config
             )
             
@@ -5,17 +5,15 @@ Generates dynamic, personalized study plans using RAG + Gemini
 
 import logging
 import json
-import google.generativeai as genai
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from config.settings import settings
 from rag.retriever import RAGRetriever
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
 # NCERT Chapter Priority Database (fallback + reference)
 NCERT_PRIORITY_DATA = {
     "Physics": {
@@ -72,9 +70,13 @@ class ExamPlannerAgent:
     def __init__(self, rag_retriever):
         """Initialize the agent with RAG retriever."""
         self.rag_retriever = rag_retriever
-        self.model = genai.GenerativeModel(settings.GENERATION_MODEL)
         logger.info("✅ ExamPlannerAgent initialized")
     
+    @property
+    def model(self):
+        """Shared Gemini handle (the Gemini API is configured once per process)."""
+        return clients.genai_model()
+    
     def analyze_time_allocation(self, exam_date: str, current_date: str) -> Dict[str, Any]:
         """Calculate total days and allocate revision buffer."""
         exam = datetime.fromisoformat(exam_date.split('T')[0])
@@ -236,10 +238,13 @@ Generate the complete {study_days}-day plan now. Return ONLY the JSON array, no
 
         try:
             logger.info(f"🔮 Generating {study_days}-day plan with Gemini...")
+            import google.generativeai as genai
             
             # Generate with Gemini
-            response = self.model.generate_content(
+            response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="exam_plan",
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
                     max_output_tokens=8000,
@@ -306,6 +311,7 @@ Generate the complete {study_days}-day plan now. Return ONLY the JSON array, no
                 "day": day,
                 "date": day_date.strftime("%Y-%m-%d"),
                 "subjects": subjects,
+                "fallback": True,  # Not AI-generated: never cached
                 "rationale": f"Day {day}: Covering {', '.join([c['chapter'] for c in day_chapters])}",
                 "preview": {
                     "coreConcepts": ["Study NCERT thoroughly", "Practice examples", "Solve exercises"],
@@ -404,9 +410,12 @@ Generate complete learning kit now. Return ONLY JSON, no markdown."""
 
         try:
             logger.info("🔮 Generating learning kit with Gemini...")
+            import google.generativeai as genai
             
-            response = self.model.generate_content(
+            response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="learning_kit",
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.6,
                     max_output_tokens=6000,
@@ -425,8 +434,9 @@ Generate complete learning kit now. Return ONLY JSON, no markdown."""
         except Exception as e:
             logger.error(f"❌ Learning kit generation failed: {str(e)}")
             
-            # Fallback
+            # Fallback (not AI-generated: never cached)
             return {
+                "fallback": True,
                 "notes": f"Study NCERT chapters: {', '.join(chapters)}. Focus on theory, examples, and end-of-chapter exercises. Make notes of important definitions and formulas.",
                 "derivations": [],
                 "formulas": [],
@@ -1,17 +1,16 @@
 """
 PYQ Generator - Retrieves PYQs from RAG and generates supplementary questions with Gemini
 """
-import os
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
-from google.oauth2 import service_account
 
 from config.settings import settings
 from models.pyq_schemas import PYQQuestion, PYQRequest, PYQResponse
 from rag.retriever import RAGRetriever
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -24,27 +23,13 @@ class PYQGenerator:
     
     def __init__(self, rag_retriever: RAGRetriever):
         self.rag_retriever = rag_retriever
-        self.model = None
-        
-        # Initialize Gemini model
-        if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-            try:
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    
-                    vertexai.init(
-                        project=settings.GCP_PROJECT_ID,
-                        location=settings.GCP_LOCATION,
-                        credentials=credentials
-                    )
-                    self.model = GenerativeModel(settings.GENERATION_MODEL)
-                    logger.info("✅ PYQ Generator initialized with Gemini")
-                else:
-                    logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Gemini for PYQ generation: {e}")
+        if clients.gcp_configured:
+            logger.info("✅ PYQ Generator initialized with Gemini")
+    
+    @property
+    def model(self):
+        """Shared Gemini model handle (None if Vertex AI is unavailable)."""
+        return clients.generative_model()
     
     async def get_practice_questions(self, request: PYQRequest) -> PYQResponse:
         """
@@ -80,8 +65,9 @@ class PYQGenerator:
                     count=needed,
                     difficulty=request.difficulty
                 )
-                # Cache for future use
-                QUESTION_CACHE[cache_key] = generated_questions
+                # Cache for future use (an empty list means generation failed)
+                if generated_questions:
+                    QUESTION_CACHE[cache_key] = generated_questions
         
         # Step 3: Combine results
         all_questions = pyq_questions + generated_questions
@@ -239,8 +225,10 @@ OUTPUT FORMAT (valid JSON array):
 Generate ONLY the JSON array, no extra text."""
 
             # Call Gemini
-            response = self.model.generate_content(
+            response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="pyq_generate",
                 generation_config={
                     "temperature": 0.8,
                     "max_output_tokens": 4096,
@@ -372,20 +360,52 @@ Generate ONLY the JSON array, no extra text."""
         return None
     
     async def _enhance_pyq_answers(self, questions: List[PYQQuestion]) -> List[PYQQuestion]:
-        """Use Gemini to reframe questions and generate comprehensive answers"""
+        """
+        Use Gemini to reframe questions and generate comprehensive answers.
+        
+        Questions are enhanced concurrently (at most PYQ_ENHANCE_CONCURRENCY at a
+        time), each with a PYQ_ENHANCE_TIMEOUT budget. Questions that fail or
+        time out are returned raw, so the result is always complete and in order.
+        """
         if not self.model:
             logger.warning("⚠️ Gemini model not available, skipping answer enhancement")
             return questions
         
-        enhanced_questions = []
+        semaphore = asyncio.Semaphore(max(1, settings.PYQ_ENHANCE_CONCURRENCY))
+        timeout = settings.PYQ_ENHANCE_TIMEOUT
         
-        for question in questions:
-            try:
-                # First, reframe the question if it's messy from RAG
-                raw_question = question.question_text
-                
-                # Create prompt to clean and enhance the PYQ
-                prompt = f"""TASK: Extract and reframe a clean Previous Year Question, then provide a comprehensive NCERT-aligned answer.
+        async def enhance_bounded(question: PYQQuestion) -> Tuple[PYQQuestion, bool]:
+            async with semaphore:
+                try:
+                    enhanced = await asyncio.wait_for(self._enhance_single_pyq(question), timeout=timeout)
+                    return enhanced, enhanced is not question
+                except asyncio.TimeoutError:
+                    logger.warning(f"⏱️ PYQ enhancement timed out after {timeout:.0f}s, keeping raw question: {question.question_text[:50]}")
+                except Exception as e:
+                    logger.error(f"Error enhancing PYQ: {e}")
+                # Keep original question if enhancement fails
+                return question, False
+        
+        results = await asyncio.gather(*[enhance_bounded(q) for q in questions])
+        
+        enhanced_questions = [question for question, _ in results]
+        enhanced_count = sum(1 for _, enhanced in results if enhanced)
+        logger.info(f"✅ Enhanced {enhanced_count}/{len(enhanced_questions)} PYQ questions and answers")
+        return enhanced_questions
+    
+    async def _enhance_single_pyq(self, question: PYQQuestion) -> PYQQuestion:
+        """
+        Reframe one PYQ and generate its answer with Gemini.
+        
+        Returns:
+            Enhanced copy of the question, or the original question if the model
+            returned nothing usable
+        """
+        # First, reframe the question if it's messy from RAG
+        raw_question = question.question_text
+        
+        # Create prompt to clean and enhance the PYQ
+        prompt = f"""TASK: Extract and reframe a clean Previous Year Question, then provide a comprehensive NCERT-aligned answer.
 
 RAW TEXT FROM PDF (may be incomplete or messy):
 {raw_question[:500]}
@@ -428,81 +448,75 @@ EXPLANATION:
 
 START YOUR RESPONSE DIRECTLY WITH "QUESTION:" - NO INTRO TEXT."""
 
-                # Call Gemini
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config={
-                        "temperature": 0.7,
-                        "max_output_tokens": 2048,
-                    }
-                )
-                
-                # Parse response - handle multiple parts
-                response_text = ""
-                try:
-                    if hasattr(response, 'text') and response.text:
-                        response_text = response.text.strip()
-                    elif hasattr(response, 'candidates') and response.candidates:
-                        candidate = response.candidates[0]
-                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                            parts = candidate.content.parts
-                            text_parts = [part.text for part in parts if hasattr(part, 'text')]
-                            response_text = ''.join(text_parts).strip()
-                except (AttributeError, TypeError) as e:
-                    logger.error(f"Error extracting text: {e}")
-                    response_text = str(response).strip()
-                
-                if not response_text:
-                    logger.warning(f"Empty response for question: {raw_question[:50]}")
-                    enhanced_questions.append(question)
-                    continue
-                
-                # Clean up any conversational intros that slip through
-                intro_phrases = ["Of course!", "Here is", "Here are", "Sure!", "Certainly!"]
-                for phrase in intro_phrases:
-                    if response_text.startswith(phrase):
-                        # Find QUESTION: marker and start from there
-                        question_idx = response_text.find('QUESTION:')
-                        if question_idx > 0:
-                            response_text = response_text[question_idx:]
-                        break
-                
-                # Extract question, answer, and explanation
-                cleaned_question = question.question_text
-                enhanced_answer = None
-                enhanced_explanation = None
+        # Call Gemini
+        response = await llm_gateway.generate(
+            self.model,
+            prompt,
+            call_site="pyq_enhance",
+            generation_config={
+                "temperature": 0.7,
+                "max_output_tokens": 2048,
+            }
+        )
+        
+        # Parse response - handle multiple parts
+        response_text = ""
+        try:
+            if hasattr(response, 'text') and response.text:
+                response_text = response.text.strip()
+            elif hasattr(response, 'candidates') and response.candidates:
+                candidate = response.candidates[0]
+                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                    parts = candidate.content.parts
+                    text_parts = [part.text for part in parts if hasattr(part, 'text')]
+                    response_text = ''.join(text_parts).strip()
+        except (AttributeError, TypeError) as e:
+            logger.error(f"Error extracting text: {e}")
+            response_text = str(response).strip()
+        
+        if not response_text:
+            logger.warning(f"Empty response for question: {raw_question[:50]}")
+            return question
+        
+        # Clean up any conversational intros that slip through
+        intro_phrases = ["Of course!", "Here is", "Here are", "Sure!", "Certainly!"]
+        for phrase in intro_phrases:
+            if response_text.startswith(phrase):
+                # Find QUESTION: marker and start from there
+                question_idx = response_text.find('QUESTION:')
+                if question_idx > 0:
+                    response_text = response_text[question_idx:]
+                break
+        
+        # Extract question, answer, and explanation
+        cleaned_question = question.question_text
+        enhanced_answer = None
+        enhanced_explanation = None
+        
+        if "QUESTION:" in response_text:
+            parts = response_text.split("ANSWER:")
+            question_part = parts[0].replace("QUESTION:", "").strip()
+            if question_part:
+                cleaned_question = question_part
+            
+            if len(parts) > 1:
+                answer_parts = parts[1].split("EXPLANATION:")
+                enhanced_answer = answer_parts[0].strip()
                 
-                if "QUESTION:" in response_text:
-                    parts = response_text.split("ANSWER:")
-                    question_part = parts[0].replace("QUESTION:", "").strip()
-                    if question_part:
-                        cleaned_question = question_part
-                    
-                    if len(parts) > 1:
-                        answer_parts = parts[1].split("EXPLANATION:")
-                        enhanced_answer = answer_parts[0].strip()
-                        
-                        if len(answer_parts) > 1:
-                            enhanced_explanation = answer_parts[1].strip()
-                        else:
-                            enhanced_explanation = enhanced_answer
+                if len(answer_parts) > 1:
+                    enhanced_explanation = answer_parts[1].strip()
                 else:
-                    # Fallback if format not followed
-                    enhanced_answer = response_text
-                    enhanced_explanation = response_text
-                
-                # Update question with cleaned data
-                question.question_text = cleaned_question
-                question.answer = enhanced_answer or question.answer
-                question.answer_explanation = enhanced_explanation or enhanced_answer or question.answer
-                
-                logger.debug(f"✅ Enhanced PYQ: {cleaned_question[:60]}...")
-                
-            except Exception as e:
-                logger.error(f"Error enhancing PYQ: {e}")
-                # Keep original question if enhancement fails
-            
-            enhanced_questions.append(question)
+                    enhanced_explanation = enhanced_answer
+        else:
+            # Fallback if format not followed
+            enhanced_answer = response_text
+            enhanced_explanation = response_text
         
-        logger.info(f"✅ Enhanced {len(enhanced_questions)} PYQ questions and answers")
-        return enhanced_questions
+        logger.debug(f"✅ Enhanced PYQ: {cleaned_question[:60]}...")
+        
+        # Return an updated copy so a timed-out call never mutates the raw question
+        return question.model_copy(update={
+            "question_text": cleaned_question,
+            "answer": enhanced_answer or question.answer,
+            "answer_explanation": enhanced_explanation or enhanced_answer or question.answer,
+        })
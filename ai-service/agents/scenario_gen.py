@@ -1,19 +1,26 @@
 import json
 import logging
 import os
-from typing import Dict, Any
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
-from google.cloud import aiplatform
-from google.oauth2 import service_account
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from config.settings import settings
 from models.schemas import ScenarioRequest, ScenarioResponse
 from prompts.templates import get_scenario_prompt, DERIVATIONS_AND_FORMULAS_PROMPT
 from rag.retriever import RAGRetriever
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
+from utils.incremental_json import IncrementalObjectParser
 
 logger = logging.getLogger(__name__)
 
+# Generation settings for scenario JSON (shared by generate and generate_progressive)
+SCENARIO_GENERATION_CONFIG = {
+    "temperature": 0.7,  # Balanced creativity
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,  # Allow long responses
+}
+
 def clean_markdown_formatting(text: str) -> str:
     """
     Remove markdown symbols while preserving structure and readability.
@@ -49,11 +56,26 @@ def clean_markdown_formatting(text: str) -> str:
     return '\n'.join(cleaned_lines)
 
 
+def iter_scenario_sections(scenario: ScenarioResponse) -> List[Tuple[str, Any]]:
+    """
+    Split a finished scenario into (section name, value) pairs.
+    
+    Used to replay cached or mock scenarios through the progressive endpoint
+    with the same camelCase names Gemini's JSON uses.
+    """
+    return list(scenario.model_dump(mode="json", by_alias=True).items())
+
+
+# Returned (and never cached) when derivations could not be generated
+DERIVATIONS_UNAVAILABLE = "Derivations not available."
+
+
 async def get_formulas_and_derivations_markdown(
     topic: str,
     grade: int,
     context: str,
-    rag_retriever: RAGRetriever
+    rag_retriever: RAGRetriever,
+    model: Optional[Any] = None
 ) -> str:
     """
     Separate API call to get formulas and derivations in pure markdown format.
@@ -64,9 +86,10 @@ async def get_formulas_and_derivations_markdown(
         grade: Grade level
         context: NCERT context from RAG
         rag_retriever: RAG retriever instance for additional context if needed
+        model: Initialised Gemini model (the shared one is used if omitted)
     
     Returns:
-        Raw markdown text with formulas and derivations
+        Raw markdown text with formulas and derivations, or DERIVATIONS_UNAVAILABLE
     """
     try:
         logger.info(f"Fetching formulas and derivations in markdown for: {topic}")
@@ -74,12 +97,16 @@ async def get_formulas_and_derivations_markdown(
         # Additional RAG query specifically for formulas if context is limited
         formula_context = context
         if len(context) < 200:
-            formula_docs = await rag_retriever.retrieve(
-                query=f"{topic} formulas equations derivation proof",
+            formula_contexts = await llm_gateway.run(
+                "rag_retrieve",
+                rag_retriever.get_context_strings,
+                queries=[f"{topic} formulas equations derivation proof"],
+                grade=None,
+                subject=None,
                 top_k=3
             )
-            if formula_docs:
-                formula_context = "\n\n".join([doc.get("text", "") for doc in formula_docs])
+            if formula_contexts and formula_contexts[0]:
+                formula_context = formula_contexts[0]
         
         # Create prompt for derivations and formulas
         derivations_prompt = DERIVATIONS_AND_FORMULAS_PROMPT.format(
@@ -88,27 +115,16 @@ async def get_formulas_and_derivations_markdown(
             context=formula_context
         )
         
-        # Initialize Vertex AI if not already done
-        if not os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-            logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            return "Derivations not available - credentials error."
-        
-        credentials = service_account.Credentials.from_service_account_file(
-            settings.GOOGLE_APPLICATION_CREDENTIALS
-        )
-        
-        vertexai.init(
-            project=settings.GCP_PROJECT_ID,
-            location=settings.GCP_LOCATION,
-            credentials=credentials
-        )
-        
-        # Initialize Gemini model
-        model = GenerativeModel(settings.GENERATION_MODEL)
+        if model is None:
+            model = clients.generative_model()
+            if model is None:
+                return DERIVATIONS_UNAVAILABLE
         
         # Make API call
-        response = model.generate_content(
+        response = await llm_gateway.generate(
+            model,
             derivations_prompt,
+            call_site="derivations",
             generation_config={
                 "temperature": 0.7,
                 "max_output_tokens": 8192,  # Increased for longer derivations
@@ -117,7 +133,7 @@ async def get_formulas_and_derivations_markdown(
         
         if not response:
             logger.warning("Empty response from Gemini for derivations")
-            return "No derivations available."
+            return DERIVATIONS_UNAVAILABLE
         
         # Handle multiple content parts (Gemini sometimes splits long responses)
         try:
@@ -134,14 +150,14 @@ async def get_formulas_and_derivations_markdown(
                     markdown_content = ''.join(text_parts).strip()
                 else:
                     logger.warning("No content parts found in candidate")
-                    return "No derivations available."
+                    return DERIVATIONS_UNAVAILABLE
             else:
                 logger.warning("Unable to extract text from response")
-                return "No derivations available."
+                return DERIVATIONS_UNAVAILABLE
             
             if not markdown_content:
                 logger.warning("Empty markdown content after extraction")
-                return "No derivations available."
+                return DERIVATIONS_UNAVAILABLE
             
             # Clean up any conversational intros that might sneak through
             # Remove common intro phrases
@@ -168,11 +184,11 @@ async def get_formulas_and_derivations_markdown(
             
         except Exception as extract_error:
             logger.error(f"Error extracting text from response: {extract_error}")
-            return f"Error processing derivations: {str(extract_error)}"
+            return DERIVATIONS_UNAVAILABLE
         
     except Exception as e:
         logger.error(f"Error fetching derivations markdown: {str(e)}")
-        return f"Error generating derivations: {str(e)}"
+        return DERIVATIONS_UNAVAILABLE
 
 
 class ScenarioGenerator:
@@ -187,29 +203,16 @@ class ScenarioGenerator:
         """
         self.rag_retriever = rag_retriever
         
-        # Initialize Gemini model with explicit credentials
-        self.model = None
-        if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-            try:
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    
-                    vertexai.init(
-                        project=settings.GCP_PROJECT_ID,
-                        location=settings.GCP_LOCATION,
-                        credentials=credentials
-                    )
-                    self.model = GenerativeModel(settings.GENERATION_MODEL)
-                    logger.info(f"Gemini model initialized: {settings.GENERATION_MODEL}")
-                else:
-                    logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Gemini: {e}")
+        if clients.gcp_configured:
+            logger.info(f"Gemini model: {settings.GENERATION_MODEL}")
         else:
             logger.warning("GCP_PROJECT_ID not set - scenario generation will use mock data")
     
+    @property
+    def model(self):
+        """Shared Gemini model handle (None if Vertex AI is unavailable)."""
+        return clients.generative_model()
+    
     def _determine_simulation_type(self, topic: str, subject: str) -> str:
         """Determine best simulation type for the topic."""
         topic_lower = topic.lower()
@@ -226,122 +229,175 @@ class ScenarioGenerator:
         else:
             return "photosynthesis"  # default
     
-    async def generate(self, request: ScenarioRequest) -> ScenarioResponse:
+    async def _build_scenario_prompt(self, request: ScenarioRequest) -> str:
         """
-        Generate a complete learning scenario with rich curriculum content.
+        Retrieve NCERT context via RAG and build the scenario prompt.
         
         Args:
             request: Scenario request with grade, subject, topic, student_id
             
         Returns:
-            Complete scenario with enhanced structure
+            Complete prompt for Gemini
         """
+        # 1. Retrieve relevant NCERT content using RAG
+        # Query multiple aspects to get comprehensive context
+        queries = [
+            f"{request.topic} definition explanation",
+            f"{request.topic} process steps mechanism",
+            f"{request.topic} factors affecting",
+            f"{request.topic} importance applications",
+            f"{request.topic} formula equation mathematical expression"  # Formula extraction
+        ]
+        
+        logger.info("Retrieving NCERT content for comprehensive context...")
+        all_contexts = []
+        formula_context = ""
+        
         try:
-            logger.info(f"Generating scenario: Grade {request.grade}, {request.subject}, {request.topic}")
-            
-            # 1. Retrieve relevant NCERT content using RAG
-            # Query multiple aspects to get comprehensive context
-            queries = [
-                f"{request.topic} definition explanation",
-                f"{request.topic} process steps mechanism",
-                f"{request.topic} factors affecting",
-                f"{request.topic} importance applications",
-                f"{request.topic} formula equation mathematical expression"  # Formula extraction
-            ]
-            
-            logger.info("Retrieving NCERT content for comprehensive context...")
-            all_contexts = []
-            formula_context = ""
-            
-            for i, q in enumerate(queries):
-                try:
-                    # Don't filter by grade/subject - metadata format doesn't match
-                    # (subject stored as 'ncert-textbook-for-class-10-science-chapter-10', not 'science')
-                    ctx = self.rag_retriever.get_context_string(
-                        query=q,
-                        grade=None,
-                        subject=None,
-                        top_k=3
-                    )
-                    all_contexts.append(ctx)
-                    
-                    # Separate formula context
-                    if i == len(queries) - 1:  # Last query is for formulas
-                        formula_context = ctx
-                        logger.info(f"📐 Retrieved formula context: {len(formula_context)} characters")
-                    
-                except Exception as e:
-                    logger.warning(f"RAG query failed for '{q}': {e}")
-            
-            # Combine all contexts
-            context = "\n\n".join(all_contexts) if all_contexts else "No relevant NCERT content found."
-            logger.info(f"Retrieved total context: {len(context)} characters from {len(all_contexts)} queries")
+            # All queries share one embedding call and one vector search.
+            # Don't filter by grade/subject - metadata format doesn't match
+            # (subject stored as 'ncert-textbook-for-class-10-science-chapter-10', not 'science')
+            all_contexts = await llm_gateway.run(
+                "rag_retrieve",
+                self.rag_retriever.get_context_strings,
+                queries=queries,
+                grade=None,
+                subject=None,
+                top_k=3
+            )
             
-            # If no context available, use basic context message
-            if len(context) < 100:
-                context = f"Topic: {request.topic}\nGrade: {request.grade}\nSubject: {request.subject}\n\nNote: Limited NCERT content available. Generate a comprehensive learning experience based on curriculum standards for this topic."
+            # Separate formula context (last query is for formulas)
+            formula_context = all_contexts[-1]
+            logger.info(f"📐 Retrieved formula context: {len(formula_context)} characters")
             
-            # Add formula context note to guide Gemini
-            if len(formula_context) > 50:
-                context += f"\n\n=== FORMULAS FOUND IN NCERT ===\n{formula_context}\n=== USE ALL THESE FORMULAS IN YOUR RESPONSE ==="
-            else:
-                context += f"\n\n=== NO FORMULAS FOUND IN NCERT ===\nGenerate all relevant formulas for {request.topic} from your knowledge."
+        except Exception as e:
+            logger.warning(f"RAG queries failed for '{request.topic}': {e}")
+        
+        # Combine all contexts
+        context = "\n\n".join(all_contexts) if all_contexts else "No relevant NCERT content found."
+        logger.info(f"Retrieved total context: {len(context)} characters from {len(all_contexts)} queries")
+        
+        # If no context available, use basic context message
+        if len(context) < 100:
+            context = f"Topic: {request.topic}\nGrade: {request.grade}\nSubject: {request.subject}\n\nNote: Limited NCERT content available. Generate a comprehensive learning experience based on curriculum standards for this topic."
+        
+        # Add formula context note to guide Gemini
+        if len(formula_context) > 50:
+            context += f"\n\n=== FORMULAS FOUND IN NCERT ===\n{formula_context}\n=== USE ALL THESE FORMULAS IN YOUR RESPONSE ==="
+        else:
+            context += f"\n\n=== NO FORMULAS FOUND IN NCERT ===\nGenerate all relevant formulas for {request.topic} from your knowledge."
+        
+        # 2. Determine simulation type
+        simulation_type = self._determine_simulation_type(request.topic, request.subject)
+        logger.info(f"Simulation type: {simulation_type}")
+        
+        # 3. Build prompt
+        prompt = get_scenario_prompt(
+            grade=request.grade,
+            subject=request.subject,
+            topic=request.topic,
+            context=context,
+            difficulty=request.difficulty or "medium",
+            simulation_type=simulation_type
+        )
+        logger.info(f"📝 Prompt length: {len(prompt)} characters")
+        logger.info(f"📚 Context length: {len(context)} characters")
+        return prompt
+    
+    @staticmethod
+    def _normalize_json_text(text: str) -> str:
+        """
+        Replace characters Gemini likes to emit that break JSON parsing.
+        
+        Every replacement is per character, so this is safe to apply to
+        streamed chunks as well as to the full response.
+        """
+        # Aggressive JSON cleaning - fix all problematic characters
+        text = text.replace('"', '"').replace('"', '"')  # Smart quotes
+        text = text.replace("'", "'").replace("'", "'")  # Smart apostrophes
+        text = text.replace('…', '...')  # Ellipsis
+        text = text.replace('–', '-').replace('—', '-')  # Dashes
+        text = text.replace('′', "'").replace('″', '"')  # Prime symbols
+        text = text.replace('₂', '2').replace('₁', '1')  # Subscripts
+        text = text.replace('\u2013', '-').replace('\u2014', '-')
+        text = text.replace('\u2018', "'").replace('\u2019', "'")
+        text = text.replace('\u201c', '"').replace('\u201d', '"')
+        return text
+    
+    @staticmethod
+    def _strip_code_fences(text: str) -> str:
+        """Remove a markdown code fence wrapped around a JSON response."""
+        text = text.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.startswith("```"):
+            text = text[3:]
+        if text.endswith("```"):
+            text = text[:-3]
+        return text.strip()
+    
+    @staticmethod
+    def _scenario_id(request: ScenarioRequest) -> str:
+        """Build the scenario id for a request."""
+        return f"scn_{request.student_id}_{request.topic.replace(' ', '_')}"
+    
+    def _finalize_scenario(self, scenario_data: Dict[str, Any], request: ScenarioRequest) -> ScenarioResponse:
+        """
+        Add the scenario id, clean notes and validate parsed Gemini output.
+        
+        Args:
+            scenario_data: Parsed scenario JSON
+            request: Original scenario request
             
-            # 2. Determine simulation type
-            simulation_type = self._determine_simulation_type(request.topic, request.subject)
-            logger.info(f"Simulation type: {simulation_type}")
+        Returns:
+            Validated ScenarioResponse
+        """
+        # Add scenario_id
+        scenario_id = self._scenario_id(request)
+        scenario_data["scenario_id"] = scenario_id
+        
+        # Clean markdown formatting from notes
+        if "notes" in scenario_data and scenario_data["notes"]:
+            scenario_data["notes"] = clean_markdown_formatting(scenario_data["notes"])
+            logger.info("✨ Cleaned markdown formatting from notes")
+        
+        # Formulas/derivations are a separate resource (see generate_derivations)
+        # so the scenario does not wait for a second 8k-token call
+        
+        # Validate and create response
+        scenario_response = ScenarioResponse(**scenario_data)
+        logger.info(f"🎉 Generated REAL scenario: {scenario_id} with {len(scenario_response.quiz)} quiz questions")
+        return scenario_response
+    
+    async def generate(self, request: ScenarioRequest) -> ScenarioResponse:
+        """
+        Generate a complete learning scenario with rich curriculum content.
+        
+        Args:
+            request: Scenario request with grade, subject, topic, student_id
             
-            # 3. Build prompt
-            prompt = get_scenario_prompt(
-                grade=request.grade,
-                subject=request.subject,
-                topic=request.topic,
-                context=context,
-                difficulty=request.difficulty or "medium",
-                simulation_type=simulation_type
-            )
+        Returns:
+            Complete scenario with enhanced structure
+        """
+        try:
+            logger.info(f"Generating scenario: Grade {request.grade}, {request.subject}, {request.topic}")
             
             # 4. Call Gemini
             if self.model:
+                prompt = await self._build_scenario_prompt(request)
                 logger.info("✅ Gemini model available - calling API for scenario generation...")
-                logger.info(f"📝 Prompt length: {len(prompt)} characters")
-                logger.info(f"📚 Context length: {len(context)} characters")
-                
-                # Configure generation parameters
-                generation_config = {
-                    "temperature": 0.7,  # Balanced creativity
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "max_output_tokens": 8192,  # Allow long responses
-                }
                 
-                response = self.model.generate_content(
+                response = await llm_gateway.generate(
+                    self.model,
                     prompt,
-                    generation_config=generation_config
+                    call_site="scenario",
+                    generation_config=SCENARIO_GENERATION_CONFIG
                 )
                 response_text = response.text
                 logger.info(f"🤖 Gemini response length: {len(response_text)} characters")
                 
                 # Clean response (remove markdown if present)
-                response_text = response_text.strip()
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                if response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                response_text = response_text.strip()
-                
-                # Aggressive JSON cleaning - fix all problematic characters
-                response_text = response_text.replace('"', '"').replace('"', '"')  # Smart quotes
-                response_text = response_text.replace("'", "'").replace("'", "'")  # Smart apostrophes
-                response_text = response_text.replace('…', '...')  # Ellipsis
-                response_text = response_text.replace('–', '-').replace('—', '-')  # Dashes
-                response_text = response_text.replace('′', "'").replace('″', '"')  # Prime symbols
-                response_text = response_text.replace('₂', '2').replace('₁', '1')  # Subscripts
-                response_text = response_text.replace('\u2013', '-').replace('\u2014', '-')
-                response_text = response_text.replace('\u2018', "'").replace('\u2019', "'")
-                response_text = response_text.replace('\u201c', '"').replace('\u201d', '"')
+                response_text = self._normalize_json_text(self._strip_code_fences(response_text))
                 
                 # Parse JSON
                 try:
@@ -352,34 +408,7 @@ class ScenarioGenerator:
                     logger.error(f"Problematic section: ...{response_text[max(0, e.pos-100):e.pos+100]}...")
                     raise
                 
-                # Add scenario_id
-                scenario_id = f"scn_{request.student_id}_{request.topic.replace(' ', '_')}"
-                scenario_data["scenario_id"] = scenario_id
-                
-                # Clean markdown formatting from notes
-                if "notes" in scenario_data and scenario_data["notes"]:
-                    scenario_data["notes"] = clean_markdown_formatting(scenario_data["notes"])
-                    logger.info("✨ Cleaned markdown formatting from notes")
-                
-                # Make separate API call for formulas and derivations in markdown
-                logger.info("📐 Fetching formulas and derivations in markdown format...")
-                try:
-                    derivations_markdown = await get_formulas_and_derivations_markdown(
-                        topic=request.topic,
-                        grade=request.grade,
-                        context=context,
-                        rag_retriever=self.rag_retriever
-                    )
-                    scenario_data["formulasAndDerivationsMarkdown"] = derivations_markdown
-                    logger.info(f"✅ Added {len(derivations_markdown)} characters of derivations markdown")
-                except Exception as e:
-                    logger.error(f"Failed to fetch derivations markdown: {str(e)}")
-                    scenario_data["formulasAndDerivationsMarkdown"] = "Derivations not available."
-                
-                # Validate and create response
-                scenario_response = ScenarioResponse(**scenario_data)
-                logger.info(f"🎉 Generated REAL scenario: {scenario_id} with {len(scenario_response.quiz)} quiz questions")
-                return scenario_response
+                return self._finalize_scenario(scenario_data, request)
                 
             else:
                 # Mock response for testing without GCP
@@ -400,6 +429,129 @@ class ScenarioGenerator:
             # Return mock scenario as fallback
             return self._get_mock_scenario_response(request)
     
+    async def generate_progressive(self, request: ScenarioRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Generate a scenario, yielding each top-level section as soon as it is complete.
+        
+        Gemini's output is streamed and parsed incrementally, so the UI can
+        render the greeting and key concepts while the quiz and notes are
+        still being generated.
+        
+        Yields (event, data) tuples:
+        - ("section", {"name": "scenarioId" | "greeting" | "keyConcepts" | ..., "value": ...})
+        - ("complete", ScenarioResponse) - the same result `generate` returns
+        
+        A failure before any Gemini section went out completes with the mock
+        scenario, like `generate`. After that the error is raised instead: the
+        sections already sent can't be swapped for mock ones, and a mix of the
+        two must not be cached.
+        
+        Args:
+            request: Scenario request with grade, subject, topic, student_id
+            
+        Raises:
+            Exception: If generation fails after a Gemini section was yielded
+        """
+        logger.info(f"Generating scenario progressively: Grade {request.grade}, {request.subject}, {request.topic}")
+        
+        if not self.model:
+            logger.warning("⚠️ Gemini model NOT available - using MOCK scenario")
+            scenario_response = self._get_mock_scenario_response(request)
+            for name, value in iter_scenario_sections(scenario_response):
+                yield "section", {"name": name, "value": value}
+            yield "complete", scenario_response
+            return
+        
+        parser = IncrementalObjectParser()
+        scenario_response = None
+        sections_sent = False
+        try:
+            prompt = await self._build_scenario_prompt(request)
+            yield "section", {"name": "scenarioId", "value": self._scenario_id(request)}
+            
+            async for chunk in llm_gateway.stream(
+                self.model,
+                prompt,
+                call_site="scenario_stream",
+                generation_config=SCENARIO_GENERATION_CONFIG
+            ):
+                for name, value in parser.feed(self._normalize_json_text(chunk)):
+                    if name == "notes" and value:
+                        value = clean_markdown_formatting(value)
+                    logger.info(f"📦 Scenario section ready: {name}")
+                    sections_sent = True
+                    yield "section", {"name": name, "value": value}
+            
+            logger.info(f"🤖 Gemini streamed {len(parser.text)} characters")
+            if parser.complete and not parser.errors:
+                scenario_data = parser.result
+            else:
+                # Let the one-shot parser report (or recover from) what went wrong
+                scenario_data = json.loads(self._strip_code_fences(parser.text))
+            scenario_response = self._finalize_scenario(scenario_data, request)
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse streamed Gemini JSON: {e}")
+            logger.error(f"Response text: {parser.text[:500]}...")
+            if sections_sent:
+                raise
+        except Exception as e:
+            logger.error(f"Error generating scenario progressively: {e}")
+            logger.exception("Full traceback:")
+            if sections_sent:
+                raise
+        
+        if scenario_response is None:
+            # Return mock scenario as fallback
+            scenario_response = self._get_mock_scenario_response(request)
+        yield "complete", scenario_response
+    
+    async def generate_derivations(self, topic: str, grade: int) -> str:
+        """
+        Generate formulas and derivations markdown for a topic.
+        
+        Independent of difficulty and student, so one result can be cached per
+        (topic, grade) and shared by every scenario on that topic.
+        
+        Args:
+            topic: Topic to derive formulas for
+            grade: Grade level
+            
+        Returns:
+            Markdown with formulas and derivations, or DERIVATIONS_UNAVAILABLE
+        """
+        if not self.model:
+            logger.warning("⚠️ Gemini model NOT available - derivations unavailable")
+            return DERIVATIONS_UNAVAILABLE
+        
+        logger.info(f"📐 Generating formulas and derivations: Grade {grade}, {topic}")
+        
+        formula_context = ""
+        try:
+            contexts = await llm_gateway.run(
+                "rag_retrieve",
+                self.rag_retriever.get_context_strings,
+                queries=[
+                    f"{topic} formula equation mathematical expression",
+                    f"{topic} formulas equations derivation proof"
+                ],
+                grade=None,
+                subject=None,
+                top_k=3
+            )
+            formula_context = "\n\n".join(c for c in contexts if c)
+            logger.info(f"📐 Retrieved formula context: {len(formula_context)} characters")
+        except Exception as e:
+            logger.warning(f"Formula RAG queries failed for '{topic}': {e}")
+        
+        return await get_formulas_and_derivations_markdown(
+            topic=topic,
+            grade=grade,
+            context=formula_context,
+            rag_retriever=self.rag_retriever,
+            model=self.model
+        )
+    
     def _get_mock_scenario(self, request: ScenarioRequest) -> Dict[str, Any]:
         """Generate mock scenario for testing with enhanced structure."""
         simulation_type = self._determine_simulation_type(request.topic, request.subject)
@@ -640,4 +792,6 @@ class ScenarioGenerator:
         scenario_id = f"scn_{request.student_id}_{request.topic.replace(' ', '_')}"
         mock_data["scenario_id"] = scenario_id
         
-        return ScenarioResponse(**mock_data)
+        scenario = ScenarioResponse(**mock_data)
+        scenario._mock = True
+        return scenario
@@ -1,15 +1,11 @@
 import json
 import logging
-import os
 from typing import Dict, Any, Optional
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
-from google.cloud import vision
-from google.oauth2 import service_account
 
-from config.settings import settings
 from models.schemas import UploadAndLearnResponse
 from prompts.templates import get_upload_learn_prompt
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -17,35 +13,22 @@ class UploadLearnAgent:
     """Agent for uploading images, OCR extraction, and NCERT-based answering."""
     
     def __init__(self):
-        """Initialize OCR and Gemini clients."""
-        self.vision_client = None
-        self.model = None
-        
-        if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-            try:
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    
-                    # Initialize Vision Client
-                    self.vision_client = vision.ImageAnnotatorClient(credentials=credentials)
-                    
-                    # Initialize Vertex AI
-                    vertexai.init(
-                        project=settings.GCP_PROJECT_ID,
-                        location=settings.GCP_LOCATION,
-                        credentials=credentials
-                    )
-                    self.model = GenerativeModel(settings.GENERATION_MODEL)
-                    logger.info("UploadLearnAgent initialized with GCP clients")
-                else:
-                    logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            except Exception as e:
-                logger.error(f"Failed to initialize UploadLearnAgent clients: {e}")
+        """Initialize OCR and Gemini clients (shared, created on first use)."""
+        if clients.gcp_configured:
+            logger.info("UploadLearnAgent initialized with GCP clients")
         else:
             logger.warning("GCP credentials not fully set - UploadLearnAgent will be limited")
 
+    @property
+    def vision_client(self):
+        """Shared Cloud Vision client (None if credentials are unavailable)."""
+        return clients.vision_client()
+
+    @property
+    def model(self):
+        """Shared Gemini model handle (None if Vertex AI is unavailable)."""
+        return clients.generative_model()
+
     async def analyze_image(self, image_content: bytes) -> UploadAndLearnResponse:
         """
         Perform OCR and NCERT-based analysis on an image.
@@ -59,8 +42,14 @@ class UploadLearnAgent:
             if not self.vision_client:
                 raise Exception("Vision client not initialized")
                 
+            from google.cloud import vision
+            
             image = vision.Image(content=image_content)
-            response = self.vision_client.text_detection(image=image)
+            response = await llm_gateway.run(
+                "upload_learn_ocr",
+                self.vision_client.text_detection,
+                image=image
+            )
             
             if response.error.message:
                 raise Exception(f"Vision API Error: {response.error.message}")
@@ -89,8 +78,10 @@ class UploadLearnAgent:
             
             prompt = get_upload_learn_prompt(full_text)
             
-            ai_response = self.model.generate_content(
+            ai_response = await llm_gateway.generate(
+                self.model,
                 prompt,
+                call_site="upload_learn",
                 generation_config={
                     "temperature": 0.2, # Lower temperature for factual accuracy
                     "max_output_tokens": 2048,
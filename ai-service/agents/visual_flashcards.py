@@ -3,20 +3,25 @@ Visual Flashcard Generator Agent
 Generates image-based flashcards using RAG + Gemini
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Any
-import google.generativeai as genai
+from typing import List, Dict, Any, Optional
 from PIL import Image
 import io
 import base64
 
 from config.settings import settings
 from rag.retriever import RAGRetriever
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-genai.configure(api_key=settings.GEMINI_API_KEY)
+# Imagen model used for flashcard diagrams
+IMAGE_MODEL_NAME = "imagen-3.0-generate-001"
+
+# Gemini model used to write the image prompts
+TEXT_MODEL_NAME = "gemini-2.0-flash-exp"
 
 
 class VisualFlashcardGenerator:
@@ -24,9 +29,17 @@ class VisualFlashcardGenerator:
     
     def __init__(self, rag_retriever: RAGRetriever):
         self.rag = rag_retriever
-        self.text_model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        # Using latest Gemini for better image prompt generation
-        
+    
+    @property
+    def text_model(self):
+        """Shared Gemini handle (latest Gemini for better image prompt generation)"""
+        return clients.genai_model(TEXT_MODEL_NAME)
+    
+    @property
+    def image_model(self):
+        """Shared Imagen handle, initialised once per process (None if unavailable)"""
+        return clients.image_generation_model(IMAGE_MODEL_NAME)
+    
     async def generate_flashcards(
         self,
         grade: int,
@@ -62,23 +75,31 @@ class VisualFlashcardGenerator:
             concepts = await self._generate_concepts(grade, subject, topic, rag_context)
             logger.info(f"   ✅ Generated {len(concepts)} concepts")
             
-            # Step 3: Generate images for each concept
+            # Step 3: Generate images for all concepts concurrently
             logger.info(f"\n🖼️  Step 3: Generating images for {len(concepts)} concepts...")
-            flashcards = []
-            for i, concept in enumerate(concepts, 1):
-                try:
-                    logger.info(f"   🖼️  [{i}/{len(concepts)}] Generating image for: {concept['name']}")
-                    image_base64 = await self._generate_image(concept, grade, subject, topic)
-                    flashcards.append({
-                        "name": concept["name"],
-                        "image_base64": image_base64
-                    })
-                    logger.info(f"   ✅ [{i}/{len(concepts)}] Successfully generated: {concept['name']}")
-                except Exception as e:
-                    logger.error(f"   ❌ [{i}/{len(concepts)}] Failed to generate image for {concept['name']}: {e}")
-                    import traceback
-                    logger.error(f"   Stack trace:\n{traceback.format_exc()}")
-                    # Continue with other flashcards
+            semaphore = asyncio.Semaphore(max(1, settings.FLASHCARD_IMAGE_CONCURRENCY))
+            
+            async def render(i: int, concept: Dict[str, str]) -> Optional[Dict[str, Any]]:
+                async with semaphore:
+                    try:
+                        logger.info(f"   🖼️  [{i}/{len(concepts)}] Generating image for: {concept['name']}")
+                        image_base64 = await self._generate_image(concept, grade, subject, topic)
+                        logger.info(f"   ✅ [{i}/{len(concepts)}] Successfully generated: {concept['name']}")
+                        return {
+                            "name": concept["name"],
+                            "image_base64": image_base64
+                        }
+                    except Exception as e:
+                        logger.error(f"   ❌ [{i}/{len(concepts)}] Failed to generate image for {concept['name']}: {e}")
+                        import traceback
+                        logger.error(f"   Stack trace:\n{traceback.format_exc()}")
+                        # Continue with other flashcards
+                        return None
+            
+            results = await asyncio.gather(*[
+                render(i, concept) for i, concept in enumerate(concepts, 1)
+            ])
+            flashcards = [card for card in results if card is not None]
                     
             logger.info(f"\n{'='*60}")
             logger.info(f"🎉 GENERATION COMPLETE: {len(flashcards)}/{len(concepts)} flashcards")
@@ -156,7 +177,11 @@ DO NOT include: text explanations, formulas, or non-visual content.
 """
 
         try:
-            response = self.text_model.generate_content(prompt)
+            response = await llm_gateway.generate(
+                self.text_model,
+                prompt,
+                call_site="flashcard_concepts"
+            )
             response_text = response.text.strip()
             
             # Extract JSON from markdown code blocks if present
@@ -240,21 +265,14 @@ AVOID:
         try:
             # Use Vertex AI Imagen (Google Cloud) for real image generation
             try:
-                from google.cloud import aiplatform
-                from vertexai.preview.vision_models import ImageGenerationModel
+                if self.image_model is None:
+                    return self._generate_placeholder_image(concept["name"])
                 
                 logger.info(f"   🎨 Generating Vertex AI Imagen image for: {concept['name']}")
                 
-                # Initialize Vertex AI
-                aiplatform.init(
-                    project=settings.GCP_PROJECT_ID,
-                    location=settings.GCP_LOCATION
-                )
-                
-                # Use latest Imagen model with better quality
-                model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-001")
-                
-                images = model.generate_images(
+                images = await llm_gateway.run(
+                    "flashcard_image",
+                    self.image_model.generate_images,
                     prompt=image_prompt,
                     number_of_images=1,
                     aspect_ratio="16:9",  # Better for educational diagrams
@@ -272,7 +290,6 @@ AVOID:
                 
             except Exception as e:
                 logger.warning(f"   ⚠️ Vertex AI Imagen failed ({e}), using placeholder")
-                logger.warning(f"   Make sure google-cloud-aiplatform is installed: pip install google-cloud-aiplatform")
                 return self._generate_placeholder_image(concept["name"])
                 
         except Exception as e:
@@ -34,8 +34,10 @@ load_dotenv()
 # Add ai-service to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from config.settings import settings
 from rag.retriever import RAGRetriever
 from rag.pdf_processor import PDFProcessor
+from rag.mmap_store import export_mmap_index
 
 def build_vector_database_offline(
     ncert_pdf_directory: str = "./ncert_pdfs", 
@@ -55,8 +57,10 @@ def build_vector_database_offline(
         logger.info("🚀 OFFLINE CHROMADB BUILDER")
         logger.info("=" * 80)
         
-        # Verify environment variables
+        # Verify environment variables (local embeddings need no GCP access)
         required_vars = ["GCP_PROJECT_ID", "GOOGLE_APPLICATION_CREDENTIALS"]
+        if os.getenv("EMBEDDING_PROVIDER", "vertex").lower() == "local":
+            required_vars = []
         missing = [v for v in required_vars if not os.getenv(v)]
         if missing:
             logger.error(f"❌ Missing environment variables: {missing}")
@@ -181,6 +185,22 @@ def build_vector_database_offline(
         logger.info(f"✅ Successful PDFs: {successful_pdfs}/{len(all_pdf_files)}")
         logger.info(f"📦 Total chunks: {total_chunks}")
         
+        # Ship the BM25 index with the database (chroma_db/*.bm25.json.gz)
+        rag.save_lexical_index()
+        
+        # And the memory-mapped export (VECTOR_STORE_BACKEND=mmap)
+        try:
+            collection_name = rag.vector_store.collection.name
+            export_mmap_index(
+                rag.vector_store,
+                str(Path(settings.VECTOR_INDEX_DIR) / collection_name),
+                dtype=settings.VECTOR_INDEX_DTYPE,
+                embedding_model=rag.embedding_provider.name if rag.embedding_provider else None,
+                quantization=settings.VECTOR_INDEX_QUANTIZATION
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Memory-mapped index export failed: {e} (run python export_vector_index.py)")
+        
         # Get vector store stats
         stats = rag.get_stats()
         logger.info(f"🗂️  Subjects: {stats.get('subjects', [])}")
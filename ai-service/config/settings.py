@@ -24,9 +24,22 @@ class Settings(BaseSettings):
     # Vector Database
     CHROMA_PERSIST_DIR: str = "./chroma_db"
     VECTOR_COLLECTION_NAME: str = "ncert_textbooks"
+    # "chroma", or "mmap" to serve the read-only NumPy export of the collection
+    # (python export_vector_index.py) - far less memory on the 512MB tier
+    VECTOR_STORE_BACKEND: str = "chroma"
+    VECTOR_INDEX_DIR: str = "./chroma_db/vector_index"  # Shipped inside chroma_db/
+    VECTOR_INDEX_DTYPE: str = "float32"  # Exact vectors ("float16" halves them)
+    # Compressed copy scanned first: "int8" (1/4 of float32), "float16" or "none";
+    # the top_k * VECTOR_INDEX_RESCORE_FACTOR candidates are re-scored exactly
+    VECTOR_INDEX_QUANTIZATION: str = "int8"
+    VECTOR_INDEX_RESCORE_FACTOR: int = 4
     
     # AI Model Configuration
     EMBEDDING_MODEL: str = "textembedding-gecko@003"
+    # Embedding provider: "vertex" (EMBEDDING_MODEL), "local" (CPU hashing
+    # embeddings, no network) or "auto" (Vertex if configured, else local)
+    EMBEDDING_PROVIDER: str = "vertex"
+    LOCAL_EMBEDDING_DIMENSIONS: int = 768
     GENERATION_MODEL: str = "gemini-1.5-flash"
     GEMINI_API_KEY: str = ""  # Get from https://aistudio.google.com/
     
@@ -34,6 +47,54 @@ class Settings(BaseSettings):
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     TOP_K_RESULTS: int = 5
+    # Retrieval: "vector" (embeddings only), "hybrid" (embeddings + BM25 keyword
+    # index, fused by reciprocal rank) or "lexical" (BM25 only, no embedding call)
+    RETRIEVAL_MODE: str = "hybrid"
+    HYBRID_CANDIDATES_FACTOR: int = 3  # Each side of a hybrid search returns top_k * this
+    RRF_K: int = 60  # Reciprocal rank fusion damping
+    EMBEDDING_CACHE_PATH: str = "./.embedding_cache/embeddings.sqlite3"  # Empty to disable
+    RETRIEVAL_CACHE_SIZE: int = 2048  # Cached searches per worker (~5 KB each at top_k=5)
+    RETRIEVAL_CACHE_TTL: int = 600  # Seconds; bounds staleness after another worker's writes
+    
+    # Bulk embedding (ingestion / offline ChromaDB builds)
+    EMBEDDING_BATCH_MAX_ITEMS: int = 250  # Texts per request (Vertex text-embedding limit)
+    EMBEDDING_BATCH_MAX_TOKENS: int = 20000  # Estimated tokens per request
+    EMBEDDING_CONCURRENCY: int = 4  # Requests in flight
+    EMBEDDING_REQUESTS_PER_SECOND: float = 2.0  # Starting rate, adapted on quota errors (AIMD)
+    EMBEDDING_MAX_REQUESTS_PER_SECOND: float = 10.0
+    
+    # LLM Gateway (async wrapper around blocking model calls)
+    LLM_MAX_WORKERS: int = 16  # Threads shared by all model calls
+    LLM_DEFAULT_CONCURRENCY: int = 8  # Per call site, unless overridden
+    LLM_DEFAULT_TIMEOUT: float = 90.0  # Seconds
+    
+    # Conversation pipeline: "sequential" (boundary -> RAG -> answer -> follow-ups),
+    # "concurrent" (boundary || RAG, then answer || follow-ups) or
+    # "fast" (boundary || RAG, then answer, no follow-ups)
+    CONVERSATION_PIPELINE_MODE: str = "concurrent"
+    
+    # PYQ answer enhancement (one Gemini call per question, run concurrently)
+    PYQ_ENHANCE_CONCURRENCY: int = 5  # Max questions enhanced at once per request
+    PYQ_ENHANCE_TIMEOUT: float = 30.0  # Seconds per question before it is returned raw
+    
+    # AI response cache
+    AI_CACHE_MEMORY_MB: int = 64  # In-process tier per worker (container has 512 MB)
+    
+    # Semantic answer cache for conversation questions (per worker)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Min cosine similarity to reuse an answer
+    SEMANTIC_CACHE_TTL: int = 24 * 3600  # Seconds
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000  # ~3 KB of float32 embedding each (gecko: 768 dims)
+    SEMANTIC_CACHE_MAX_PER_TOPIC: int = 200
+    
+    # Startup: the index is opened and warmed in the background; until then
+    # API requests get 503 with this Retry-After (seconds). Canonical queries
+    # run during warm-up (comma-separated; empty to only page the index in)
+    READINESS_RETRY_AFTER: int = 5
+    WARMUP_QUERIES: str = "photosynthesis,Ohm's law and electric current,chemical reactions and equations,laws of motion"
+    
+    # Visual flashcards
+    FLASHCARD_IMAGE_CONCURRENCY: int = 5  # Max Imagen calls in flight per flashcard set
     
     # CORS
     BACKEND_BASE_URL: str = "https://ed-techyx.onrender.com"
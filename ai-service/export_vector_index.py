@@ -0,0 +1,170 @@
+"""
+Export the ChromaDB collection as a memory-mapped NumPy index
+
+Production only reads the vector store, so it does not need Chroma's
+SQLite + HNSW stack in memory. This script writes the collection's
+embeddings as one contiguous float16/float32 matrix plus columnar metadata,
+which the service memory-maps when VECTOR_STORE_BACKEND=mmap.
+
+USAGE:
+1. Build (or download) ./chroma_db/ as usual (python build_chromadb_offline.py
+   runs this export at the end)
+2. Run: python export_vector_index.py
+   (python export_vector_index.py --report compares the first-pass settings)
+3. Upload chroma_db/ to GCS - the index is in chroma_db/vector_index/
+4. Set VECTOR_STORE_BACKEND=mmap in Render and redeploy
+"""
+
+import sys
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Add ai-service to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.settings import settings
+from rag.mmap_store import export_mmap_index, recall_report, write_first_pass
+from rag.vector_store import VectorStore
+
+def export_vector_index(
+    collection_name: str,
+    output_dir: str,
+    dtype: str,
+    embedding_model: str,
+    quantization: str
+) -> bool:
+    """
+    Export a Chroma collection for the memory-mapped backend.
+
+    Args:
+        collection_name: Chroma collection to export
+        output_dir: Index directory (VECTOR_INDEX_DIR/<collection>)
+        dtype: "float16" or "float32"
+        embedding_model: Embedding model the collection was built with
+        quantization: First-pass copy: "int8", "float16" or "none"
+
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        logger.info(f"📤 Exporting collection '{collection_name}' to {output_dir} ({dtype}, first pass: {quantization})")
+        vector_store = VectorStore(collection_name)
+        manifest = export_mmap_index(
+            vector_store, output_dir, dtype=dtype, embedding_model=embedding_model, quantization=quantization
+        )
+
+        size = sum(f.stat().st_size for f in Path(output_dir).iterdir())
+        logger.info(f"✅ {manifest['count']} chunks, {manifest['dimensions']} dims, {size / 1024 / 1024:.1f} MB on disk")
+        logger.info("💡 Serve it with VECTOR_STORE_BACKEND=mmap")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Export failed: {e}")
+        logger.exception("Traceback:")
+        return False
+
+def print_recall_report(output_dir: str, top_k: int) -> bool:
+    """
+    Log recall vs memory of the first-pass settings for an exported index.
+
+    Args:
+        output_dir: Index directory
+        top_k: Results per query
+
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        logger.info(f"📊 Recall@{top_k} vs exact float32 search ({output_dir})")
+        logger.info(f"{'first pass':<12}{'rescore':>9}{'MB':>9}{'bytes/vec':>11}{'recall':>9}")
+        for row in recall_report(output_dir, top_k=top_k):
+            rescore = f"{row['rescore_factor']}x" if row["rescore_factor"] > 1 else "-"
+            logger.info(f"{row['first_pass']:<12}{rescore:>9}{row['first_pass_mb']:>9}"
+                        f"{row['bytes_per_vector']:>11}{row[f'recall@{top_k}']:>9.3f}")
+        logger.info(f"💡 Serving uses VECTOR_INDEX_QUANTIZATION / VECTOR_INDEX_RESCORE_FACTOR "
+                    f"(now {settings.VECTOR_INDEX_QUANTIZATION}, {settings.VECTOR_INDEX_RESCORE_FACTOR}x)")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Report failed: {e}")
+        logger.exception("Traceback:")
+        return False
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export ChromaDB as a memory-mapped NumPy vector index")
+    parser.add_argument(
+        "--collection",
+        default=settings.VECTOR_COLLECTION_NAME,
+        help=f"Collection to export (default: {settings.VECTOR_COLLECTION_NAME})"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help=f"Index directory (default: {settings.VECTOR_INDEX_DIR}/<collection>)"
+    )
+    parser.add_argument(
+        "--dtype",
+        default=settings.VECTOR_INDEX_DTYPE,
+        choices=["float16", "float32"],
+        help=f"Precision of the exact vectors (default: {settings.VECTOR_INDEX_DTYPE})"
+    )
+    parser.add_argument(
+        "--quantization",
+        default=settings.VECTOR_INDEX_QUANTIZATION,
+        choices=["int8", "float16", "none"],
+        help=f"Compressed first-pass copy (default: {settings.VECTOR_INDEX_QUANTIZATION})"
+    )
+    parser.add_argument(
+        "--requantize",
+        action="store_true",
+        help="Only rewrite the first-pass copy of an existing export (no ChromaDB needed)"
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Only print the recall vs memory report for an existing export"
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=settings.TOP_K_RESULTS,
+        help=f"Results per query in the report (default: {settings.TOP_K_RESULTS})"
+    )
+    parser.add_argument(
+        "--embedding-model",
+        default=settings.EMBEDDING_MODEL,
+        help=f"Embedding model the collection was built with (default: {settings.EMBEDDING_MODEL})"
+    )
+
+    args = parser.parse_args()
+    output_dir = args.output_dir or str(Path(settings.VECTOR_INDEX_DIR) / args.collection)
+
+    if args.report:
+        success = print_recall_report(output_dir, args.top_k)
+    elif args.requantize:
+        write_first_pass(output_dir, args.quantization)
+        success = True
+    else:
+        success = export_vector_index(
+            args.collection, output_dir, args.dtype, args.embedding_model, args.quantization
+        )
+
+    if success:
+        logger.info("🎉 SUCCESS!")
+        sys.exit(0)
+    else:
+        logger.error("💥 FAILED!")
+        sys.exit(1)
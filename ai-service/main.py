@@ -3,18 +3,23 @@ AI Service for EdTech Platform
 Provides AI-powered scenario generation, conversational guidance, and RAG-based content retrieval.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+# First, so the profile's clock starts before the other imports
+from utils.startup_profile import startup_profile
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
+import signal
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Set, Tuple
 from datetime import datetime
-import uvicorn
 
 from config.settings import settings
 from models.schemas import (
     ScenarioRequest, ScenarioResponse,
+    DerivationsRequest, DerivationsResponse,
     ConversationRequest, ConversationResponse,
     QuizRequest, QuizResponse,
     UploadAndLearnResponse,
@@ -23,20 +28,29 @@ from models.schemas import (
 )
 from models.pyq_schemas import PYQRequest, PYQResponse
 from rag.retriever import RAGRetriever
-from rag.pdf_processor import process_ncert_directory
-from agents.scenario_gen import ScenarioGenerator
+from agents.scenario_gen import ScenarioGenerator, DERIVATIONS_UNAVAILABLE, iter_scenario_sections
 from agents.conversation import ConversationGuide
 from agents.pyq_generator import PYQGenerator
 from agents.upload_learn_agent import UploadLearnAgent
-from agents.exam_planner import ExamPlannerAgent
-from utils.pyq_ingestion import ingest_all_pyqs
+from agents.exam_planner import ExamPlannerAgent, NCERT_PRIORITY_DATA
 from utils.tts_service import tts_service
-from utils.ai_response_cache import build_cache_key, get_from_cache, set_cache
+from utils.ai_response_cache import (
+    build_cache_key, get_from_cache, get_or_generate, get_or_generate_json, get_cache_stats
+)
+from utils.json_bytes import add_json_field, json_bytes_response
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
+from utils.readiness import readiness
+from utils.semantic_cache import semantic_answer_cache
+from utils.topic_catalog import topic_catalog
+from utils.streaming import sse_response
 from utils.gcs_pdf_manager import download_pdfs_from_gcs
 from utils.chromadb_downloader import download_chromadb_from_gcs, chromadb_exists_locally
 from fastapi.responses import FileResponse, Response
 import os
 
+startup_profile.mark("imports")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -51,6 +65,23 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Served while the worker is still starting (liveness, readiness, docs)
+READINESS_EXEMPT_PATHS = {"/", "/health", "/ready", "/docs", "/redoc", "/openapi.json", "/api/startup/stats"}
+
+# Registered before CORS so CORS wraps it (503s still carry CORS headers)
+@app.middleware("http")
+async def readiness_gate(request: Request, call_next):
+    """Answer requests with a fast 503 + Retry-After until startup has finished."""
+    if readiness.ready or request.url.path in READINESS_EXEMPT_PATHS:
+        return await call_next(request)
+    
+    detail = "Service failed to start" if readiness.stage == "failed" else "Service is starting, retry shortly"
+    return JSONResponse(
+        status_code=503,
+        content={"detail": detail, **readiness.get_status()},
+        headers={"Retry-After": str(settings.READINESS_RETRY_AFTER)}
+    )
+
 # CORS middleware
 allowed_origins = [
     settings.BACKEND_BASE_URL,
@@ -86,59 +117,90 @@ conversation_guide: Optional[ConversationGuide] = None
 pyq_generator: Optional[PYQGenerator] = None
 exam_planner: Optional[ExamPlannerAgent] = None
 
+# Fire-and-forget tasks (derivations prefetch, detached generations); kept
+# here so they are not garbage collected before they finish
+background_tasks: Set[asyncio.Task] = set()
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on startup."""
-    global rag_retriever, scenario_generator, conversation_guide, pyq_generator, upload_learn_agent, exam_planner
+    """
+    Start the service in stages.
     
+    Only cheap setup runs here, so the worker is live (GET /health) at once.
+    The index download/open, agents and warm-up run in the background;
+    GET /ready reports when they are done.
+    """
     logger.info("Starting AI Service...")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"GCP Project: {settings.GCP_PROJECT_ID or 'Not configured'}")
     
-    try:
-        # ===================================================================
-        # OPTION 1: Download Pre-Built ChromaDB from GCS (RECOMMENDED)
-        # ===================================================================
-        gcs_chromadb_path = os.getenv("GCS_CHROMADB_PATH")  # e.g., "chroma_db"
-        gcs_bucket = os.getenv("GCS_BUCKET_NAME")
-        
-        if gcs_bucket and gcs_chromadb_path:
-            logger.info("📦 GCS ChromaDB configured - checking for pre-built database...")
+    # Canonical topics for cache keys (extended with vector store chapters below)
+    topic_catalog.add_priority_data(NCERT_PRIORITY_DATA)
+    
+    run_in_background(initialize_services())
+
+def download_index():
+    """Download the pre-built ChromaDB (or the PDFs) from GCS, if configured."""
+    # ===================================================================
+    # OPTION 1: Download Pre-Built ChromaDB from GCS (RECOMMENDED)
+    # ===================================================================
+    gcs_chromadb_path = os.getenv("GCS_CHROMADB_PATH")  # e.g., "chroma_db"
+    gcs_bucket = os.getenv("GCS_BUCKET_NAME")
+    
+    if gcs_bucket and gcs_chromadb_path:
+        logger.info("📦 GCS ChromaDB configured - checking for pre-built database...")
+        
+        if not chromadb_exists_locally("./chroma_db"):
+            logger.info("🔄 Downloading pre-built ChromaDB from GCS...")
+            chromadb_success = download_chromadb_from_gcs(
+                bucket_name=gcs_bucket,
+                remote_path=gcs_chromadb_path,
+                local_path="./chroma_db"
+            )
             
-            if not chromadb_exists_locally("./chroma_db"):
-                logger.info("🔄 Downloading pre-built ChromaDB from GCS...")
-                chromadb_success = download_chromadb_from_gcs(
-                    bucket_name=gcs_bucket,
-                    remote_path=gcs_chromadb_path,
-                    local_path="./chroma_db"
-                )
-                
-                if chromadb_success:
-                    logger.info("✅ ChromaDB downloaded successfully!")
-                else:
-                    logger.warning("⚠️  ChromaDB download failed - will initialize empty database")
-            else:
-                logger.info("✅ ChromaDB already exists locally, skipping download")
-        
-        # ===================================================================
-        # OPTION 2: Download PDFs Only (for manual processing - NOT RECOMMENDED)
-        # ===================================================================
-        elif gcs_bucket:
-            logger.info(f"📦 GCS Bucket configured: {gcs_bucket}")
-            logger.warning("⚠️  GCS_CHROMADB_PATH not set - PDF processing will fail on 512MB tier")
-            logger.warning("💡 Build ChromaDB offline instead: python build_chromadb_offline.py")
-            pdf_success = download_pdfs_from_gcs(gcs_bucket)
-            if pdf_success:
-                logger.info("✅ PDFs downloaded (but processing not recommended)")
+            if chromadb_success:
+                logger.info("✅ ChromaDB downloaded successfully!")
             else:
-                logger.warning("⚠️ Failed to download PDFs from GCS")
+                logger.warning("⚠️  ChromaDB download failed - will initialize empty database")
         else:
-            logger.info("💡 GCS_BUCKET_NAME not set, skipping downloads")
+            logger.info("✅ ChromaDB already exists locally, skipping download")
+    
+    # ===================================================================
+    # OPTION 2: Download PDFs Only (for manual processing - NOT RECOMMENDED)
+    # ===================================================================
+    elif gcs_bucket:
+        logger.info(f"📦 GCS Bucket configured: {gcs_bucket}")
+        logger.warning("⚠️  GCS_CHROMADB_PATH not set - PDF processing will fail on 512MB tier")
+        logger.warning("💡 Build ChromaDB offline instead: python build_chromadb_offline.py")
+        pdf_success = download_pdfs_from_gcs(gcs_bucket)
+        if pdf_success:
+            logger.info("✅ PDFs downloaded (but processing not recommended)")
+        else:
+            logger.warning("⚠️ Failed to download PDFs from GCS")
+    else:
+        logger.info("💡 GCS_BUCKET_NAME not set, skipping downloads")
+
+async def initialize_services():
+    """
+    Download and open the index, build the agents and warm up, then mark the worker ready.
+    
+    With GCP configured a failure shuts the worker down, so the platform restarts it.
+    """
+    global rag_retriever, scenario_generator, conversation_guide, pyq_generator, upload_learn_agent, exam_planner
+    
+    loop = asyncio.get_running_loop()
+    
+    try:
+        readiness.set_stage("downloading_index")
+        with startup_profile.phase("gcs_download"):
+            await loop.run_in_executor(None, download_index)
         
         # Initialize RAG retriever (uses local ChromaDB)
-        rag_retriever = RAGRetriever()
-        logger.info("RAG retriever initialized")
-        
+        readiness.set_stage("opening_index")
+        with startup_profile.phase("rag_retriever"):
+            rag_retriever = await loop.run_in_executor(None, RAGRetriever)
+            logger.info("RAG retriever initialized")
+            
         # Check vector store status
         stats = rag_retriever.get_stats()
         logger.info(f"📊 Vector store stats: {stats}")
@@ -154,27 +216,47 @@ async def startup_event():
         else:
             logger.info(f"✅ Vector store ready with {stats['total_documents']} documents")
         
+        # Chapter metadata of the indexed NCERT books, for canonical cache keys
+        with startup_profile.phase("topic_catalog"):
+            try:
+                await loop.run_in_executor(None, topic_catalog.add_from_vector_store, rag_retriever.vector_store)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read chapter metadata for the topic catalog: {e}")
+        logger.info(f"📚 Topic catalog: {len(topic_catalog.chapters)} chapters")
+        
         # Initialize agents
-        scenario_generator = ScenarioGenerator(rag_retriever)
-        conversation_guide = ConversationGuide(rag_retriever)  # Pass RAG to conversation guide
-        pyq_generator = PYQGenerator(rag_retriever)  # Initialize PYQ generator
-        upload_learn_agent = UploadLearnAgent() # Initialize OCR agent
-        conversation_guide = ConversationGuide(rag_retriever)
-        pyq_generator = PYQGenerator(rag_retriever)
-        exam_planner = ExamPlannerAgent(rag_retriever)
+        readiness.set_stage("initializing_agents")
+        with startup_profile.phase("clients"):
+            await loop.run_in_executor(None, clients.warm_up)
+        with startup_profile.phase("agents"):
+            scenario_generator = ScenarioGenerator(rag_retriever)
+            conversation_guide = ConversationGuide(rag_retriever)  # Pass RAG to conversation guide
+            pyq_generator = PYQGenerator(rag_retriever)  # Initialize PYQ generator
+            upload_learn_agent = UploadLearnAgent() # Initialize OCR agent
+            exam_planner = ExamPlannerAgent(rag_retriever)
         
         logger.info("All agents initialized successfully")
         
-        # Check final vector store status
-        stats = rag_retriever.get_stats()
-        logger.info(f"Vector store stats: {stats}")
+        # Page the index in and run a few canonical queries before taking traffic
+        readiness.set_stage("warming_up")
+        if stats["total_documents"] > 0:
+            warmup_queries = [query.strip() for query in settings.WARMUP_QUERIES.split(",") if query.strip()]
+            with startup_profile.phase("warm_up"):
+                await loop.run_in_executor(None, rag_retriever.warm_up, warmup_queries)
         
     except Exception as e:
         logger.error(f"Error during startup: {e}")
         if settings.GCP_PROJECT_ID:
-            raise
+            readiness.mark_failed(str(e))
+            # Shut down so the platform restarts the worker instead of it answering 503 forever
+            logger.error("❌ Startup failed - shutting down")
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
         else:
             logger.warning("Continuing with mock mode (GCP not configured)")
+    
+    readiness.mark_ready()
+    startup_profile.mark_ready()
 
 # Helper function for lazy PDF processing
 def ensure_pdfs_processed():
@@ -190,6 +272,7 @@ def ensure_pdfs_processed():
     if ncert_dir.exists() and list(ncert_dir.rglob("*.pdf")):
         logger.info("🔄 Lazy-loading PDFs on first request...")
         try:
+            from rag.pdf_processor import process_ncert_directory
             process_ncert_directory(str(ncert_dir))
             logger.info("✅ PDFs processed successfully")
             return True
@@ -211,24 +294,110 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Liveness check: 200 as soon as the worker is up, ready or not (see /ready); 503 once startup has failed."""
     stats = {}
     
     if rag_retriever:
         stats = rag_retriever.get_stats()
     
+    if readiness.stage == "failed":
+        return JSONResponse(status_code=503, content=readiness.get_status())
+    
     return {
         "status": "healthy",
+        "ready": readiness.ready,
+        "stage": readiness.stage,
         "vector_store": stats,
         "gcp_configured": bool(settings.GCP_PROJECT_ID)
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once the index is open and warm, 503 (with Retry-After) until then."""
+    status = readiness.get_status()
+    if readiness.ready:
+        return status
+    return JSONResponse(
+        status_code=503,
+        content=status,
+        headers={"Retry-After": str(settings.READINESS_RETRY_AFTER)}
+    )
+
+def _derivations_cache_key(topic: str, grade: int) -> str:
+    """Derivations are shared across difficulties and students: key on (topic, grade) only."""
+    return build_cache_key(endpoint="derivations", grade=grade, topic=topic)
+
+
+def get_cached_derivations(topic: str, grade: int) -> Optional[DerivationsResponse]:
+    """Get derivations for a topic from the cache, if present."""
+    return get_from_cache(_derivations_cache_key(topic, grade), model=DerivationsResponse)
+
+
+async def get_derivations_json(topic: str, grade: int) -> Tuple[DerivationsResponse, bytes]:
+    """
+    Get derivations for a topic, generating them at most once per (topic, grade).
+    
+    Args:
+        topic: Topic to derive formulas for
+        grade: Grade level
+    
+    Returns:
+        (DerivationsResponse, its JSON bytes) - available=False if generation
+        failed, in which case nothing was cached
+    """
+    async def produce() -> dict:
+        try:
+            markdown = await scenario_generator.generate_derivations(topic, grade)
+        except Exception as e:
+            logger.error(f"Error generating derivations for '{topic}': {e}")
+            markdown = DERIVATIONS_UNAVAILABLE
+        return DerivationsResponse(
+            topic=topic,
+            grade=grade,
+            formulas_and_derivations_markdown=markdown,
+            available=markdown != DERIVATIONS_UNAVAILABLE
+        ).model_dump()
+    
+    return await get_or_generate_json(
+        _derivations_cache_key(topic, grade),
+        produce,
+        model=DerivationsResponse,
+        should_cache=lambda derivations: derivations.get("available", False)
+    )
+
+
+async def get_derivations(topic: str, grade: int) -> DerivationsResponse:
+    """Get derivations for a topic (see get_derivations_json)."""
+    derivations, _ = await get_derivations_json(topic, grade)
+    return derivations
+
+
+def run_in_background(coro) -> asyncio.Task:
+    """Start a coroutine that should finish even if the request that started it does not."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def start_derivations_task(topic: str, grade: int) -> asyncio.Task:
+    """
+    Start generating derivations for a topic in the background.
+    
+    Concurrent generations for the same (topic, grade) are coalesced by
+    get_or_generate, so this is also safe to fire and forget as a prefetch.
+    """
+    return run_in_background(get_derivations(topic, grade))
+
+
 @app.post("/api/scenario/generate", response_model=ScenarioResponse)
 async def generate_scenario(request: ScenarioRequest):
     """
     Generate a complete learning scenario with tasks, simulation config, and quiz.
     
     Uses RAG to retrieve relevant NCERT content and Gemini to generate personalized scenario.
+    Formulas/derivations come from /api/scenario/derivations: they are embedded when
+    already cached (or when includeDerivations is set), otherwise prefetched in the background.
     """
     try:
         logger.info(f"Scenario request: Grade {request.grade}, {request.subject}, {request.topic}")
@@ -236,7 +405,12 @@ async def generate_scenario(request: ScenarioRequest):
         if not scenario_generator:
             raise HTTPException(status_code=500, detail="Scenario generator not initialized")
         
-        # Check cache first
+        derivations = get_cached_derivations(request.topic, request.grade)
+        derivations_task = None
+        if derivations is None and request.include_derivations:
+            # Generate derivations alongside the scenario instead of after it
+            derivations_task = start_derivations_task(request.topic, request.grade)
+        
         cache_key = build_cache_key(
             endpoint="scenario",
             grade=request.grade,
@@ -244,23 +418,156 @@ async def generate_scenario(request: ScenarioRequest):
             topic=request.topic
         )
         
-        cached_response = get_from_cache(cache_key)
-        if cached_response:
-            return ScenarioResponse(**cached_response)
+        async def produce() -> ScenarioResponse:
+            scenario = await scenario_generator.generate(request)
+            logger.info(f"Generated scenario: {scenario.scenario_id}")
+            return scenario
+        
+        # Cache hit, or one generation shared by every concurrent miss.
+        # The cached bytes leave out derivations, which are appended below.
+        scenario, body = await get_or_generate_json(
+            cache_key,
+            produce,
+            model=ScenarioResponse,
+            should_cache=lambda scenario: not scenario.is_mock
+        )
         
-        # Generate new scenario
-        scenario = await scenario_generator.generate(request)
+        if derivations is None:
+            if derivations_task is not None:
+                derivations = await asyncio.shield(derivations_task)
+            else:
+                # Warm the derivations cache for the client's follow-up request
+                start_derivations_task(request.topic, request.grade)
         
-        # Cache the response
-        set_cache(cache_key, scenario.model_dump())
+        derivations_markdown = scenario.formulas_and_derivations_markdown
+        if derivations is not None and derivations.available:
+            derivations_markdown = derivations.formulas_and_derivations_markdown
         
-        logger.info(f"Generated scenario: {scenario.scenario_id}")
-        return scenario
+        # Pre-encoded bytes: no re-validation or re-encoding on the hot path
+        return json_bytes_response(
+            add_json_field(body, "formulasAndDerivationsMarkdown", derivations_markdown)
+        )
         
     except Exception as e:
         logger.error(f"Error generating scenario: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/api/scenario/generate/stream")
+async def generate_scenario_stream(request: ScenarioRequest):
+    """
+    Progressive variant of /api/scenario/generate (server-sent events).
+    
+    Emits a "section" event ({"name", "value"}) for each top-level scenario
+    field as soon as Gemini has finished it (greeting and key concepts
+    arrive well before the quiz and notes), then "complete" with the full
+    ScenarioResponse. Cached scenarios, and scenarios another request is
+    already generating, are replayed section by section. If Gemini fails
+    after sections went out, the stream ends with an "error" event and
+    nothing is cached.
+    """
+    logger.info(f"Scenario request (stream): Grade {request.grade}, {request.subject}, {request.topic}")
+    
+    if not scenario_generator:
+        raise HTTPException(status_code=500, detail="Scenario generator not initialized")
+    
+    async def events():
+        derivations = get_cached_derivations(request.topic, request.grade)
+        derivations_task = None
+        if derivations is None and request.include_derivations:
+            derivations_task = start_derivations_task(request.topic, request.grade)
+        
+        cache_key = build_cache_key(
+            endpoint="scenario",
+            grade=request.grade,
+            subject=request.subject,
+            topic=request.topic
+        )
+        
+        # Sections are forwarded from the producer while this request owns the
+        # generation; a detached task keeps it going if the client disconnects
+        sections: asyncio.Queue = asyncio.Queue()
+        
+        async def produce() -> ScenarioResponse:
+            scenario = None
+            async for event, data in scenario_generator.generate_progressive(request):
+                if event == "complete":
+                    scenario = data
+                else:
+                    sections.put_nowait(data)
+            logger.info(f"Generated scenario (stream): {scenario.scenario_id}")
+            return scenario
+        
+        generation = run_in_background(get_or_generate(
+            cache_key,
+            produce,
+            should_cache=lambda scenario: not scenario.is_mock,
+            model=ScenarioResponse
+        ))
+        streamed = set()
+        while True:
+            next_section = asyncio.ensure_future(sections.get())
+            await asyncio.wait({next_section, generation}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_section.done():
+                next_section.cancel()
+                break
+            section = next_section.result()
+            streamed.add(section["name"])
+            yield "section", section
+        while not sections.empty():
+            section = sections.get_nowait()
+            streamed.add(section["name"])
+            yield "section", section
+        
+        scenario = generation.result()
+        for name, value in iter_scenario_sections(scenario):
+            if name not in streamed:
+                yield "section", {"name": name, "value": value}
+        
+        if derivations is None:
+            if derivations_task is not None:
+                derivations = await asyncio.shield(derivations_task)
+            else:
+                # Warm the derivations cache for the client's follow-up request
+                start_derivations_task(request.topic, request.grade)
+        
+        if derivations is not None and derivations.available:
+            # Copy: cached objects are shared between requests
+            scenario = scenario.model_copy(update={
+                "formulas_and_derivations_markdown": derivations.formulas_and_derivations_markdown
+            })
+            yield "section", {
+                "name": "formulasAndDerivationsMarkdown",
+                "value": derivations.formulas_and_derivations_markdown
+            }
+        
+        yield "complete", scenario
+    
+    return sse_response(events())
+
+
+@app.post("/api/scenario/derivations", response_model=DerivationsResponse)
+async def get_scenario_derivations(request: DerivationsRequest):
+    """
+    Get formulas and derivations (markdown) for a topic.
+    
+    Cached per (topic, grade) and shared by every scenario on the topic,
+    whatever the difficulty or student.
+    """
+    try:
+        logger.info(f"Derivations request: Grade {request.grade}, {request.topic}")
+        
+        if not scenario_generator:
+            raise HTTPException(status_code=500, detail="Scenario generator not initialized")
+        
+        # Joins a prefetch started by /api/scenario/generate, if any
+        _, body = await get_derivations_json(request.topic, request.grade)
+        return json_bytes_response(body)
+        
+    except Exception as e:
+        logger.error(f"Error generating derivations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/conversation/guide", response_model=ConversationResponse)
 async def guide_conversation(request: ConversationRequest):
     """
@@ -284,6 +591,21 @@ async def guide_conversation(request: ConversationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/conversation/guide/stream")
+async def guide_conversation_stream(request: ConversationRequest):
+    """
+    Streaming variant of /api/conversation/guide (server-sent events).
+    
+    Events: "token" (answer text as it is generated), then "sources",
+    "follow_ups" and "final" (the full ConversationResponse).
+    """
+    logger.info(f"Conversation guide (stream): Task {request.current_task_id}, Input: '{request.student_input[:50]}...'")
+    
+    if not conversation_guide:
+        raise HTTPException(status_code=500, detail="Conversation guide not initialized")
+    
+    return sse_response(conversation_guide.guide_stream(request))
+
 @app.post("/api/chat")
 async def generic_chat(request: dict):
     """
@@ -308,14 +630,15 @@ async def generic_chat(request: dict):
             raise HTTPException(status_code=400, detail="message field is required")
         
         import google.generativeai as genai
-        genai.configure(api_key=settings.GEMINI_API_KEY)
         
-        model = genai.GenerativeModel(settings.GENERATION_MODEL)
+        model = clients.genai_model()
         
         full_prompt = f"{system_prompt}\n\n{message}" if system_prompt else message
         
-        response = model.generate_content(
+        response = await llm_gateway.generate(
+            model,
             full_prompt,
+            call_site="chat",
             generation_config=genai.types.GenerationConfig(
                 temperature=temperature,
                 max_output_tokens=max_tokens,
@@ -347,6 +670,31 @@ async def get_rag_stats():
         logger.error(f"Error getting stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """Get per call site latency, error and timeout metrics for model calls."""
+    return llm_gateway.get_metrics()
+
+@app.get("/api/startup/stats")
+async def get_startup_stats():
+    """Get this worker's startup timings and which heavy SDKs it has loaded."""
+    return startup_profile.get_stats()
+
+@app.get("/api/clients/stats")
+async def get_client_stats():
+    """Get which shared Google clients this worker has created."""
+    return clients.get_stats()
+
+@app.get("/api/cache/stats")
+async def get_ai_cache_stats():
+    """Get AI response, answer and embedding cache hit/miss counts for this worker."""
+    return {
+        **get_cache_stats(),
+        "semantic_answers": semantic_answer_cache.get_stats(),
+        "embeddings": rag_retriever.get_embedding_cache_stats() if rag_retriever else {},
+        "retrieval": rag_retriever.get_retrieval_cache_stats() if rag_retriever else {},
+    }
+
 @app.post("/api/rag/search")
 async def search_rag(query: str, grade: Optional[int] = None, subject: Optional[str] = None, top_k: int = 5):
     """
@@ -498,6 +846,7 @@ async def process_pdfs_background(directory: str):
         
         # Final stats
         if rag_retriever:
+            rag_retriever.save_lexical_index()
             stats = rag_retriever.get_stats()
             logger.info(f"📊 Vector store stats: {stats}")
         
@@ -553,18 +902,21 @@ async def get_practice_questions(request: PYQRequest):
             topic=request.topic
         )
         
-        cached_response = get_from_cache(cache_key)
-        if cached_response:
-            return PYQResponse(**cached_response)
+        async def produce() -> PYQResponse:
+            # Generate new questions
+            return await pyq_generator.get_practice_questions(request)
         
-        # Generate new questions
-        response = await pyq_generator.get_practice_questions(request)
+        def complete(response: PYQResponse) -> bool:
+            # RAG / Gemini failures come back as fewer (or no) questions
+            if response.total_count == 0:
+                return False
+            return response.total_count >= request.count or not request.include_generated
         
-        # Cache the response
-        set_cache(cache_key, response.model_dump())
+        # Cache hit, or one generation shared by every concurrent miss
+        response, body = await get_or_generate_json(cache_key, produce, model=PYQResponse, should_cache=complete)
         
         logger.info(f"Returning {response.total_count} questions ({response.pyq_count} PYQ, {response.generated_count} generated)")
-        return response
+        return json_bytes_response(body)
         
     except Exception as e:
         logger.error(f"Error getting practice questions: {e}")
@@ -659,6 +1011,7 @@ async def ingest_pyqs_background():
     """Background task to ingest PYQ PDFs."""
     try:
         logger.info("Starting PYQ ingestion...")
+        from utils.pyq_ingestion import ingest_all_pyqs
         results = await ingest_all_pyqs(rag_retriever)
         logger.info(f"PYQ ingestion complete: {results}")
     except Exception as e:
@@ -819,76 +1172,84 @@ Daily Hours: {request.daily_study_hours}
             logger.error("❌ Exam planner not initialized!")
             raise HTTPException(status_code=500, detail="Exam planner not initialized")
         
-        # Check cache first - build key with all parameters
-        subjects_str = ','.join(sorted(request.subjects))
-        topics_str = ','.join(sorted(request.topics))
-        extra_params = f"{request.exam_date}_{request.exam_board}_{subjects_str}_{topics_str}_{request.daily_study_hours}"
+        # Check cache first - build key with all parameters (subjects and
+        # topics are canonicalised and hashed by build_cache_key). Days left
+        # and the daily dates depend on today's date (the request's
+        # current_date, and the server's date for the daily plans), so it is
+        # part of the key: a plan is never served on a later day.
+        today = datetime.now().date().isoformat()
+        current_day = (request.current_date or today).split('T')[0]
+        extra_params = f"{request.exam_date}_{request.exam_board}_{request.daily_study_hours}_{current_day}_{today}"
         
         cache_key = build_cache_key(
             endpoint="exam_plan",
             grade=request.grade,
-            subject=subjects_str[:50],  # Truncate for key
-            topic=topics_str[:50],  # Truncate for key
+            subject=request.subjects,
+            topic=request.topics,
             extra=extra_params
         )
         
-        cached_response = get_from_cache(cache_key)
-        if cached_response:
-            logger.info(f"⚡ CACHE HIT - Returning cached exam plan ({cached_response['metadata']['totalChapters']} chapters)")
-            return cached_response
-        
-        logger.info("🔄 Cache miss - Generating new exam plan...")
-        
-        # Analyze time allocation
-        time_analysis = exam_planner.analyze_time_allocation(
-            request.exam_date,
-            request.current_date or datetime.now().isoformat()
-        )
-        
-        logger.info(f"⏰ Time Analysis: {time_analysis['totalDays']} days ({time_analysis['studyDays']} study + {time_analysis['revisionDays']} revision)")
-        
-        # Prioritize chapters
-        chapter_priorities = exam_planner.prioritize_chapters(
-            request.subjects,
-            request.topics,
-            request.grade
-        )
-        
-        logger.info(f"📊 Prioritized {len(chapter_priorities)} chapters")
-        
-        # Generate daily plans
-        daily_plans = await exam_planner.generate_daily_plans(
-            time_analysis=time_analysis,
-            chapter_priorities=chapter_priorities,
-            subjects=request.subjects,
-            topics=request.topics,
-            daily_study_hours=request.daily_study_hours,
-            grade=request.grade,
-            exam_board=request.exam_board
-        )
-        
-        logger.info(f"✅ Generated {len(daily_plans)} daily plans")
-        
-        # Build response
-        response_data = {
-            "time_analysis": time_analysis,
-            "chapter_priorities": chapter_priorities,
-            "daily_plans": daily_plans,
-            "metadata": {
-                "totalChapters": len(chapter_priorities),
-                "totalTopics": len(request.topics),
-                "estimatedTotalHours": time_analysis["studyDays"] * request.daily_study_hours
+        async def produce() -> dict:
+            logger.info("🔄 Cache miss - Generating new exam plan...")
+            
+            # Analyze time allocation
+            time_analysis = exam_planner.analyze_time_allocation(
+                request.exam_date,
+                request.current_date or datetime.now().isoformat()
+            )
+            
+            logger.info(f"⏰ Time Analysis: {time_analysis['totalDays']} days ({time_analysis['studyDays']} study + {time_analysis['revisionDays']} revision)")
+            
+            # Prioritize chapters
+            chapter_priorities = exam_planner.prioritize_chapters(
+                request.subjects,
+                request.topics,
+                request.grade
+            )
+            
+            logger.info(f"📊 Prioritized {len(chapter_priorities)} chapters")
+            
+            # Generate daily plans
+            daily_plans = await exam_planner.generate_daily_plans(
+                time_analysis=time_analysis,
+                chapter_priorities=chapter_priorities,
+                subjects=request.subjects,
+                topics=request.topics,
+                daily_study_hours=request.daily_study_hours,
+                grade=request.grade,
+                exam_board=request.exam_board
+            )
+            
+            logger.info(f"✅ Generated {len(daily_plans)} daily plans")
+            
+            # Build response
+            response_data = {
+                "time_analysis": time_analysis,
+                "chapter_priorities": chapter_priorities,
+                "daily_plans": daily_plans,
+                "metadata": {
+                    "totalChapters": len(chapter_priorities),
+                    "totalTopics": len(request.topics),
+                    "estimatedTotalHours": time_analysis["studyDays"] * request.daily_study_hours
+                }
             }
-        }
-        
-        # Cache the response
-        set_cache(cache_key, response_data)
-        
-        logger.info(f"""\n{'='*60}
+            
+            logger.info(f"""\n{'='*60}
 ✅ EXAM PLAN GENERATION COMPLETE
 {'='*60}
 Days: {time_analysis['totalDays']} | Chapters: {len(chapter_priorities)}
 {'='*60}\n""")
+            
+            return response_data
+        
+        # Cache hit, or one generation shared by every concurrent miss
+        # (a fallback plan is served but not cached)
+        response_data = await get_or_generate(
+            cache_key,
+            produce,
+            should_cache=lambda plan: not any(day.get("fallback") for day in plan["daily_plans"])
+        )
+        logger.info(f"📦 Returning exam plan ({response_data['metadata']['totalChapters']} chapters)")
         
         return response_data
         
@@ -927,41 +1288,38 @@ Subjects: {', '.join([s['name'] for s in request.subjects])}
             logger.error("❌ Exam planner not initialized!")
             raise HTTPException(status_code=500, detail="Exam planner not initialized")
         
-        # Build cache key
-        subjects_info = ','.join([f"{s['name']}:{','.join(s['chapters'])}" for s in request.subjects])
-        extra_params = f"day{request.day}_{request.exam_board}_{subjects_info}"
+        # Build cache key: chapters are resolved against their own subject
+        chapters = [
+            (chapter, s['name'])
+            for s in request.subjects
+            for chapter in s['chapters']
+        ]
+        extra_params = f"day{request.day}_{request.exam_board}"
         
         cache_key = build_cache_key(
             endpoint="learning_kit",
             grade=request.grade,
-            subject=request.subjects[0]['name'] if request.subjects else 'general',
-            topic=subjects_info[:50],
+            subject=[s['name'] for s in request.subjects] or 'general',
+            topic=chapters,
             extra=extra_params
         )
         
-        cached_response = get_from_cache(cache_key)
-        if cached_response:
-            logger.info(f"⚡ CACHE HIT - Returning cached learning kit (Day {request.day})")
-            return cached_response
-        
-        logger.info("🔄 Cache miss - Generating new learning kit...")
-        
-        # Generate learning kit
-        learning_kit = await exam_planner.generate_learning_kit(
-            day=request.day,
-            subjects=request.subjects,
-            grade=request.grade,
-            exam_board=request.exam_board
-        )
-        
-        # Ensure commonMistakes field exists (for alias)
-        if 'commonMistakes' not in learning_kit:
-            learning_kit['commonMistakes'] = learning_kit.get('common_mistakes', [])
-        
-        # Cache the response
-        set_cache(cache_key, learning_kit)
-        
-        logger.info(f"""\n{'='*60}
+        async def produce() -> dict:
+            logger.info("🔄 Cache miss - Generating new learning kit...")
+            
+            # Generate learning kit
+            learning_kit = await exam_planner.generate_learning_kit(
+                day=request.day,
+                subjects=request.subjects,
+                grade=request.grade,
+                exam_board=request.exam_board
+            )
+            
+            # Ensure commonMistakes field exists (for alias)
+            if 'commonMistakes' not in learning_kit:
+                learning_kit['commonMistakes'] = learning_kit.get('common_mistakes', [])
+            
+            logger.info(f"""\n{'='*60}
 ✅ LEARNING KIT GENERATION COMPLETE
 {'='*60}
 Day: {request.day}
@@ -970,6 +1328,12 @@ Formulas: {len(learning_kit.get('formulas', []))}
 PYQs: {len(learning_kit.get('pyqs', []))}
 Tips: {len(learning_kit.get('tips', []))}
 {'='*60}\n""")
+            
+            return learning_kit
+        
+        # Cache hit, or one generation shared by every concurrent miss
+        # (a fallback kit is served but not cached)
+        learning_kit = await get_or_generate(cache_key, produce, should_cache=lambda kit: not kit.get("fallback"))
         
         return learning_kit
         
@@ -999,6 +1363,8 @@ async def global_exception_handler(request, exc):
     )
 
 if __name__ == "__main__":
+    import uvicorn
+    
     uvicorn.run(
         "main:app",
         host=settings.HOST,
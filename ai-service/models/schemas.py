@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
@@ -18,6 +18,18 @@ class ScenarioRequest(BaseModel):
     topic: str = Field(..., description="Specific topic to learn")
     student_id: str = Field(..., description="Unique student identifier")
     difficulty: Optional[str] = Field("medium", description="easy, medium, hard")
+    include_derivations: bool = Field(
+        False,
+        alias="includeDerivations",
+        description="Wait for formulas/derivations and embed them in the response"
+    )
+
+class DerivationsRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    
+    grade: int = Field(..., ge=1, le=12, description="Student grade level (1-12)")
+    topic: str = Field(..., description="Topic to derive formulas for")
+    subject: Optional[str] = Field("science", description="Subject name (informational only)")
 
 class ConversationMode(str, Enum):
     TASK_GUIDANCE = "task_guidance"
@@ -133,6 +145,23 @@ class ScenarioResponse(BaseModel):
     difficulty_level: str = Field("medium", alias="difficultyLevel")
     ncert_chapter: Optional[str] = Field("", alias="ncertChapter")
     ncert_page_refs: Optional[List[str]] = Field([], alias="ncertPageRefs")
+    
+    # Set on the template scenario served when Gemini is unavailable or fails
+    # (not serialised); such scenarios are never cached
+    _mock: bool = PrivateAttr(default=False)
+    
+    @property
+    def is_mock(self) -> bool:
+        return self._mock
+
+class DerivationsResponse(BaseModel):
+    """Formulas and derivations for a topic, shared by every scenario on it."""
+    model_config = ConfigDict(populate_by_name=True)
+    
+    topic: str
+    grade: int
+    formulas_and_derivations_markdown: str = Field("", alias="formulasAndDerivationsMarkdown")
+    available: bool = True
 
 class RAGSource(BaseModel):
     """NCERT source reference for RAG-based responses."""
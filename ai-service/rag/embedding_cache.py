@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of "?" parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of text embeddings.
+
+    Vectors are keyed by (embedding model, sha256 of the text) and stored as
+    float32 blobs in SQLite, so re-embedding the same chunk or query - an
+    offline rebuild after a chunking tweak, PYQ re-ingestion, a repeated
+    student query - never reaches the provider again.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite file path
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # Shared by the gateway threads; every access holds self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            # WAL lets several uvicorn workers read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+        logger.info(f"📦 Embedding cache initialized at: {path}")
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """sha256 of the text (the cache is content-addressed)."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            {text: embedding} for every text found
+        """
+        hashes = {self.text_hash(text): text for text in texts}
+        found: Dict[str, List[float]] = {}
+        keys = list(hashes)
+
+        with self._lock:
+            for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                batch = keys[i:i + LOOKUP_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[hashes[text_hash]] = vector.tolist()
+
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(hashes) - len(found)
+        return found
+
+    def put_many(self, model: str, embeddings: Dict[str, Sequence[float]]) -> None:
+        """
+        Store embeddings.
+
+        Args:
+            model: Embedding model name
+            embeddings: {text: embedding}
+        """
+        if not embeddings:
+            return
+        now = time.time()
+        rows = [
+            (model, self.text_hash(text), array("f", vector).tobytes(), now)
+            for text, vector in embeddings.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, created_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        self.stats["writes"] += len(rows)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss/write counters and number of stored vectors."""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {**self.stats, "entries": count}
+
+
+def open_embedding_cache(path: Optional[str]) -> Optional[EmbeddingCache]:
+    """
+    Open the embedding cache, or return None if disabled or unavailable.
+
+    Args:
+        path: SQLite file path (empty/None disables the cache)
+
+    Returns:
+        EmbeddingCache or None
+    """
+    if not path:
+        return None
+    try:
+        return EmbeddingCache(path)
+    except Exception as e:
+        logger.warning(f"⚠️ Embedding cache unavailable ({path}): {e}")
+        return None
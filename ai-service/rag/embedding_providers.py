@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into embedding vectors for indexing and retrieval."""
+
+    # Identifies the vector space: embedding cache key and collection suffix
+    name: str = ""
+    # Whether embed() makes network calls (and so needs rate limiting)
+    remote: bool = True
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts.
+
+        Args:
+            texts: Texts to embed (one provider request's worth)
+
+        Returns:
+            List of embedding vectors, in the same order as texts
+        """
+
+
+class VertexEmbeddingProvider(EmbeddingProvider):
+    """Vertex AI text embedding model (e.g. textembedding-gecko@003)."""
+
+    remote = True
+
+    def __init__(self, model_name: str):
+        """
+        Load the model through the shared client registry.
+
+        Args:
+            model_name: Vertex embedding model name
+
+        Raises:
+            RuntimeError: If Vertex AI is unavailable or the model fails to load
+        """
+        from utils.clients import clients
+
+        self.name = model_name
+        self.model = clients.text_embedding_model(model_name)
+        if self.model is None:
+            raise RuntimeError(f"Embedding model unavailable: {model_name}")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.model.get_embeddings(texts)  # type: ignore
+        return [emb.values for emb in embeddings]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local CPU embeddings from hashed word and character n-grams.
+
+    Word unigrams/bigrams and character trigrams of each word are hashed
+    (signed feature hashing, itself a random projection) into a fixed number
+    of dimensions, weighted 1 + log(tf) and L2-normalised. It needs no
+    network, no model download and no corpus statistics, so the same text
+    always gets the same vector - indexes can be built and queried offline,
+    and a short query costs a fraction of a millisecond instead of a network
+    round trip. A batch is scattered into one NumPy matrix and normalised
+    in a single pass.
+    Lexical rather than semantic: good enough for NCERT-term retrieval, CI
+    and benchmarks, not a replacement for a neural model's recall.
+    """
+
+    remote = False
+
+    # Character trigrams count for less than whole words
+    CHAR_NGRAM_WEIGHT = 0.5
+
+    def __init__(self, dimensions: int = 768):
+        """
+        Initialize the provider.
+
+        Args:
+            dimensions: Vector size
+        """
+        self.dimensions = dimensions
+        self.name = f"local-hash-{dimensions}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        rows: List[int] = []
+        digests: List[int] = []
+        counts: List[float] = []
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                rows.append(row)
+                digests.append(int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little"))
+                counts.append(count)
+
+        hashed = np.array(digests, dtype=np.uint64)
+        tf = np.array(counts, dtype=np.float64)
+        weights = np.where(tf >= 1, 1.0 + np.log(np.maximum(tf, 1.0)), tf)
+        weights = np.where(hashed >> np.uint64(63), weights, -weights)
+
+        matrix = np.zeros((len(texts), self.dimensions))
+        np.add.at(matrix, (np.array(rows, dtype=np.intp), (hashed % np.uint64(self.dimensions)).astype(np.intp)), weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+        return matrix.tolist()
+
+    def _features(self, text: str) -> Counter:
+        """Weighted n-gram counts of a text."""
+        words = re.findall(r"\w+", text.lower())
+        features: Counter = Counter()
+        for i, word in enumerate(words):
+            features["w:" + word] += 1.0
+            if i:
+                features["b:" + words[i - 1] + " " + word] += 1.0
+            padded = f"<{word}>"
+            for j in range(len(padded) - 2):
+                features["c:" + padded[j:j + 3]] += self.CHAR_NGRAM_WEIGHT
+        return features
+
+
+def _create_vertex_provider() -> Optional[VertexEmbeddingProvider]:
+    """Load the Vertex embedding model (Vertex AI is initialised once by the client registry)."""
+    from utils.clients import clients
+
+    if not clients.init_vertex():
+        logger.warning("⚠️ Vertex AI unavailable - embeddings will use mock mode")
+        return None
+
+    try:
+        logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
+        provider = VertexEmbeddingProvider(settings.EMBEDDING_MODEL)
+        logger.info(f"✅ Loaded embedding model: {settings.EMBEDDING_MODEL}")
+        return provider
+    except Exception as e:
+        logger.error(f"❌ Failed to load embedding model: {e}")
+        logger.exception("Full traceback:")
+        return None
+
+
+def create_embedding_provider(kind: Optional[str] = None) -> Optional[EmbeddingProvider]:
+    """
+    Create the configured embedding provider.
+
+    Args:
+        kind: "vertex", "local" or "auto" (Vertex if it can be initialized,
+            else local); defaults to settings.EMBEDDING_PROVIDER
+
+    Returns:
+        EmbeddingProvider, or None if Vertex was required but is unavailable
+    """
+    kind = (kind or settings.EMBEDDING_PROVIDER).lower()
+
+    if kind == "local":
+        logger.info(f"✅ Using local hashing embeddings ({settings.LOCAL_EMBEDDING_DIMENSIONS} dims)")
+        return HashingEmbeddingProvider(settings.LOCAL_EMBEDDING_DIMENSIONS)
+
+    if kind not in ("vertex", "auto"):
+        logger.warning(f"⚠️ Unknown EMBEDDING_PROVIDER '{kind}', using Vertex AI")
+
+    try:
+        provider = _create_vertex_provider()
+    except Exception as e:
+        if kind != "auto":
+            raise
+        logger.error(f"❌ Vertex AI initialization failed: {e}")
+        provider = None
+
+    if provider is None and kind == "auto":
+        logger.warning("⚠️ Vertex AI embeddings unavailable - falling back to local hashing embeddings")
+        return HashingEmbeddingProvider(settings.LOCAL_EMBEDDING_DIMENSIONS)
+    return provider
@@ -0,0 +1,244 @@
+import base64
+import gzip
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Metadata kept per chunk so searches can apply the vector store's filters
+FILTER_KEYS = ("grade", "subject", "doc_type")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "has", "have", "how", "i", "if", "in", "into", "is", "it", "its", "me", "of", "on",
+    "or", "our", "so", "that", "the", "their", "then", "there", "these", "this", "to",
+    "was", "we", "what", "when", "where", "which", "who", "why", "will", "with", "you",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+INDEX_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Lowercased alphanumeric words, minus stopwords and stray letters, with
+    plurals folded onto the same term as the singular ("lenses" and "lens",
+    "batteries" and "battery"; "electrolysis" and "gas" are kept).
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 4 and token.endswith(("ses", "xes", "zes", "ches", "shes")):
+            token = token[:-2]
+        if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "is", "us")):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked ID lists: each ID scores sum(1 / (k + rank)) over the lists.
+
+    Args:
+        rankings: ID lists, best first
+        k: Rank damping constant (60 is the usual choice)
+
+    Returns:
+        (ID, fused score) pairs, best first
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _encode_array(values: array) -> str:
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _decode_array(typecode: str, data: str) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    return values
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over chunk text.
+
+    Postings are stored as compact arrays (chunk number, term frequency), so
+    the NCERT corpus fits in a few tens of MB. Thread-safe: searches run on
+    the gateway thread pool while ingestion may be adding chunks.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalisation
+        """
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.doc_meta: List[Tuple[Any, ...]] = []
+        self.doc_lens = array("I")
+        self.total_len = 0
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """
+        Index chunks.
+
+        Args:
+            ids: Vector store IDs of the chunks
+            texts: Chunk text
+            metadatas: Chunk metadata (FILTER_KEYS are kept for filtering)
+        """
+        with self._lock:
+            for doc_id, text, meta in zip(ids, texts, metadatas):
+                number = len(self.doc_ids)
+                counts = Counter(tokenize(text))
+                for term, count in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("I"), array("H"))
+                    postings[0].append(number)
+                    postings[1].append(min(count, 65535))
+                length = sum(counts.values())
+                self.doc_ids.append(doc_id)
+                self.doc_meta.append(tuple((meta or {}).get(key) for key in FILTER_KEYS))
+                self.doc_lens.append(length)
+                self.total_len += length
+
+    def clear(self) -> None:
+        """Remove every chunk."""
+        with self._lock:
+            self.doc_ids = []
+            self.doc_meta = []
+            self.doc_lens = array("I")
+            self.total_len = 0
+            self._postings = {}
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank chunks for a query with BM25.
+
+        Args:
+            query: Query text
+            top_k: Number of results
+            filters: Exact-match metadata filters (keys from FILTER_KEYS)
+
+        Returns:
+            (vector store ID, BM25 score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        conditions = [
+            (FILTER_KEYS.index(key), value)
+            for key, value in (filters or {}).items()
+            if key in FILTER_KEYS
+        ]
+
+        with self._lock:
+            count = len(self.doc_ids)
+            if not count or not terms:
+                return []
+            avg_len = self.total_len / count
+            scores: Dict[int, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs, freqs = postings
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for number, freq in zip(docs, freqs):
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lens[number] / avg_len)
+                    scores[number] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+            if conditions:
+                scores = {
+                    number: score for number, score in scores.items()
+                    if all(self.doc_meta[number][i] == value for i, value in conditions)
+                }
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [(self.doc_ids[number], score) for number, score in best]
+
+    def save(self, path: str) -> None:
+        """Write the index to a gzipped JSON file (atomically)."""
+        with self._lock:
+            data = {
+                "version": INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "doc_ids": self.doc_ids,
+                "doc_meta": self.doc_meta,
+                "doc_lens": _encode_array(self.doc_lens),
+                "postings": {
+                    term: [_encode_array(docs), _encode_array(freqs)]
+                    for term, (docs, freqs) in self._postings.items()
+                },
+            }
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        # Fast compression: the index is rewritten after every ingestion run
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(data, f)
+        tmp.replace(target)
+        logger.info(f"💾 Lexical index saved: {len(self.doc_ids)} chunks, {len(self._postings)} terms ({path})")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """
+        Read an index written by save().
+
+        Returns:
+            The index, or None if the file is missing or unreadable
+        """
+        if not Path(path).exists():
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                logger.warning(f"⚠️ Lexical index {path} has an old format, rebuilding")
+                return None
+            index = cls(k1=data["k1"], b=data["b"])
+            index.doc_ids = data["doc_ids"]
+            index.doc_meta = [tuple(meta) for meta in data["doc_meta"]]
+            index.doc_lens = _decode_array("I", data["doc_lens"])
+            index.total_len = sum(index.doc_lens)
+            index._postings = {
+                term: (_decode_array("I", docs), _decode_array("H", freqs))
+                for term, (docs, freqs) in data["postings"].items()
+            }
+            return index
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load lexical index {path}: {e}")
+            return None
@@ -0,0 +1,527 @@
+import json
+import logging
+import mmap
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config.settings import settings
+from rag.lexical_index import FILTER_KEYS, BM25Index
+from rag.store_stats import VectorStoreStats
+from rag.vector_store import page_in_files
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunk_offsets.npy"
+LEXICAL_FILE = "bm25.json.gz"
+INT8_SCALES_FILE = "int8_scales.npy"
+
+# Compressed copies of the vectors a search can scan first ("none": scan vectors.npy)
+QUANTIZATIONS = ("none", "int8", "float16")
+
+# Chunks read from Chroma per page while exporting
+EXPORT_PAGE_SIZE = 1000
+
+# Rows scored per matrix product (bounds the float32 copy of a float16 block)
+SCORE_BLOCK_ROWS = 8192
+
+
+def _column_file(key: str) -> str:
+    return f"col_{key}.npy"
+
+
+def _first_pass_file(quantization: str) -> str:
+    return f"vectors_{quantization}.npy"
+
+
+def _scan(matrix: np.ndarray, rows: Optional[np.ndarray], queries: np.ndarray) -> np.ndarray:
+    """
+    Score rows of a (memory-mapped) matrix against queries.
+
+    Args:
+        matrix: N x D vectors, any dtype (converted to float32 a block at a time)
+        rows: Row numbers to score, or None for every row
+        queries: M x D float32 queries
+
+    Returns:
+        len(rows) x M dot products
+    """
+    if rows is not None:
+        return np.asarray(matrix[rows], dtype=np.float32) @ queries.T
+    scores = np.empty((len(matrix), len(queries)), dtype=np.float32)
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        block = matrix[start:start + SCORE_BLOCK_ROWS]
+        scores[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ queries.T
+    return scores
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def write_first_pass(index_dir: str, quantization: str) -> None:
+    """
+    Write the compressed copy of an exported index's vectors.
+
+    int8 uses symmetric scalar quantization with one scale per dimension
+    (max |value| / 127), so a dot product with the compressed rows only needs
+    the query multiplied by the scales. Searches scan this copy and re-score
+    the best candidates with vectors.npy.
+
+    Args:
+        index_dir: Directory written by export_mmap_index
+        quantization: "int8", "float16" or "none" (remove the compressed copy)
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}' (expected one of {QUANTIZATIONS})")
+    index = Path(index_dir)
+    with open(index / MANIFEST_FILE, encoding="utf-8") as f:
+        manifest = json.load(f)
+    vectors = np.load(index / VECTORS_FILE, mmap_mode="r")
+
+    if quantization == "int8":
+        scales = np.zeros(vectors.shape[1], dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = np.abs(np.asarray(vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32))
+            np.maximum(scales, block.max(axis=0), out=scales)
+        scales = np.maximum(scales / 127.0, 1e-12)
+        np.save(index / INT8_SCALES_FILE, scales)
+
+    if quantization != "none":
+        compressed = np.lib.format.open_memmap(
+            index / _first_pass_file(quantization), mode="w+", dtype=quantization, shape=vectors.shape
+        )
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            if quantization == "int8":
+                block = np.clip(np.rint(block / scales), -127, 127)
+            compressed[start:start + len(block)] = block
+        compressed.flush()
+        del compressed
+
+    manifest["quantization"] = quantization
+    with open(index / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    logger.info(f"✅ First-pass vectors: {quantization} ({index_dir})")
+
+
+def export_mmap_index(
+    vector_store: Any,
+    output_dir: str,
+    dtype: str = "float32",
+    embedding_model: Optional[str] = None,
+    quantization: str = "int8"
+) -> Dict[str, Any]:
+    """
+    Export a Chroma collection as a read-only, memory-mappable index.
+
+    Writes, into output_dir:
+        vectors.npy         N x D matrix of L2-normalised embeddings (dtype)
+        col_<key>.npy       int32 codes of the filter columns (grade, subject,
+                            doc_type); values listed in the manifest, -1 = missing
+        chunks.bin          [document, metadata] JSON per chunk, back to back
+        chunk_offsets.npy   N + 1 byte offsets into chunks.bin
+        bm25.json.gz        BM25 index of the chunks
+        vectors_<q>.npy     compressed first-pass copy (see write_first_pass)
+        manifest.json       IDs, dimensions, dtype, embedding model, column
+                            values, per-value chunk counts
+
+    Args:
+        vector_store: Chroma VectorStore to export
+        output_dir: Index directory (replaced atomically)
+        dtype: Precision of vectors.npy, used for exact scores: "float32" or "float16"
+        embedding_model: Name of the embedding space, checked when serving
+        quantization: First-pass copy: "int8" (1/4 of float32), "float16" or "none"
+
+    Returns:
+        The manifest
+    """
+    start = time.perf_counter()
+    collection = vector_store.collection
+    count = collection.count()
+    if count == 0:
+        raise ValueError("Vector store is empty - nothing to export")
+
+    target = Path(output_dir)
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    ids: List[str] = []
+    values: Dict[str, Dict[Any, int]] = {key: {} for key in FILTER_KEYS}
+    codes = {key: np.full(count, -1, dtype=np.int32) for key in FILTER_KEYS}
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    lexical_index = BM25Index()
+    stats = VectorStoreStats()
+    vectors = None
+
+    with open(tmp / CHUNKS_FILE, "wb") as chunks_file:
+        for page_start in range(0, count, EXPORT_PAGE_SIZE):
+            page = collection.get(
+                limit=EXPORT_PAGE_SIZE,
+                offset=page_start,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    tmp / VECTORS_FILE, mode="w+", dtype=dtype, shape=(count, embeddings.shape[1])
+                )
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            rows = slice(page_start, page_start + len(page["ids"]))
+            vectors[rows] = embeddings / np.maximum(norms, 1e-12)
+
+            documents = page["documents"] or [""] * len(page["ids"])
+            metadatas = page["metadatas"] or [{}] * len(page["ids"])
+            for i, (document, meta) in enumerate(zip(documents, metadatas), page_start):
+                meta = meta or {}
+                for key in FILTER_KEYS:
+                    if meta.get(key) is not None:
+                        codes[key][i] = values[key].setdefault(meta[key], len(values[key]))
+                chunks_file.write(json.dumps([document, meta], ensure_ascii=False).encode("utf-8"))
+                offsets[i + 1] = chunks_file.tell()
+
+            ids.extend(page["ids"])
+            lexical_index.add(page["ids"], documents, metadatas)
+            stats.add(metadatas)
+            logger.info(f"✅ Exported {len(ids)}/{count} chunks")
+
+    vectors.flush()
+    del vectors
+    np.save(tmp / OFFSETS_FILE, offsets)
+    for key in FILTER_KEYS:
+        np.save(tmp / _column_file(key), codes[key])
+    lexical_index.save(str(tmp / LEXICAL_FILE))
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "count": count,
+        "dimensions": int(np.load(tmp / VECTORS_FILE, mmap_mode="r").shape[1]),
+        "dtype": dtype,
+        "embedding_model": embedding_model,
+        "columns": {key: list(values[key]) for key in FILTER_KEYS},
+        "stats": stats.to_dict(),
+        "ids": ids,
+    }
+    with open(tmp / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    if quantization != "none" and quantization != dtype:
+        write_first_pass(str(tmp), quantization)
+        manifest["quantization"] = quantization
+
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+    logger.info(f"🎉 Exported {count} chunks to {target} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def recall_report(
+    index_dir: str,
+    sample: int = 200,
+    top_k: int = 5,
+    factors: Sequence[int] = (1, 2, 4, 8),
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Measure top-k recall against exact float32 search for each first-pass setting.
+
+    A sample of the index's own vectors serves as queries (each query's own
+    row is excluded), which approximates real queries without an embedding
+    call. Rescore factor 1 means the first pass ranks alone.
+
+    Args:
+        index_dir: Directory written by export_mmap_index
+        sample: Number of query vectors
+        top_k: Results per query
+        factors: Candidates re-scored exactly, as multiples of top_k
+        seed: Sampling seed
+
+    Returns:
+        One row per setting: first pass, rescore factor, first-pass size in MB,
+        bytes per vector and recall@top_k
+    """
+    vectors = np.asarray(np.load(Path(index_dir) / VECTORS_FILE, mmap_mode="r"), dtype=np.float32)
+    count, dims = vectors.shape
+    picks = np.random.default_rng(seed).choice(count, min(sample, count), replace=False)
+    queries = vectors[picks]
+    own_rows = (picks, np.arange(len(picks)))
+
+    exact = vectors @ queries.T
+    exact[own_rows] = -np.inf
+    truth = [set(_top(exact[:, j], top_k).tolist()) for j in range(len(picks))]
+
+    scales = np.maximum(np.abs(vectors).max(axis=0) / 127.0, 1e-12)
+    first_passes = {
+        "float32": exact,
+        "float16": vectors.astype(np.float16).astype(np.float32) @ queries.T,
+        "int8": np.clip(np.rint(vectors / scales), -127, 127) @ (queries * scales).T,
+    }
+
+    report = []
+    for name, approx in first_passes.items():
+        approx[own_rows] = -np.inf
+        itemsize = np.dtype(name).itemsize
+        for factor in (1,) if name == "float32" else factors:
+            hits = 0
+            for j in range(len(picks)):
+                found = _top(approx[:, j], min(count - 1, top_k * factor))
+                if factor > 1:
+                    found = found[_top(exact[found, j], top_k)]
+                hits += len(truth[j] & set(found[:top_k].tolist()))
+            report.append({
+                "first_pass": name,
+                "rescore_factor": factor,
+                "first_pass_mb": round(count * dims * itemsize / 1024 / 1024, 1),
+                "bytes_per_vector": dims * itemsize,
+                f"recall@{top_k}": round(hits / (len(picks) * top_k), 4),
+            })
+    return report
+
+
+class MmapVectorStore:
+    """
+    Read-only vector store over an index written by export_mmap_index.
+
+    Embeddings, filter columns and chunk text are memory-mapped rather than
+    loaded: startup reads only the manifest, pages come in as they are
+    searched, and every worker process on the host shares the same page
+    cache. Search is a brute-force cosine top-k over the rows left after the
+    metadata filters, which at NCERT scale (~20k chunks) is a few
+    milliseconds and needs no HNSW graph in memory.
+
+    If the export has a compressed first-pass copy (int8 or float16), that is
+    what gets scanned, and only the top_k * VECTOR_INDEX_RESCORE_FACTOR
+    candidates are re-scored exactly from vectors.npy. The hot set in
+    memory is then the compressed copy plus a few pages of full vectors.
+    """
+
+    def __init__(self, index_dir: str, embedding_model: Optional[str] = None):
+        """
+        Open an exported index.
+
+        Args:
+            index_dir: Directory written by export_mmap_index
+            embedding_model: Embedding space of the queries; must match the export
+
+        Raises:
+            ValueError: If the index format or embedding space doesn't match
+        """
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported vector index version: {manifest.get('version')}")
+        exported_model = manifest.get("embedding_model")
+        if embedding_model and exported_model and exported_model != embedding_model:
+            raise ValueError(f"Vector index was built with '{exported_model}', queries use '{embedding_model}'")
+
+        self.ids: List[str] = manifest["ids"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._values = {
+            key: {value: code for code, value in enumerate(values)}
+            for key, values in manifest["columns"].items()
+        }
+        self.vectors = np.load(self.index_dir / VECTORS_FILE, mmap_mode="r")
+        self.quantization = manifest.get("quantization", "none")
+        self.first_pass = None
+        self.first_pass_scales = None
+        if self.quantization != "none":
+            self.first_pass = np.load(self.index_dir / _first_pass_file(self.quantization), mmap_mode="r")
+            if self.quantization == "int8":
+                self.first_pass_scales = np.load(self.index_dir / INT8_SCALES_FILE)
+        self.columns = {key: np.load(self.index_dir / _column_file(key), mmap_mode="r") for key in self._values}
+        self.offsets = np.load(self.index_dir / OFFSETS_FILE, mmap_mode="r")
+        with open(self.index_dir / CHUNKS_FILE, "rb") as f:
+            self._chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Read-only: nothing ever invalidates cached search results
+        self.generation = 0
+        if "stats" in manifest:
+            self.stats = VectorStoreStats.from_dict(manifest["stats"])
+        else:
+            self.stats = VectorStoreStats()
+            self.stats.add(self.get_all_metadatas())
+        self.lexical_index = BM25Index.load(str(self.index_dir / LEXICAL_FILE))
+        if self.lexical_index is None:
+            self.lexical_index = self._build_lexical_index()
+
+        logger.info(f"Memory-mapped vector store initialized: {len(self.ids)} documents "
+                    f"({manifest['dtype']}, {manifest['dimensions']} dims, first pass: {self.quantization})")
+
+    def _chunk(self, row: int) -> List[Any]:
+        """[document, metadata] of a row."""
+        return json.loads(self._chunks[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    def _build_lexical_index(self) -> BM25Index:
+        index = BM25Index()
+        chunks = [self._chunk(row) for row in range(len(self.ids))]
+        index.add(self.ids, [document for document, _ in chunks], [meta for _, meta in chunks])
+        return index
+
+    def _filter_rows(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Rows matching exact-match metadata filters.
+
+        Returns:
+            Row numbers, or None if there are no filters (every row)
+        """
+        if not filters:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, value in filters.items():
+            if key in self.columns:
+                code = self._values[key].get(value)
+                if code is None:
+                    return np.empty(0, dtype=np.int64)
+                mask &= self.columns[key] == code
+            else:
+                # Not exported as a column: check the stored metadata
+                mask &= np.array([self._chunk(row)[1].get(key) == value for row in range(len(self.ids))])
+        return np.flatnonzero(mask)
+
+    def add_documents(self, chunks: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        raise RuntimeError("Memory-mapped vector store is read-only - re-export it from ChromaDB")
+
+    def delete_all(self) -> None:
+        raise RuntimeError("Memory-mapped vector store is read-only - re-export it from ChromaDB")
+
+    def save_lexical_index(self, force: bool = False) -> None:
+        """Nothing to save: the BM25 index is part of the export."""
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List]:
+        """
+        Search for similar documents using query embedding.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return (defaults to settings.TOP_K_RESULTS)
+            filters: Metadata filters (e.g., {"grade": 6, "subject": "science"})
+
+        Returns:
+            Dict with 'ids', 'documents', 'metadatas', 'distances' (cosine) lists
+        """
+        return self.search_many([query_embedding], top_k=top_k, filters=filters)[0]
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, List]]:
+        """
+        Search for several query embeddings in one pass over the matrix.
+
+        Args:
+            query_embeddings: Query vectors
+            top_k: Number of results per query (defaults to settings.TOP_K_RESULTS)
+            filters: Metadata filters applied to every query
+
+        Returns:
+            One dict with 'ids', 'documents', 'metadatas', 'distances' (cosine) lists per query
+        """
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
+        if not query_embeddings:
+            return []
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        rows = self._filter_rows(filters)
+        if self.first_pass is None:
+            scores = _scan(self.vectors, rows, queries)
+        elif self.first_pass_scales is not None:
+            # int8 rows times per-dimension scales: fold the scales into the queries
+            scores = _scan(self.first_pass, rows, queries * self.first_pass_scales)
+        else:
+            scores = _scan(self.first_pass, rows, queries)
+
+        results = []
+        k = min(top_k, len(scores))
+        candidates = min(len(scores), k * settings.VECTOR_INDEX_RESCORE_FACTOR)
+        for j in range(len(queries)):
+            if k == 0:
+                results.append({"ids": [], "documents": [], "metadatas": [], "distances": []})
+                continue
+            if self.first_pass is None:
+                top = _top(scores[:, j], k)
+                found = rows[top] if rows is not None else top
+                best = scores[top, j]
+            else:
+                # Re-score the first-pass candidates with the full-precision vectors
+                top = _top(scores[:, j], candidates)
+                found = np.sort(rows[top] if rows is not None else top)
+                exact = np.asarray(self.vectors[found], dtype=np.float32) @ queries[j]
+                order = _top(exact, k)
+                found, best = found[order], exact[order]
+            chunks = [self._chunk(row) for row in found]
+            results.append({
+                "ids": [self.ids[row] for row in found],
+                "documents": [document for document, _ in chunks],
+                "metadatas": [meta for _, meta in chunks],
+                "distances": [float(1.0 - score) for score in best]
+            })
+        return results
+
+    def lexical_search(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List]:
+        """Search the BM25 index (see VectorStore.lexical_search)."""
+        hits = self.lexical_index.search(query, top_k or settings.TOP_K_RESULTS, filters)
+        results = self.get_documents([doc_id for doc_id, _ in hits])
+        results["distances"] = [1.0 / (1.0 + score) for _, score in hits]
+        return results
+
+    def get_documents(self, ids: List[str]) -> Dict[str, List]:
+        """Fetch chunks by ID, in the order of ids (unknown IDs are left out)."""
+        ordered = [doc_id for doc_id in ids if doc_id in self._rows]
+        chunks = [self._chunk(self._rows[doc_id]) for doc_id in ordered]
+        return {
+            "ids": ordered,
+            "documents": [document for document, _ in chunks],
+            "metadatas": [meta for _, meta in chunks]
+        }
+
+    def get_all_metadatas(self) -> List[Dict[str, Any]]:
+        """Metadata of every chunk."""
+        return [self._chunk(row)[1] for row in range(len(self.ids))]
+
+    def count(self) -> int:
+        """Get total number of documents in the store."""
+        return len(self.ids)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics about the vector store."""
+        return {**self.stats.summary(), "backend": "mmap", "quantization": self.quantization}
+
+    def warm_up(self) -> int:
+        """
+        Page the matrix every search scans, plus the metadata columns, into the OS cache.
+
+        The exact float32 vectors are left out when a first-pass copy exists:
+        only the few re-scored rows of them are read per query.
+
+        Returns:
+            Bytes read
+        """
+        scanned = VECTORS_FILE if self.first_pass is None else _first_pass_file(self.quantization)
+        files = [scanned, OFFSETS_FILE] + [_column_file(key) for key in self.columns]
+        return page_in_files([self.index_dir / name for name in files])
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normalise case and whitespace so templated queries share an entry."""
+    return " ".join(query.lower().split())
+
+
+class RetrievalCache:
+    """
+    In-process LRU of search results.
+
+    Entries are keyed on (normalised query, filters, top_k) and tagged with the
+    vector store's content generation: once documents are added or deleted the
+    generation changes and every older entry is dropped. A TTL bounds how long
+    another worker's writes (which do not bump this worker's generation) can
+    go unnoticed.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Entries kept (least recently used evicted first)
+            ttl: Seconds an entry is served for
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation: Optional[int] = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, List]]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        # Retrieval runs on the gateway thread pool
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, filters: Optional[Dict[str, Any]], top_k: int, mode: str = "vector") -> Hashable:
+        """Build the key for a query (filters include grade, subject and doc_type; mode is the retrieval mode)."""
+        return (normalize_query(query), tuple(sorted((filters or {}).items())), top_k, mode)
+
+    def get(self, key: Hashable, generation: int) -> Optional[Dict[str, List]]:
+        """
+        Get cached results for a key.
+
+        Args:
+            key: Key from make_key
+            generation: Current vector store generation
+
+        Returns:
+            A copy of the cached results, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key) if self._check_generation(generation) else None
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+        # Callers may modify the lists they get back
+        return {name: list(values) for name, values in entry[1].items()}
+
+    def set(self, key: Hashable, generation: int, results: Dict[str, List]) -> None:
+        """
+        Store results for a key.
+
+        Args:
+            key: Key from make_key
+            generation: Vector store generation the results were read at
+            results: Dict with 'documents', 'metadatas', 'distances' lists
+        """
+        entry = (time.monotonic(), {name: list(values) for name, values in results.items()})
+        with self._lock:
+            # Results read before a write landed are not stored
+            if not self._check_generation(generation):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _check_generation(self, generation: int) -> bool:
+        """
+        Drop every entry once the vector store content has changed.
+
+        Returns:
+            False if `generation` is older than the cache's (a stale reader)
+        """
+        if generation == self.generation:
+            return True
+        if self.generation is not None and generation < self.generation:
+            return False
+        if self._entries:
+            logger.info(f"🧹 Vector store changed (generation {generation}), clearing retrieval cache")
+            self.stats["invalidations"] += 1
+        self._entries.clear()
+        self.generation = generation
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -1,64 +1,55 @@
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional
 import logging
-import os
 import time
-import vertexai
-from google.cloud import aiplatform
-from google.oauth2 import service_account
-from vertexai.language_models import TextEmbeddingModel
 
 from config.settings import settings
-from rag.vector_store import VectorStore
+from rag.embedding_cache import open_embedding_cache
+from rag.embedding_engine import EmbeddingEngine
+from rag.embedding_providers import VertexEmbeddingProvider, create_embedding_provider
+from rag.lexical_index import reciprocal_rank_fusion
+from rag.retrieval_cache import RetrievalCache
+from rag.vector_store import open_vector_store
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+
 class RAGRetriever:
     """Retrieve relevant context from NCERT documents using RAG."""
     
     def __init__(self):
-        """Initialize Vertex AI and vector store."""
+        """Initialize the embedding provider and vector store."""
         try:
-            # Initialize Vertex AI with explicit credentials
-            self.embedding_model = None
-            
             logger.info(f"Initializing RAG Retriever...")
-            logger.info(f"GCP_PROJECT_ID: {settings.GCP_PROJECT_ID}")
-            logger.info(f"GOOGLE_APPLICATION_CREDENTIALS: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            
-            if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-                # Load credentials explicitly
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    logger.info(f"Loading credentials from: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    
-                    # Initialize Vertex AI with credentials
-                    logger.info("Initializing Vertex AI...")
-                    vertexai.init(
-                        project=settings.GCP_PROJECT_ID,
-                        location=settings.GCP_LOCATION,
-                        credentials=credentials
-                    )
-                    logger.info(f"Vertex AI initialized: {settings.GCP_PROJECT_ID}")
-                    
-                    # Initialize embedding model
-                    try:
-                        logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-                        self.embedding_model = TextEmbeddingModel.from_pretrained(
-                            settings.EMBEDDING_MODEL
-                        )
-                        logger.info(f"✅ Loaded embedding model: {settings.EMBEDDING_MODEL}")
-                    except Exception as e:
-                        logger.error(f"❌ Failed to load embedding model: {e}")
-                        logger.exception("Full traceback:")
-                else:
-                    logger.error(f"❌ Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            else:
-                logger.warning("⚠️ GCP_PROJECT_ID or credentials not set - embeddings will use mock mode")
-            
-            # Initialize vector store
-            self.vector_store = VectorStore()
+            
+            # Vertex AI (default) or local CPU embeddings - see EMBEDDING_PROVIDER
+            self.embedding_provider = create_embedding_provider()
+            
+            # Bulk embedding (ingestion): packed, concurrent, rate-limited requests
+            self.embedding_engine = EmbeddingEngine(
+                self._embed_batch,
+                max_items=settings.EMBEDDING_BATCH_MAX_ITEMS,
+                max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+                concurrency=settings.EMBEDDING_CONCURRENCY,
+                initial_rate=settings.EMBEDDING_REQUESTS_PER_SECOND,
+                max_rate=settings.EMBEDDING_MAX_REQUESTS_PER_SECOND
+            )
+            
+            # Embeddings already computed (by any run) are reused from disk
+            self.embedding_cache = open_embedding_cache(settings.EMBEDDING_CACHE_PATH)
+            
+            # Initialize vector store (each embedding space has its own collection;
+            # VECTOR_STORE_BACKEND=mmap serves a read-only export of it)
+            self.vector_store = open_vector_store(
+                self._collection_name(),
+                embedding_model=self.embedding_provider.name if self.embedding_provider else None
+            )
+            
+            # Results of repeated (templated) queries, until the store changes
+            self.retrieval_cache = RetrievalCache(
+                max_entries=settings.RETRIEVAL_CACHE_SIZE,
+                ttl=settings.RETRIEVAL_CACHE_TTL
+            )
             
         except Exception as e:
             logger.error(f"Error initializing RAG retriever: {e}")
@@ -67,7 +58,11 @@ class RAGRetriever:
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
-        Get embeddings for a list of texts using Vertex AI.
+        Get embeddings for a list of texts using the embedding provider.
+        
+        Texts found in the embedding cache are not sent to the provider; the
+        rest go through the embedding engine (batched, concurrent requests
+        under an adaptive rate limit).
         
         Args:
             texts: List of text strings to embed
@@ -75,72 +70,92 @@ class RAGRetriever:
         Returns:
             List of embedding vectors
         """
-        if not self.embedding_model:
-            raise ValueError("Embedding model not initialized - check GCP_PROJECT_ID")
+        if not self.embedding_provider:
+            raise ValueError("Embedding provider not initialized - check GCP_PROJECT_ID or set EMBEDDING_PROVIDER=local")
         
-        try:
-            # Adaptive rate limiting - process one at a time, adjust delay based on quota errors
-            batch_size = 1
-            all_embeddings = []
-            current_delay = 1.0  # Start with 1 second delay (quota-aware)
-            
-            logger.info(f"Processing {len(texts)} texts with adaptive rate limiting...")
-            logger.info(f"⏱️ Estimated time: ~{len(texts) * current_delay // 60} minutes (will adjust if quota hit)")
+        if not self.embedding_provider.remote:
+            # Local embeddings need no batching or rate limiting
+            return self._embed_with_cache(texts, self.embedding_provider.embed)
+        return self._embed_with_cache(texts, self.embedding_engine.embed)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed a small set of query strings in a single provider call.
+        
+        Unlike get_embeddings (built for bulk ingestion), this makes at most
+        one request (for the queries not in the embedding cache) and does not
+        sleep between texts.
+        
+        Args:
+            queries: Query strings (gecko accepts up to 250 texts per request)
             
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                
-                # Only delay after first request
-                if i > 0:
-                    time.sleep(current_delay)
-                
-                # Retry logic with quota-aware backoff
-                max_retries = 5
-                quota_hit = False
-                
-                for attempt in range(max_retries):
-                    try:
-                        # Get embeddings
-                        embeddings = self.embedding_model.get_embeddings(batch)  # type: ignore
-                        
-                        # Extract values
-                        batch_embeddings = [emb.values for emb in embeddings]
-                        all_embeddings.extend(batch_embeddings)
-                        
-                        # Success! Gradually speed up if no quota errors
-                        if not quota_hit and current_delay > 1.0:
-                            current_delay = max(1.0, current_delay * 0.9)  # Reduce delay by 10%
-                        
-                        # Progress update every 10 texts
-                        if (i + 1) % 10 == 0 or i == 0:
-                            logger.info(f"✅ Progress: {len(all_embeddings)}/{len(texts)} (delay: {current_delay:.1f}s)")
-                        break  # Success, exit retry loop
-                        
-                    except Exception as e:
-                        if "429" in str(e) or "Quota exceeded" in str(e):
-                            quota_hit = True
-                            if attempt < max_retries - 1:
-                                # Exponential backoff for retries
-                                wait_time = (attempt + 1) * 30  # 30, 60, 90, 120, 150 seconds
-                                logger.warning(f"⚠️ Quota exceeded at {len(all_embeddings)}/{len(texts)}")
-                                logger.warning(f"   Waiting {wait_time}s before retry {attempt + 2}/{max_retries}...")
-                                time.sleep(wait_time)
-                                
-                                # Increase delay for future requests after quota error
-                                current_delay = min(5.0, current_delay * 1.5)  # Slow down by 50%, max 5s
-                            else:
-                                logger.error(f"❌ Failed after {max_retries} retries at {len(all_embeddings)}/{len(texts)}")
-                                logger.error(f"   Processed {len(all_embeddings)} embeddings successfully before failure")
-                                raise
-                        else:
-                            raise  # Re-raise non-quota errors immediately
-            
-            logger.info(f"🎉 Generated all {len(all_embeddings)} embeddings successfully!")
-            return all_embeddings
+        Returns:
+            List of embedding vectors, in the same order as queries
+        """
+        if not self.embedding_provider:
+            raise ValueError("Embedding provider not initialized - check GCP_PROJECT_ID or set EMBEDDING_PROVIDER=local")
+        
+        if not queries:
+            return []
+        
+        return self._embed_with_cache(queries, self._embed_batch)
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in a single provider request."""
+        return self.embedding_provider.embed(texts)  # type: ignore
+    
+    def _collection_name(self) -> str:
+        """
+        Vector store collection for the provider's embedding space.
+        
+        Vertex AI keeps the configured name (existing pre-built databases);
+        other providers get a suffixed collection, so vectors from different
+        spaces are never compared.
+        """
+        provider = self.embedding_provider
+        if provider is None or isinstance(provider, VertexEmbeddingProvider):
+            return settings.VECTOR_COLLECTION_NAME
+        return f"{settings.VECTOR_COLLECTION_NAME}__{provider.name}"
+    
+    def _embed_with_cache(
+        self,
+        texts: List[str],
+        embed_missing: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """
+        Embed texts through the embedding cache.
+        
+        Args:
+            texts: Texts to embed
+            embed_missing: Provider call for the texts not in the cache
             
+        Returns:
+            List of embedding vectors, in the same order as texts
+        """
+        if self.embedding_cache is None or not texts:
+            return embed_missing(texts)
+        
+        model = self.embedding_provider.name  # type: ignore
+        try:
+            found = self.embedding_cache.get_many(model, texts)
         except Exception as e:
-            logger.error(f"Error generating embeddings: {e}")
-            raise
+            logger.warning(f"⚠️ Embedding cache read failed: {e}")
+            return embed_missing(texts)
+        
+        # Each distinct missing text is embedded once
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if len(missing) < len(texts):
+            logger.info(f"📦 Embedding cache: {len(texts) - len(missing)}/{len(texts)} texts cached")
+        
+        if missing:
+            fresh = dict(zip(missing, embed_missing(missing)))
+            try:
+                self.embedding_cache.put_many(model, fresh)
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding cache write failed: {e}")
+            found.update(fresh)
+        
+        return [found[text] for text in texts]
     
     def add_documents(self, chunks: List[Dict[str, Any]]) -> None:
         """
@@ -152,7 +167,9 @@ class RAGRetriever:
         import gc  # Import garbage collector
         
         try:
-            batch_size = 50  # Process 50 chunks at a time to manage memory
+            # Chunks per embed + insert round: enough for several concurrent
+            # embedding requests, small enough to keep the vectors in memory
+            batch_size = 500
             total_chunks = len(chunks)
             
             logger.info(f"📦 Adding {total_chunks} chunks in batches of {batch_size}...")
@@ -183,6 +200,13 @@ class RAGRetriever:
         except Exception as e:
             logger.error(f"❌ Error adding documents: {e}")
             raise
+        finally:
+            # Throttled: per-PDF and per-question callers flush once at the end
+            self.vector_store.save_lexical_index()
+    
+    def save_lexical_index(self) -> None:
+        """Write the BM25 index to disk now (call at the end of bulk ingestion)."""
+        self.vector_store.save_lexical_index(force=True)
     
     def retrieve(
         self,
@@ -190,7 +214,8 @@ class RAGRetriever:
         grade: Optional[int] = None,
         subject: Optional[str] = None,
         top_k: Optional[int] = None,
-        doc_type: Optional[str] = None
+        doc_type: Optional[str] = None,
+        mode: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Retrieve relevant context for a query.
@@ -201,32 +226,25 @@ class RAGRetriever:
             subject: Filter by subject
             top_k: Number of results to return
             doc_type: Filter by document type ("pyq", "ncert", or None for all)
+            mode: "vector", "hybrid" or "lexical" (defaults to settings.RETRIEVAL_MODE)
             
         Returns:
             Dict with retrieved documents, metadata, and distances
         """
         try:
-            # Generate query embedding
-            query_embeddings = self.get_embeddings([query])
-            query_embedding = query_embeddings[0]
-            
-            # Build filters
-            filters = {}
-            if grade is not None:
-                filters["grade"] = grade
-            if subject is not None:
-                filters["subject"] = subject.lower()
-            if doc_type is not None:
-                filters["doc_type"] = doc_type  # Changed from "type" to "doc_type"
-            
-            logger.info(f"🔎 RAG Retriever - Query: '{query[:50]}', Filters: {filters}, Top K: {top_k or 5}")
-            
-            # Search vector store
-            results = self.vector_store.search(
-                query_embedding=query_embedding,
-                top_k=top_k or 5,
-                filters=filters if filters else None
-            )
+            filters = self._build_filters(grade, subject, doc_type)
+            mode = self._resolve_mode(mode)
+            
+            cache_key = self.retrieval_cache.make_key(query, filters, top_k or 5, mode)
+            generation = self.vector_store.generation
+            cached = self.retrieval_cache.get(cache_key, generation)
+            if cached is not None:
+                logger.info(f"⚡ Retrieval cache hit for query: '{query[:50]}'")
+                return cached
+            
+            logger.info(f"🔎 RAG Retriever - Query: '{query[:50]}', Filters: {filters}, Top K: {top_k or 5}, Mode: {mode}")
+            
+            results = self._search([query], filters, top_k or 5, mode)[0]
             
             logger.info(f"📦 Vector Store returned: {len(results.get('documents', []))} docs, {len(results.get('metadatas', []))} metadata")
             if results.get('metadatas') and len(results['metadatas']) > 0:
@@ -234,12 +252,165 @@ class RAGRetriever:
             
             logger.info(f"Retrieved {len(results['documents'])} documents for query: '{query[:50]}...'")
             
+            self.retrieval_cache.set(cache_key, generation, results)
             return results
             
         except Exception as e:
             logger.error(f"Error retrieving documents: {e}")
             raise
     
+    def retrieve_many(
+        self,
+        queries: List[str],
+        grade: Optional[int] = None,
+        subject: Optional[str] = None,
+        top_k: Optional[int] = None,
+        doc_type: Optional[str] = None,
+        mode: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve context for several queries with one embedding call and one vector search.
+        
+        Args:
+            queries: Search query strings
+            grade: Filter by grade level
+            subject: Filter by subject
+            top_k: Number of results to return per query
+            doc_type: Filter by document type ("pyq", "ncert", or None for all)
+            mode: "vector", "hybrid" or "lexical" (defaults to settings.RETRIEVAL_MODE)
+            
+        Returns:
+            One dict with retrieved documents, metadata, and distances per query
+        """
+        try:
+            if not queries:
+                return []
+            
+            filters = self._build_filters(grade, subject, doc_type)
+            mode = self._resolve_mode(mode)
+            generation = self.vector_store.generation
+            cache_keys = [self.retrieval_cache.make_key(query, filters, top_k or 5, mode) for query in queries]
+            results = [self.retrieval_cache.get(key, generation) for key in cache_keys]
+            missing = [i for i, result in enumerate(results) if result is None]
+            
+            logger.info(f"🔎 RAG Retriever - {len(queries)} queries ({len(queries) - len(missing)} cached), Filters: {filters}, Top K: {top_k or 5}, Mode: {mode}")
+            
+            if missing:
+                fresh = self._search([queries[i] for i in missing], filters, top_k or 5, mode)
+                for i, result in zip(missing, fresh):
+                    results[i] = result
+                    self.retrieval_cache.set(cache_keys[i], generation, result)
+            
+            logger.info(f"Retrieved {sum(len(r['documents']) for r in results)} documents for {len(queries)} queries")
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error retrieving documents: {e}")
+            raise
+    
+    def _resolve_mode(self, mode: Optional[str]) -> str:
+        """Pick the retrieval mode; without an embedding provider only lexical search works."""
+        mode = (mode or settings.RETRIEVAL_MODE).lower()
+        if mode not in RETRIEVAL_MODES:
+            logger.warning(f"⚠️ Unknown retrieval mode '{mode}', using hybrid")
+            mode = "hybrid"
+        if mode != "lexical" and not self.embedding_provider:
+            return "lexical"
+        return mode
+    
+    def _search(
+        self,
+        queries: List[str],
+        filters: Dict[str, Any],
+        top_k: int,
+        mode: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Run uncached queries in the given mode.
+        
+        Args:
+            queries: Search query strings
+            filters: Metadata filters
+            top_k: Number of results per query
+            mode: "vector", "hybrid" or "lexical"
+            
+        Returns:
+            One dict with 'ids', 'documents', 'metadatas', 'distances' lists per query
+        """
+        if mode == "lexical":
+            # No embedding call: BM25 over the local index only
+            return [self.vector_store.lexical_search(query, top_k, filters or None) for query in queries]
+        
+        candidates = top_k * settings.HYBRID_CANDIDATES_FACTOR if mode == "hybrid" else top_k
+        vector_results = self.vector_store.search_many(
+            query_embeddings=self.embed_queries(queries),
+            top_k=candidates,
+            filters=filters if filters else None
+        )
+        if mode == "vector":
+            return vector_results
+        
+        return [
+            self._fuse(query, vector_result, filters, top_k, candidates)
+            for query, vector_result in zip(queries, vector_results)
+        ]
+    
+    def _fuse(
+        self,
+        query: str,
+        vector_result: Dict[str, List],
+        filters: Dict[str, Any],
+        top_k: int,
+        candidates: int
+    ) -> Dict[str, List]:
+        """
+        Merge vector and BM25 rankings with reciprocal rank fusion.
+        
+        Chunks that rank well in either list (a paraphrase the embedding
+        catches, an exact term like "Snell's law" BM25 catches) come first;
+        chunks found by both rank highest. Distances are 1 - fused score
+        relative to the best possible score (first in both lists).
+        """
+        lexical_hits = self.vector_store.lexical_index.search(query, candidates, filters or None)
+        fused = reciprocal_rank_fusion(
+            [vector_result["ids"], [doc_id for doc_id, _ in lexical_hits]],
+            k=settings.RRF_K
+        )[:top_k]
+        
+        known = {
+            doc_id: (doc, meta)
+            for doc_id, doc, meta in zip(vector_result["ids"], vector_result["documents"], vector_result["metadatas"])
+        }
+        # Chunks only BM25 found still need their text
+        fetched = self.vector_store.get_documents([doc_id for doc_id, _ in fused if doc_id not in known])
+        known.update(zip(fetched["ids"], zip(fetched["documents"], fetched["metadatas"])))
+        
+        best = 2.0 / (settings.RRF_K + 1)
+        fused = [(doc_id, score) for doc_id, score in fused if doc_id in known]
+        return {
+            "ids": [doc_id for doc_id, _ in fused],
+            "documents": [known[doc_id][0] for doc_id, _ in fused],
+            "metadatas": [known[doc_id][1] for doc_id, _ in fused],
+            "distances": [1.0 - score / best for _, score in fused]
+        }
+    
+    @staticmethod
+    def _build_filters(
+        grade: Optional[int],
+        subject: Optional[str],
+        doc_type: Optional[str]
+    ) -> Dict[str, Any]:
+        """Build vector store metadata filters."""
+        filters = {}
+        if grade is not None:
+            filters["grade"] = grade
+        if subject is not None:
+            filters["subject"] = subject.lower()
+        if doc_type is not None:
+            filters["doc_type"] = doc_type  # Changed from "type" to "doc_type"
+        return filters
+    
     def get_context_string(
         self,
         query: str,
@@ -260,7 +431,33 @@ class RAGRetriever:
             Formatted context string ready for prompt
         """
         results = self.retrieve(query, grade, subject, top_k)
+        return self._format_context(results)
+    
+    def get_context_strings(
+        self,
+        queries: List[str],
+        grade: Optional[int] = None,
+        subject: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> List[str]:
+        """
+        Batched version of get_context_string (one embedding call, one search).
         
+        Args:
+            queries: Search queries
+            grade: Filter by grade
+            subject: Filter by subject
+            top_k: Number of results per query
+            
+        Returns:
+            One formatted context string per query
+        """
+        results = self.retrieve_many(queries, grade, subject, top_k)
+        return [self._format_context(r) for r in results]
+    
+    @staticmethod
+    def _format_context(results: Dict[str, Any]) -> str:
+        """Format retrieval results as a single context string."""
         if not results["documents"]:
             logger.warning("No documents found for query")
             return "No relevant NCERT content found."
@@ -276,3 +473,45 @@ class RAGRetriever:
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector store."""
         return self.vector_store.get_stats()
+    
+    def warm_up(self, queries: List[str]) -> Dict[str, Any]:
+        """
+        Warm the retriever up before it serves traffic.
+        
+        Pages the vector index into the OS cache, then runs the queries as one
+        batched search, which loads the index, opens the embedding client's
+        channel and fills the embedding cache.
+        
+        Args:
+            queries: Canonical queries (results are not cached)
+            
+        Returns:
+            Dict with paged_mb, queries, ok and seconds
+        """
+        start = time.perf_counter()
+        paged = self.vector_store.warm_up()
+        
+        ok = True
+        if queries:
+            try:
+                self._search(queries, None, settings.TOP_K_RESULTS, self._resolve_mode(None))
+            except Exception as e:
+                ok = False
+                logger.warning(f"⚠️ Warm-up queries failed: {e}")
+        
+        result = {
+            "paged_mb": round(paged / 1024 / 1024, 1),
+            "queries": len(queries),
+            "ok": ok,
+            "seconds": round(time.perf_counter() - start, 2)
+        }
+        logger.info(f"🔥 Retriever warmed up: {result}")
+        return result
+    
+    def get_embedding_cache_stats(self) -> Dict[str, Any]:
+        """Get embedding cache hit/miss counters (empty if the cache is disabled)."""
+        return self.embedding_cache.get_stats() if self.embedding_cache else {}
+    
+    def get_retrieval_cache_stats(self) -> Dict[str, Any]:
+        """Get retrieval result cache hit/miss counters."""
+        return {**self.retrieval_cache.get_stats(), "generation": self.vector_store.generation}
@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields counted per value
+STATS_FIELDS = ("grade", "subject", "doc_type", "source")
+
+STATS_VERSION = 1
+
+
+def _sorted_values(values: Iterable[Any]) -> List[Any]:
+    """Sort values that may mix types (e.g. grades stored as int and str)."""
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=str)
+
+
+class VectorStoreStats:
+    """
+    Chunk counts per metadata value, kept alongside a vector store.
+
+    Updated as chunks are added or deleted, so reading the stats (health
+    checks, /api/rag/stats) never scans the collection.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.counts: Dict[str, Dict[Any, int]] = {field: {} for field in STATS_FIELDS}
+        self._lock = threading.Lock()
+
+    def add(self, metadatas: Iterable[Optional[Dict[str, Any]]]) -> None:
+        """Count newly stored chunks."""
+        with self._lock:
+            for meta in metadatas:
+                self.total += 1
+                for field in STATS_FIELDS:
+                    value = (meta or {}).get(field)
+                    if value is not None:
+                        self.counts[field][value] = self.counts[field].get(value, 0) + 1
+
+    def clear(self) -> None:
+        """Forget every chunk."""
+        with self._lock:
+            self.total = 0
+            self.counts = {field: {} for field in STATS_FIELDS}
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Stats in the shape VectorStore.get_stats returns.
+
+        Returns:
+            Dict with total_documents, subjects, grades, doc_types and
+            per-value counts for each field in STATS_FIELDS
+        """
+        with self._lock:
+            return {
+                "total_documents": self.total,
+                "subjects": _sorted_values(self.counts["subject"]),
+                "grades": _sorted_values(self.counts["grade"]),
+                "doc_types": _sorted_values(self.counts["doc_type"]),
+                "counts": {
+                    field: {str(value): count for value, count in values.items()}
+                    for field, values in self.counts.items()
+                }
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable form (values keep their types)."""
+        with self._lock:
+            return {
+                "version": STATS_VERSION,
+                "total": self.total,
+                "counts": {field: [[value, count] for value, count in values.items()] for field, values in self.counts.items()}
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "VectorStoreStats":
+        stats = cls()
+        stats.total = data["total"]
+        for field in STATS_FIELDS:
+            stats.counts[field] = {value: count for value, count in data["counts"].get(field, [])}
+        return stats
+
+    def save(self, path: str) -> None:
+        """Write the stats to a JSON file (atomically)."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        tmp.replace(target)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VectorStoreStats"]:
+        """
+        Read stats written by save().
+
+        Returns:
+            The stats, or None if the file is missing, unreadable or outdated
+        """
+        if not Path(path).exists():
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != STATS_VERSION:
+                return None
+            return cls.from_dict(data)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load vector store stats {path}: {e}")
+            return None
@@ -1,18 +1,63 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 from typing import List, Dict, Any, Optional
+from pathlib import Path
 import logging
+import time
 
 from config.settings import settings
+from rag.lexical_index import BM25Index
+from rag.store_stats import VectorStoreStats
 
 logger = logging.getLogger(__name__)
 
+# Min seconds between lexical index writes during incremental ingestion; an
+# index left behind the collection is rebuilt at the next startup
+LEXICAL_INDEX_SAVE_INTERVAL = 30.0
+
+# Chunks read per page when rebuilding the lexical index or stats from the collection
+LEXICAL_REBUILD_PAGE_SIZE = 1000
+
+# Bytes read per call when paging index files into the OS cache
+PAGE_IN_BLOCK_SIZE = 1 << 20
+
+def page_in_files(paths: List[Path]) -> int:
+    """
+    Read files once so their pages are in the OS page cache.
+    
+    Args:
+        paths: Files to read (missing or unreadable ones are skipped)
+        
+    Returns:
+        Bytes read
+    """
+    total = 0
+    buffer = bytearray(PAGE_IN_BLOCK_SIZE)
+    for path in paths:
+        try:
+            with open(path, "rb", buffering=0) as f:
+                while True:
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    total += read
+        except OSError as e:
+            logger.warning(f"⚠️ Could not page in {path}: {e}")
+    return total
+
 class VectorStore:
     """ChromaDB-based vector store for NCERT document chunks."""
     
-    def __init__(self):
-        """Initialize ChromaDB client and collection."""
+    def __init__(self, collection_name: Optional[str] = None):
+        """
+        Initialize ChromaDB client and collection.
+        
+        Args:
+            collection_name: Collection to use (defaults to settings.VECTOR_COLLECTION_NAME)
+        """
         try:
+            # Imported here: the memory-mapped backend serves without Chroma
+            import chromadb
+            from chromadb.config import Settings as ChromaSettings
+            
             self.client = chromadb.PersistentClient(
                 path=settings.CHROMA_PERSIST_DIR,
                 settings=ChromaSettings(
@@ -21,11 +66,25 @@ class VectorStore:
                 )
             )
             
+            name = collection_name or settings.VECTOR_COLLECTION_NAME
             self.collection = self.client.get_or_create_collection(
-                name=settings.VECTOR_COLLECTION_NAME,
+                name=name,
                 metadata={"description": "NCERT textbook embeddings for RAG"}
             )
             
+            # Bumped after every write; caches of search results are tagged with it
+            self.generation = 0
+            
+            # BM25 index over the same chunks, persisted next to the collection
+            self.lexical_index_path = str(Path(settings.CHROMA_PERSIST_DIR) / f"{name}.bm25.json.gz")
+            self.lexical_index = self._load_lexical_index()
+            self._lexical_dirty = False
+            self._lexical_saved_at = time.monotonic()
+            
+            # Counts per grade/subject/doc_type/source, so get_stats never scans
+            self.stats_path = str(Path(settings.CHROMA_PERSIST_DIR) / f"{name}.stats.json")
+            self.stats = self._load_stats()
+            
             logger.info(f"Vector store initialized: {self.collection.count()} documents")
             
         except Exception as e:
@@ -64,11 +123,21 @@ class VectorStore:
                 metadatas=metadatas
             )
             
+            self.lexical_index.add(ids, documents, metadatas)
+            self._lexical_dirty = True
+            self.stats.add(metadatas)
+            self._save_stats()
+            
             logger.info(f"Added {len(chunks)} documents to vector store")
             
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {e}")
+            # Part of the batch may have been written: recount
+            self.stats = self._rebuild_stats()
             raise
+        finally:
+            # Also after a failed add, which may have written part of the batch
+            self.generation += 1
     
     def search(
         self,
@@ -85,52 +154,209 @@ class VectorStore:
             filters: Metadata filters (e.g., {"grade": 6, "subject": "science"})
             
         Returns:
-            Dict with 'documents', 'metadatas', 'distances' lists
+            Dict with 'ids', 'documents', 'metadatas', 'distances' lists
+        """
+        return self.search_many([query_embedding], top_k=top_k, filters=filters)[0]
+    
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, List]]:
+        """
+        Search for several query embeddings in a single collection query.
+        
+        Args:
+            query_embeddings: Query vectors
+            top_k: Number of results per query (defaults to settings.TOP_K_RESULTS)
+            filters: Metadata filters applied to every query
+            
+        Returns:
+            One dict with 'ids', 'documents', 'metadatas', 'distances' lists per query
         """
         try:
             if top_k is None:
                 top_k = settings.TOP_K_RESULTS
             
-            # Build where clause for ChromaDB filters
-            # ChromaDB requires: {"$and": [{"key": {"$eq": value}}, ...]} format
-            where = None
-            if filters:
-                conditions = []
-                for key, value in filters.items():
-                    conditions.append({key: {"$eq": value}})
-                
-                if len(conditions) == 1:
-                    where = conditions[0]
-                elif len(conditions) > 1:
-                    where = {"$and": conditions}
+            if not query_embeddings:
+                return []
             
-            # Query collection
+            # Query collection (one round-trip for all queries)
             results = self.collection.query(
-                query_embeddings=[query_embedding],
+                query_embeddings=query_embeddings,  # type: ignore
                 n_results=top_k,
-                where=where
+                where=self._build_where(filters)
             )
             
-            # Return first result (since we only passed one query)
-            return {
-                "documents": results["documents"][0] if results["documents"] else [],
-                "metadatas": results["metadatas"][0] if results["metadatas"] else [],
-                "distances": results["distances"][0] if results["distances"] else []
-            }
+            return [
+                {
+                    "ids": results["ids"][i] if results["ids"] else [],
+                    "documents": results["documents"][i] if results["documents"] else [],
+                    "metadatas": results["metadatas"][i] if results["metadatas"] else [],
+                    "distances": results["distances"][i] if results["distances"] else []
+                }
+                for i in range(len(query_embeddings))
+            ]
             
         except Exception as e:
             logger.error(f"Error searching vector store: {e}")
             raise
     
+    def lexical_search(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List]:
+        """
+        Search the BM25 index (exact terms, no embedding needed).
+        
+        Args:
+            query: Query text
+            top_k: Number of results to return (defaults to settings.TOP_K_RESULTS)
+            filters: Metadata filters (e.g., {"grade": 6, "subject": "science"})
+            
+        Returns:
+            Dict with 'ids', 'documents', 'metadatas', 'distances' lists;
+            distances are 1 / (1 + BM25 score), so lower is still better
+        """
+        hits = self.lexical_index.search(query, top_k or settings.TOP_K_RESULTS, filters)
+        results = self.get_documents([doc_id for doc_id, _ in hits])
+        results["distances"] = [1.0 / (1.0 + score) for _, score in hits]
+        return results
+    
+    def get_documents(self, ids: List[str]) -> Dict[str, List]:
+        """
+        Fetch chunks by ID.
+        
+        Args:
+            ids: Chunk IDs
+            
+        Returns:
+            Dict with 'ids', 'documents', 'metadatas' lists, in the order of ids
+            (IDs no longer in the collection are left out)
+        """
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        
+        found = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            doc_id: (doc, meta)
+            for doc_id, doc, meta in zip(found["ids"], found["documents"] or [], found["metadatas"] or [])
+        }
+        ordered = [doc_id for doc_id in ids if doc_id in by_id]
+        return {
+            "ids": ordered,
+            "documents": [by_id[doc_id][0] for doc_id in ordered],
+            "metadatas": [by_id[doc_id][1] for doc_id in ordered]
+        }
+    
+    def _load_lexical_index(self) -> BM25Index:
+        """Load the persisted BM25 index, rebuilding it if it is missing or out of date."""
+        count = self.collection.count()
+        index = BM25Index.load(self.lexical_index_path)
+        if index is not None and len(index) == count:
+            logger.info(f"📚 Lexical index loaded: {count} chunks")
+            return index
+        
+        index = BM25Index()
+        if count == 0:
+            return index
+        
+        logger.info(f"📚 Building lexical index from {count} stored chunks...")
+        start = time.perf_counter()
+        for offset in range(0, count, LEXICAL_REBUILD_PAGE_SIZE):
+            page = self.collection.get(
+                limit=LEXICAL_REBUILD_PAGE_SIZE,
+                offset=offset,
+                include=["documents", "metadatas"]
+            )
+            index.add(page["ids"], page["documents"] or [], page["metadatas"] or [])
+        logger.info(f"✅ Lexical index built in {time.perf_counter() - start:.1f}s")
+        
+        try:
+            index.save(self.lexical_index_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save lexical index: {e}")
+        return index
+    
+    def _load_stats(self) -> VectorStoreStats:
+        """Load the persisted stats, rebuilding them if they are missing or out of date."""
+        stats = VectorStoreStats.load(self.stats_path)
+        if stats is not None and stats.total == self.collection.count():
+            return stats
+        return self._rebuild_stats()
+    
+    def _rebuild_stats(self) -> VectorStoreStats:
+        """Count the stored chunks' metadata (one paged scan) and persist the result."""
+        stats = VectorStoreStats()
+        try:
+            count = self.collection.count()
+            for offset in range(0, count, LEXICAL_REBUILD_PAGE_SIZE):
+                page = self.collection.get(limit=LEXICAL_REBUILD_PAGE_SIZE, offset=offset, include=["metadatas"])
+                stats.add(page["metadatas"] or [])
+            logger.info(f"📊 Vector store stats rebuilt: {stats.total} chunks")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not rebuild vector store stats: {e}")
+        self.stats = stats
+        self._save_stats()
+        return stats
+    
+    def _save_stats(self) -> None:
+        try:
+            self.stats.save(self.stats_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save vector store stats: {e}")
+    
+    def save_lexical_index(self, force: bool = False) -> None:
+        """
+        Persist the BM25 index if it changed.
+        
+        Args:
+            force: Write even if the last write was less than
+                LEXICAL_INDEX_SAVE_INTERVAL seconds ago
+        """
+        if not self._lexical_dirty:
+            return
+        if not force and time.monotonic() - self._lexical_saved_at < LEXICAL_INDEX_SAVE_INTERVAL:
+            return
+        try:
+            self.lexical_index.save(self.lexical_index_path)
+            self._lexical_dirty = False
+            self._lexical_saved_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save lexical index: {e}")
+    
+    @staticmethod
+    def _build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Build where clause for ChromaDB filters.
+        
+        ChromaDB requires: {"$and": [{"key": {"$eq": value}}, ...]} format
+        """
+        if not filters:
+            return None
+        
+        conditions = [{key: {"$eq": value}} for key, value in filters.items()]
+        
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
     def count(self) -> int:
         """Get total number of documents in the store."""
         return self.collection.count()
     
+    def get_all_metadatas(self) -> List[Dict[str, Any]]:
+        """Metadata of every chunk."""
+        return self.collection.get(include=["metadatas"])["metadatas"] or []
+    
     def delete_all(self) -> None:
         """Delete all documents from the collection (use carefully!)."""
         try:
-            # Get all IDs
-            all_ids = self.collection.get()["ids"]
+            # Get all IDs (without loading documents or metadata)
+            all_ids = self.collection.get(include=[])["ids"]
             
             if all_ids:
                 self.collection.delete(ids=all_ids)
@@ -141,45 +367,55 @@ class VectorStore:
         except Exception as e:
             logger.error(f"Error deleting documents: {e}")
             raise
+        finally:
+            self.generation += 1
+            self.lexical_index.clear()
+            self._lexical_dirty = True
+            self.save_lexical_index(force=True)
+            self.stats.clear()
+            self._save_stats()
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get statistics about the vector store."""
+        """
+        Get statistics about the vector store.
+        
+        Read from the counts maintained on every write - no collection scan.
+        """
+        return self.stats.summary()
+    
+    def warm_up(self) -> int:
+        """
+        Page the HNSW segment files under CHROMA_PERSIST_DIR into the OS cache.
+        
+        Chroma loads a collection's HNSW index into memory on its first query;
+        with the files already cached, that load is not disk-bound.
+        
+        Returns:
+            Bytes read
+        """
+        return page_in_files(sorted(Path(settings.CHROMA_PERSIST_DIR).glob("*/*.bin")))
+
+def open_vector_store(collection_name: str, embedding_model: Optional[str] = None) -> Any:
+    """
+    Open the configured vector store backend.
+    
+    With VECTOR_STORE_BACKEND="mmap", the read-only index exported to
+    VECTOR_INDEX_DIR/<collection> is served (no Chroma in memory); if it is
+    missing or unusable, the Chroma collection is used instead.
+    
+    Args:
+        collection_name: Chroma collection (also names the exported index)
+        embedding_model: Embedding space of the queries (checked against the export)
+        
+    Returns:
+        VectorStore or MmapVectorStore
+    """
+    if settings.VECTOR_STORE_BACKEND.lower() == "mmap":
+        index_dir = Path(settings.VECTOR_INDEX_DIR) / collection_name
         try:
-            count = self.collection.count()
-            
-            if count == 0:
-                return {
-                    "total_documents": 0,
-                    "subjects": [],
-                    "grades": []
-                }
-            
-            # Get all metadata
-            all_data = self.collection.get()
-            metadatas = all_data["metadatas"]
-            
-            # Extract unique subjects and grades
-            subjects = set()
-            grades = set()
-            
-            if metadatas:
-                for meta in metadatas:
-                 if "subject" in meta:
-                    subjects.add(meta["subject"])
-                 if "grade" in meta:
-                    grades.add(meta["grade"])
-            
-            return {
-                "total_documents": count,
-                "subjects": sorted(list(subjects)),
-                "grades": sorted(list(grades))
-            }
+            from rag.mmap_store import MmapVectorStore
             
+            return MmapVectorStore(str(index_dir), embedding_model=embedding_model)
         except Exception as e:
-            logger.error(f"Error getting stats: {e}")
-            return {
-                "total_documents": self.collection.count(),
-                "subjects": [],
-                "grades": [],
-                "error": str(e)
-            }
+            logger.warning(f"⚠️ Memory-mapped vector index unavailable ({index_dir}): {e} - using ChromaDB")
+    return VectorStore(collection_name)
@@ -2,11 +2,32 @@
 Persistent disk-based TTL cache for AI responses.
 Caches final JSON responses to reduce AI generation costs.
 Cache survives service restarts.
+
+Entries have a soft and a hard TTL (stale-while-revalidate): past the soft
+TTL the stale value is still served while a background task regenerates it;
+only past the hard TTL does a request wait for a fresh generation.
+
+Reads go through two tiers: a size-bounded in-process LRU holding
+already-validated response objects, then the diskcache (SQLite) store.
+Model responses are also stored pre-encoded as JSON bytes, so a hit can be
+sent as-is (see get_or_generate_json).
 """
 
+import asyncio
+import hashlib
 import logging
-from diskcache import Cache
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Set, Tuple, Type
+
+from config.settings import settings
+from utils.json_bytes import to_json_bytes
+from utils.topic_catalog import normalize_subject, topic_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -14,83 +35,620 @@ logger = logging.getLogger(__name__)
 project_root = Path(__file__).parent.parent
 cache_dir = project_root / ".ai_cache"
 
-# Global persistent cache: ~500MB size limit, TTL enforced per item
-ai_response_cache = Cache(
-    directory=str(cache_dir),
-    size_limit=1024 * 1024 * 500  # 500MB
-)
+# Global persistent cache: ~500MB size limit, TTL enforced per item. Opened on
+# first use, so importing this module does not load diskcache / SQLite.
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+
+def get_disk_cache():
+    """
+    Get the persistent cache, opening it on first use.
+    
+    Returns:
+        diskcache.Cache instance
+    """
+    global _disk_cache
+    if _disk_cache is None:
+        with _disk_cache_lock:
+            if _disk_cache is None:
+                from diskcache import Cache
+                
+                _disk_cache = Cache(
+                    directory=str(cache_dir),
+                    size_limit=1024 * 1024 * 500  # 500MB
+                )
+                logger.info(f"📦 Persistent cache initialized at: {cache_dir}")
+    return _disk_cache
+
+# (soft TTL, hard TTL) in seconds, by endpoint (first part of the cache key).
+# Curriculum content changes rarely, so stale entries stay servable for days.
+DEFAULT_TTLS = (3600, 24 * 3600)
+ENDPOINT_TTLS: Dict[str, Tuple[int, int]] = {
+    "scenario": (6 * 3600, 7 * 24 * 3600),
+    "derivations": (24 * 3600, 30 * 24 * 3600),
+    "pyq": (6 * 3600, 7 * 24 * 3600),
+    "learning_kit": (12 * 3600, 14 * 24 * 3600),
+    "exam_plan": (3600, 24 * 3600),  # Keyed on today's date, so never served the next day
+}
+
+# Marks values stored with an envelope (older entries are bare values)
+ENVELOPE_KEY = "__ai_cache_entry__"
+
+# Model fields left out of the cached JSON bytes, by endpoint. Scenario
+# derivations are cached separately and appended to the bytes per request.
+ENDPOINT_JSON_EXCLUDE: Dict[str, Set[str]] = {
+    "scenario": {"formulas_and_derivations_markdown"},
+}
 
-logger.info(f"📦 Persistent cache initialized at: {cache_dir}")
+# Key parts longer than this (e.g. a whole exam plan's topic list) are hashed
+MAX_KEY_PART_LENGTH = 64
+
+# Single-flight settings
+LOCK_PREFIX = "lock:"
+LOCK_TTL = 300  # Seconds a generation lock lives if its worker dies mid-generation
+LOCK_POLL_INTERVAL = 0.5  # Seconds between cache checks while another worker generates
+LOCK_WAIT_TIMEOUT = 240.0  # Seconds to wait on another worker before generating anyway
+
+# Generations in flight in this worker, by cache key (kept referenced until they finish)
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+def estimate_size(obj: Any, _seen: Optional[Set[int]] = None) -> int:
+    """
+    Estimate the in-memory size of a cached object in bytes.
+    
+    Walks dicts, lists, tuples, sets and object attributes (pydantic models)
+    once, counting shared objects only once.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(obj.__dict__, _seen)
+    return size
+
+
+class _MemoryEntry:
+    """One in-memory cache entry."""
+    
+    __slots__ = ("value", "model", "body", "stale_at", "expires_at", "size")
+    
+    def __init__(
+        self,
+        value: Any,
+        model: Optional[Type],
+        body: Optional[bytes],
+        stale_at: float,
+        expires_at: float,
+        size: int
+    ):
+        self.value = value
+        self.model = model
+        self.body = body
+        self.stale_at = stale_at
+        self.expires_at = expires_at
+        self.size = size
+
+
+class MemoryTier:
+    """
+    Size-bounded in-process LRU in front of the disk cache.
+    
+    Holds validated objects (e.g. ScenarioResponse instances), so a hot
+    topic is served without disk I/O, unpickling or pydantic validation.
+    Treat returned objects as read-only: they are shared between requests.
+    """
+    
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the memory tier.
+        
+        Args:
+            max_bytes: Budget for the estimated size of all entries
+        """
+        self.max_bytes = max_bytes
+        # Larger entries would evict most of the tier; they stay disk-only
+        self.max_entry_bytes = max_bytes // 4
+        self._entries: "OrderedDict[str, _MemoryEntry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str, model: Optional[Type] = None) -> Optional[_MemoryEntry]:
+        """Get a live entry stored for `model`, marking it most recently used."""
+        entry = self._entries.get(key)
+        if entry is not None and time.time() >= entry.expires_at:
+            self.pop(key)
+            entry = None
+        if entry is None or entry.model is not model:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        model: Optional[Type],
+        stale_at: float,
+        expires_at: float,
+        body: Optional[bytes] = None
+    ) -> None:
+        """Store an entry, evicting least recently used entries over budget."""
+        self.pop(key)
+        size = estimate_size(value) + (len(body) if body else 0)
+        if size > self.max_entry_bytes:
+            return
+        self._entries[key] = _MemoryEntry(value, model, body, stale_at, expires_at, size)
+        self.bytes += size
+        self._evict()
+    
+    def set_body(self, key: str, body: bytes) -> None:
+        """Attach encoded JSON to an existing entry."""
+        entry = self._entries.get(key)
+        if entry is None or entry.body is not None:
+            return
+        entry.body = body
+        entry.size += len(body)
+        self.bytes += len(body)
+        self._evict()
+    
+    def _evict(self) -> None:
+        """Drop least recently used entries until within budget."""
+        while self.bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+    
+    def pop(self, key: str) -> None:
+        """Drop an entry if present."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+    
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._entries.clear()
+        self.bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size accounting."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "items": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# In-process tier (one per worker)
+memory_tier = MemoryTier(max_bytes=settings.AI_CACHE_MEMORY_MB * 1024 * 1024)
+
+# Disk tier counters (this worker only)
+disk_stats = {"hits": 0, "stale_hits": 0, "misses": 0}
 
 
 def build_cache_key(
     endpoint: str,
     grade: int | None = None,
-    subject: str | None = None,
-    topic: str | None = None,
+    subject: str | Sequence[str] | None = None,
+    topic: str | Sequence[str | Tuple[str, str]] | None = None,
     extra: str | None = None
 ) -> str:
     """
     Build a cache key from endpoint and parameters.
     
+    Topics are resolved to canonical IDs through the topic catalog, so
+    differently worded requests for the same chapter share one entry.
+    Parts longer than MAX_KEY_PART_LENGTH are replaced by a hash.
+    
     Args:
         endpoint: Name of the endpoint (e.g., "scenario", "pyq", "flashcards")
         grade: Grade level
-        subject: Subject name
-        topic: Topic name
+        subject: Subject name, or several subjects (order does not matter)
+        topic: Topic name, or several topics (order does not matter); a
+            (topic, subject) pair is resolved against its own subject
         extra: Any extra identifier
     
     Returns:
-        Cache key string like "scenario:10:physics:reflection of light"
+        Cache key string like "scenario:10:physics:physics.ray-optics"
     """
     parts = [endpoint]
     
     if grade is not None:
         parts.append(str(grade))
     
-    if subject:
-        parts.append(subject.lower().strip())
+    subjects = [subject] if isinstance(subject, str) else list(subject or [])
+    subjects = sorted({normalize_subject(name) for name in subjects if name})
+    if subjects:
+        parts.append(_key_part(",".join(subjects)))
     
     if topic:
-        parts.append(topic.lower().strip())
+        topics = [topic] if isinstance(topic, str) else topic
+        # A single subject disambiguates chapters that share a name
+        topic_subject = subjects[0] if len(subjects) == 1 else None
+        topic_ids = set()
+        for item in topics:
+            name, item_subject = item if isinstance(item, tuple) else (item, topic_subject)
+            if name:
+                topic_ids.add(topic_catalog.resolve(name, item_subject))
+        parts.append(_key_part(",".join(sorted(topic_ids))))
     
     if extra:
-        parts.append(extra.lower().strip())
+        parts.append(_key_part(extra.lower().strip()))
     
     return ":".join(parts)
 
 
-def get_from_cache(cache_key: str):
+def _key_part(text: str) -> str:
+    """Return a key part as-is, or a short stable hash if it is too long."""
+    if len(text) <= MAX_KEY_PART_LENGTH:
+        return text
+    return "h" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+def get_ttls(cache_key: str) -> Tuple[int, int]:
+    """
+    Get the (soft, hard) TTL for a cache key from its endpoint prefix.
+    
+    Args:
+        cache_key: Key from build_cache_key
+    
+    Returns:
+        (soft TTL, hard TTL) in seconds
+    """
+    return ENDPOINT_TTLS.get(cache_key.split(":", 1)[0], DEFAULT_TTLS)
+
+
+def _read(
+    cache_key: str,
+    model: Optional[Type] = None,
+    skip_memory: bool = False
+) -> Tuple[Any, Optional[bytes], bool]:
     """
-    Get value from persistent cache.
+    Read a cache entry through the memory tier, then the disk tier.
     
     Args:
         cache_key: The cache key to look up
+        model: Optional pydantic model to validate disk values into
+        skip_memory: Go straight to disk (to see values written by other workers)
     
     Returns:
-        Cached value if exists and not expired, None otherwise
+        (value, JSON bytes or None, is_stale) - value is None on a miss
+        (or past the hard TTL)
     """
-    value = ai_response_cache.get(cache_key)
+    if not skip_memory:
+        entry = memory_tier.get(cache_key, model)
+        if entry is not None:
+            return entry.value, entry.body, time.time() >= entry.stale_at
+    
+    raw, expire_time = get_disk_cache().get(cache_key, expire_time=True)
+    if raw is None:
+        disk_stats["misses"] += 1
+        return None, None, False
+    
+    if isinstance(raw, dict) and ENVELOPE_KEY in raw:
+        value, body, stale_at = raw["value"], raw.get("body"), raw["stale_at"]
+    else:
+        # Entry written before soft TTLs existed: serve it, but refresh it
+        value, body, stale_at = raw, None, 0.0
+    
+    if model is not None:
+        try:
+            value = model(**value)
+        except Exception as e:
+            logger.warning(f"⚠️ Dropping cache entry that no longer validates ({cache_key}): {e}")
+            get_disk_cache().delete(cache_key)
+            disk_stats["misses"] += 1
+            return None, None, False
+    
+    is_stale = time.time() >= stale_at
+    disk_stats["stale_hits" if is_stale else "hits"] += 1
+    memory_tier.set(cache_key, value, model, stale_at, expire_time or float("inf"), body)
+    return value, body, is_stale
+
+
+def _encode(cache_key: str, value: Any) -> bytes:
+    """Encode a response for a key, leaving out its endpoint's excluded fields."""
+    return to_json_bytes(value, exclude=ENDPOINT_JSON_EXCLUDE.get(cache_key.split(":", 1)[0]))
+
+
+def get_from_cache(cache_key: str, model: Optional[Type] = None):
+    """
+    Get value from the cache (memory tier, then disk).
+    
+    Stale entries (past the soft TTL) are returned too; use get_or_generate
+    to have them refreshed in the background.
+    
+    Args:
+        cache_key: The cache key to look up
+        model: Optional pydantic model; the value is returned validated into it
+    
+    Returns:
+        Cached value if exists and not past its hard TTL, None otherwise
+    """
+    value, _, is_stale = _read(cache_key, model)
     
     if value is not None:
-        logger.info(f"⚡ CACHE HIT (persistent): {cache_key}")
+        logger.info(f"⚡ CACHE HIT{' (stale)' if is_stale else ''}: {cache_key}")
         return value
     
     logger.info(f"🐢 CACHE MISS: {cache_key}")
     return None
 
 
-def set_cache(cache_key: str, value: dict):
+def set_cache(
+    cache_key: str,
+    value: Any,
+    soft_ttl: Optional[int] = None,
+    hard_ttl: Optional[int] = None
+) -> Optional[bytes]:
     """
-    Store value in persistent cache with TTL.
+    Store value in persistent cache with soft and hard TTLs.
     
     Args:
         cache_key: The cache key
-        value: The value to cache (must be dict or list)
+        value: The value to cache (dict, list or pydantic model)
+        soft_ttl: Seconds until the entry is refreshed in the background (default: per endpoint)
+        hard_ttl: Seconds until the entry is dropped (default: per endpoint)
+    
+    Returns:
+        The JSON bytes stored alongside a pydantic model value, else None
+    """
+    default_soft, default_hard = get_ttls(cache_key)
+    soft_ttl = soft_ttl if soft_ttl is not None else default_soft
+    hard_ttl = hard_ttl if hard_ttl is not None else default_hard
+    
+    body = None
+    if hasattr(value, "model_dump"):
+        body = _encode(cache_key, value)
+        value = value.model_dump()
+    
+    entry = {
+        ENVELOPE_KEY: 1,
+        "value": value,
+        "body": body,
+        "stale_at": time.time() + soft_ttl,
+    }
+    get_disk_cache().set(cache_key, entry, expire=hard_ttl)
+    # The memory tier is refilled (with a validated object) on the next read
+    memory_tier.pop(cache_key)
+    logger.info(f"💾 Cached response (persistent, soft TTL={soft_ttl}s, hard TTL={hard_ttl}s): {cache_key}")
+    return body
+
+
+async def get_or_generate(
+    cache_key: str,
+    producer: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]] = None,
+    model: Optional[Type] = None
+) -> Any:
+    """
+    Get a value from the cache, generating it at most once on a miss.
+    
+    Concurrent misses for the same key wait on one in-flight generation:
+    inside this worker through a shared task, and across workers through a
+    lock entry in the diskcache directory (the lock holder generates, the
+    others poll the cache until the value appears).
+    
+    A stale hit (past the soft TTL) is returned immediately and the value is
+    regenerated in the background; only a miss waits for the producer.
+    
+    The generation runs in a task of its own, so a waiter that is cancelled
+    (client disconnect, proxy timeout) stops waiting without failing it for
+    the others.
+    
+    Args:
+        cache_key: Key from build_cache_key
+        producer: Async callable returning the value to cache (dict or list)
+        should_cache: Optional check on the produced value; when it returns
+            False (e.g. a mock or fallback result) the value is returned to
+            every waiter but not cached, and a background refresh keeps the
+            stale value
+        model: Optional pydantic model; values are validated into it once and
+            kept validated in the memory tier (treat them as read-only)
+    
+    Returns:
+        Cached or freshly generated value (a `model` instance if given)
+    """
+    value, _ = await _get_or_generate(cache_key, producer, should_cache, model, need_body=False)
+    return value
+
+
+async def get_or_generate_json(
+    cache_key: str,
+    producer: Callable[[], Awaitable[Any]],
+    model: Type,
+    should_cache: Optional[Callable[[Any], bool]] = None
+) -> Tuple[Any, bytes]:
+    """
+    Like get_or_generate, but also return the response encoded as JSON bytes.
+    
+    The bytes are cached with the value, so a hit can be returned with
+    json_bytes_response() without validating or re-encoding anything.
+    
+    Args:
+        cache_key: Key from build_cache_key
+        producer: Async callable returning the value (model instance or dict)
+        model: Pydantic response model
+        should_cache: Optional check on the produced value (see get_or_generate)
+    
+    Returns:
+        (model instance, JSON bytes encoded by alias)
+    """
+    return await _get_or_generate(cache_key, producer, should_cache, model, need_body=True)
+
+
+async def _get_or_generate(
+    cache_key: str,
+    producer: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]],
+    model: Optional[Type],
+    need_body: bool
+) -> Tuple[Any, Optional[bytes]]:
+    """Shared implementation of get_or_generate / get_or_generate_json."""
+    value, body, is_stale = _read(cache_key, model)
+    if value is not None:
+        if is_stale:
+            _start_revalidation(cache_key, producer, should_cache, model)
+            logger.info(f"♻️ CACHE HIT (stale, revalidating): {cache_key}")
+        else:
+            logger.info(f"⚡ CACHE HIT: {cache_key}")
+        if need_body and body is None:
+            # Entry cached before bytes were stored alongside values
+            body = _encode(cache_key, value)
+            memory_tier.set_body(cache_key, body)
+        return value, body
+    
+    logger.info(f"🐢 CACHE MISS: {cache_key}")
+    generation = _in_flight.get(cache_key)
+    if generation is not None:
+        logger.info(f"🔗 Joining in-flight generation: {cache_key}")
+    else:
+        generation = _start_generation(cache_key, producer, should_cache, model, wait_for_lock=True)
+    # Shielded: cancelling this request must not cancel the generation others wait on
+    value, body = await asyncio.shield(generation)
+    
+    if need_body and body is None:
+        body = _encode(cache_key, value)
+    return value, body
+
+
+def _start_revalidation(
+    cache_key: str,
+    producer: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]],
+    model: Optional[Type]
+) -> None:
+    """Regenerate a stale entry in the background, unless that is already happening."""
+    if cache_key in _in_flight:
+        return
+    
+    def log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            # The stale value stays in place until its hard TTL (or the next refresh)
+            logger.warning(f"⚠️ Background revalidation failed for {cache_key}: {task.exception()}")
+    
+    _start_generation(cache_key, producer, should_cache, model, wait_for_lock=False).add_done_callback(log_failure)
+
+
+def _start_generation(
+    cache_key: str,
+    producer: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]],
+    model: Optional[Type],
+    wait_for_lock: bool
+) -> asyncio.Task:
+    """
+    Start one generation for a key, detached from the request that missed.
+    
+    Every waiter (the first one included) awaits the task through
+    asyncio.shield; it stays in _in_flight until it finishes, so later
+    misses in this worker join it.
+    """
+    task = asyncio.create_task(
+        _generate_once_across_workers(cache_key, producer, should_cache, model, wait_for_lock)
+    )
+    _in_flight[cache_key] = task
+    
+    def finished(done: asyncio.Task) -> None:
+        if _in_flight.get(cache_key) is done:
+            del _in_flight[cache_key]
+        if not done.cancelled():
+            # Mark the exception retrieved when nobody is waiting any more
+            done.exception()
+    
+    task.add_done_callback(finished)
+    return task
+
+
+async def _generate_once_across_workers(
+    cache_key: str,
+    producer: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]],
+    model: Optional[Type],
+    wait_for_lock: bool
+) -> Tuple[Any, Optional[bytes]]:
+    """
+    Generate a value while holding the cross-worker lock for its key.
+    
+    With wait_for_lock=False (background revalidation) a lock held by another
+    worker means that worker is already refreshing the entry, so the current
+    cached value is returned instead.
+    """
+    lock_key = LOCK_PREFIX + cache_key
+    token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    deadline = time.monotonic() + LOCK_WAIT_TIMEOUT
+    
+    # add() only succeeds if the key is absent, so exactly one worker gets the lock
+    while not get_disk_cache().add(lock_key, token, expire=LOCK_TTL):
+        if not wait_for_lock:
+            return _read(cache_key, model)[:2]
+        if time.monotonic() > deadline:
+            logger.warning(f"⏱️ Gave up waiting for another worker, generating: {cache_key}")
+            token = None
+            break
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        value, body, is_stale = _read(cache_key, model, skip_memory=True)
+        if value is not None and not is_stale:
+            logger.info(f"⚡ CACHE HIT (generated by another worker): {cache_key}")
+            return value, body
+    
+    try:
+        # Another worker may have finished between our miss and taking the lock
+        value, body, is_stale = _read(cache_key, model, skip_memory=True)
+        if value is not None and not is_stale:
+            return value, body
+        
+        value = await producer()
+        cacheable = should_cache is None or should_cache(value)
+        if model is not None and not isinstance(value, model):
+            value = model(**value)
+        body = None
+        if not cacheable:
+            logger.warning(f"🚫 Not caching rejected result: {cache_key}")
+        else:
+            body = set_cache(cache_key, value)
+            soft_ttl, hard_ttl = get_ttls(cache_key)
+            now = time.time()
+            memory_tier.set(cache_key, value, model, now + soft_ttl, now + hard_ttl, body)
+        return value, body
+    finally:
+        if token is not None:
+            disk_cache = get_disk_cache()
+            with disk_cache.transact():
+                if disk_cache.get(lock_key) == token:
+                    disk_cache.delete(lock_key)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Get hit/miss counters per cache tier for this worker.
+    
+    Returns:
+        {"memory": {...}, "disk": {...}, "in_flight": int, "topics": {...}}
     """
-    # Set with 1 hour expiration
-    ai_response_cache.set(cache_key, value, expire=3600)
-    logger.info(f"💾 Cached response (persistent, TTL=1h): {cache_key}")
+    disk_cache = get_disk_cache()
+    return {
+        "memory": memory_tier.stats(),
+        "disk": {**disk_stats, "items": len(disk_cache), "bytes": disk_cache.volume()},
+        "in_flight": len(_in_flight),
+        "topics": topic_catalog.get_stats(),
+    }
 
 
 def clear_cache():
@@ -98,5 +656,6 @@ def clear_cache():
     Clear all cached data.
     Useful for testing or maintenance.
     """
-    ai_response_cache.clear()
+    get_disk_cache().clear()
+    memory_tier.clear()
     logger.info("🧹 Cache cleared")
@@ -8,7 +8,6 @@ built offline, avoiding the memory-intensive PDF processing on Render.
 import os
 import logging
 from pathlib import Path
-from google.cloud import storage
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +33,7 @@ def download_chromadb_from_gcs(bucket_name: str, remote_path: str = "chroma_db",
         local_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize GCS client
+        from google.cloud import storage
         client = storage.Client()
         bucket = client.bucket(bucket_name)
         
@@ -0,0 +1,274 @@
+"""
+Shared Google Cloud / Gemini clients.
+
+Every agent used to load the service account file and call vertexai.init()
+in its constructor (and some per request), and each built its own API
+clients. The registry does that work once per process, on first use:
+- the service account credentials are read once
+- vertexai.init() / google.generativeai.configure() run once
+- model handles and TTS / Vision clients are created once per name and
+  shared, so their gRPC channels and connection pools are reused
+
+Importing this module or constructing an agent costs nothing. The service
+creates the handles it serves with during startup (warm_up(), off the
+event loop); anything else is created on first use.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """Process-wide, lazily initialised Vertex AI / Gemini / TTS / Vision handles."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._credentials: Any = None
+        self._credentials_loaded = False
+        self._vertex_ready: Optional[bool] = None
+        self._genai_configured = False
+        self._handles: Dict[Tuple[str, str], Any] = {}
+        self._failures: Dict[Tuple[str, str], str] = {}
+
+    @property
+    def gcp_configured(self) -> bool:
+        """Whether a GCP project and credentials are set."""
+        return bool(settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS)
+
+    def credentials(self) -> Any:
+        """
+        Get the service account credentials (read from disk once).
+
+        Returns:
+            google.oauth2 Credentials, or None if not configured / not found
+        """
+        if self._credentials_loaded:
+            return self._credentials
+        with self._lock:
+            if not self._credentials_loaded:
+                self._credentials = self._load_credentials()
+                self._credentials_loaded = True
+        return self._credentials
+
+    def _load_credentials(self) -> Any:
+        if not self.gcp_configured:
+            logger.warning("⚠️ GCP_PROJECT_ID or credentials not set - Vertex AI clients unavailable")
+            return None
+        if not os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
+            logger.error(f"❌ Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
+            return None
+        try:
+            from google.oauth2 import service_account
+
+            credentials = service_account.Credentials.from_service_account_file(
+                settings.GOOGLE_APPLICATION_CREDENTIALS
+            )
+            logger.info(f"🔑 Loaded credentials from: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
+            return credentials
+        except Exception as e:
+            logger.error(f"❌ Failed to load credentials: {e}")
+            return None
+
+    def init_vertex(self) -> bool:
+        """
+        Initialise Vertex AI (once per process).
+
+        Returns:
+            True if Vertex AI is ready to use
+        """
+        if self._vertex_ready is not None:
+            return self._vertex_ready
+        with self._lock:
+            if self._vertex_ready is None:
+                credentials = self.credentials()
+                ready = False
+                if credentials is not None:
+                    try:
+                        import vertexai
+
+                        vertexai.init(
+                            project=settings.GCP_PROJECT_ID,
+                            location=settings.GCP_LOCATION,
+                            credentials=credentials
+                        )
+                        logger.info(f"✅ Vertex AI initialized: {settings.GCP_PROJECT_ID} ({settings.GCP_LOCATION})")
+                        ready = True
+                    except Exception as e:
+                        logger.error(f"❌ Vertex AI initialization failed: {e}")
+                self._vertex_ready = ready
+        return self._vertex_ready
+
+    def _get(self, kind: str, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Get a shared handle, creating it on first use.
+
+        A failed creation is remembered (and logged once), not retried on
+        every request.
+        """
+        key = (kind, name)
+        handle = self._handles.get(key)
+        if handle is not None or key in self._failures:
+            return handle
+        with self._lock:
+            if key not in self._handles and key not in self._failures:
+                try:
+                    self._handles[key] = factory()
+                    logger.info(f"✅ {kind} client ready: {name}")
+                except Exception as e:
+                    self._failures[key] = str(e)
+                    logger.error(f"❌ Failed to create {kind} client {name}: {e}")
+            return self._handles.get(key)
+
+    def generative_model(self, model_name: Optional[str] = None) -> Any:
+        """
+        Get a Vertex AI Gemini model handle.
+
+        Args:
+            model_name: Model name (defaults to settings.GENERATION_MODEL)
+
+        Returns:
+            vertexai GenerativeModel, or None if Vertex AI is unavailable
+        """
+        if not self.init_vertex():
+            return None
+
+        def create():
+            from vertexai.preview.generative_models import GenerativeModel
+            return GenerativeModel(model_name or settings.GENERATION_MODEL)
+
+        return self._get("vertex_gemini", model_name or settings.GENERATION_MODEL, create)
+
+    def text_embedding_model(self, model_name: Optional[str] = None) -> Any:
+        """
+        Get a Vertex AI text embedding model handle.
+
+        Args:
+            model_name: Model name (defaults to settings.EMBEDDING_MODEL)
+
+        Returns:
+            TextEmbeddingModel, or None if Vertex AI is unavailable
+        """
+        if not self.init_vertex():
+            return None
+
+        def create():
+            from vertexai.language_models import TextEmbeddingModel
+            return TextEmbeddingModel.from_pretrained(model_name or settings.EMBEDDING_MODEL)
+
+        return self._get("vertex_embedding", model_name or settings.EMBEDDING_MODEL, create)
+
+    def image_generation_model(self, model_name: str) -> Any:
+        """
+        Get a Vertex AI Imagen model handle.
+
+        Args:
+            model_name: Imagen model name
+
+        Returns:
+            ImageGenerationModel, or None if Vertex AI is unavailable
+        """
+        if not self.init_vertex():
+            return None
+
+        def create():
+            from vertexai.preview.vision_models import ImageGenerationModel
+            return ImageGenerationModel.from_pretrained(model_name)
+
+        return self._get("vertex_imagen", model_name, create)
+
+    def genai_model(self, model_name: Optional[str] = None) -> Any:
+        """
+        Get a Gemini API (google.generativeai) model handle.
+
+        Args:
+            model_name: Model name (defaults to settings.GENERATION_MODEL)
+
+        Returns:
+            google.generativeai GenerativeModel
+        """
+        import google.generativeai as genai
+
+        if not self._genai_configured:
+            with self._lock:
+                if not self._genai_configured:
+                    genai.configure(api_key=settings.GEMINI_API_KEY)
+                    self._genai_configured = True
+
+        name = model_name or settings.GENERATION_MODEL
+        return self._get("gemini_api", name, lambda: genai.GenerativeModel(name))
+
+    def tts_client(self) -> Any:
+        """
+        Get the Cloud Text-to-Speech client.
+
+        Returns:
+            TextToSpeechClient, or None if credentials are unavailable
+        """
+        credentials = self.credentials()
+        if credentials is None:
+            return None
+
+        def create():
+            from google.cloud import texttospeech
+            return texttospeech.TextToSpeechClient(credentials=credentials)
+
+        return self._get("tts", "texttospeech", create)
+
+    def vision_client(self) -> Any:
+        """
+        Get the Cloud Vision client.
+
+        Returns:
+            ImageAnnotatorClient, or None if credentials are unavailable
+        """
+        credentials = self.credentials()
+        if credentials is None:
+            return None
+
+        def create():
+            from google.cloud import vision
+            return vision.ImageAnnotatorClient(credentials=credentials)
+
+        return self._get("vision", "image_annotator", create)
+
+    def warm_up(self) -> Dict[str, bool]:
+        """
+        Create the handles the API serves with (blocking: run it off the event loop).
+
+        Afterwards no request pays for the SDK imports, vertexai.init or
+        channel setup; the agents' model / client properties just return
+        the cached handles.
+
+        Returns:
+            Whether each handle could be created
+        """
+        handles = {
+            "gemini": self.generative_model(),
+            "tts": self.tts_client(),
+            "vision": self.vision_client(),
+        }
+        if settings.GEMINI_API_KEY:
+            handles["gemini_api"] = self.genai_model()
+        created = {name: handle is not None for name, handle in handles.items()}
+        logger.info(f"🔌 Shared clients: {created}")
+        return created
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Which clients have been created (and which failed)."""
+        return {
+            "credentials_loaded": self._credentials is not None,
+            "vertex_initialized": bool(self._vertex_ready),
+            "genai_configured": self._genai_configured,
+            "clients": sorted(f"{kind}:{name}" for kind, name in self._handles),
+            "failed": {f"{kind}:{name}": error for (kind, name), error in self._failures.items()},
+        }
+
+
+# Global registry instance
+clients = ClientRegistry()
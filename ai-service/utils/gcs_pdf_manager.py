@@ -7,8 +7,6 @@ import os
 import logging
 from pathlib import Path
 from typing import Optional
-from google.cloud import storage
-from google.oauth2 import service_account
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +23,7 @@ class GCSPDFManager:
         """Initialize GCS client"""
         try:
             # Google SDK will use GOOGLE_APPLICATION_CREDENTIALS env var
+            from google.cloud import storage
             self.storage_client = storage.Client()
             logger.info(f"✅ GCS client initialized for bucket: {self.bucket_name}")
         except Exception as e:
@@ -0,0 +1,106 @@
+"""
+Incremental parser for a streamed top-level JSON object.
+
+Gemini streams a scenario as one large JSON object. Rather than waiting for the
+last token and calling `json.loads` on the whole thing, the parser is fed each
+chunk as it arrives and returns every top-level member ("greeting",
+"keyConcepts", "quiz", ...) as soon as that member's value is complete.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalObjectParser:
+    """
+    Parse a JSON object chunk by chunk, yielding complete top-level members.
+
+    Text before the opening brace (e.g. a ```json fence) and after the closing
+    brace is ignored. Only string/bracket state is tracked while scanning, so
+    each character is visited once; a member's value is decoded with
+    `json.loads` once its closing comma or brace has been seen.
+
+    Usage:
+        parser = IncrementalObjectParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+        if parser.complete and not parser.errors:
+            data = parser.result
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.result: Dict[str, Any] = {}
+        self.errors: List[str] = []
+        self.started = False
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text.
+
+        Args:
+            chunk: Next piece of the model output
+
+        Returns:
+            (key, value) for each top-level member completed by this chunk
+        """
+        self.text += chunk
+        members: List[Tuple[str, Any]] = []
+        text = self.text
+        i = self._pos
+
+        while i < len(text) and not self.complete:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(text[self._member_start:i], members)
+                    self.complete = True
+            elif ch == "," and self._depth == 1:
+                self._emit(text[self._member_start:i], members)
+                self._member_start = i + 1
+            i += 1
+
+        self._pos = i
+        return members
+
+    def _emit(self, segment: str, members: List[Tuple[str, Any]]) -> None:
+        """Decode one `"key": value` segment and record it."""
+        segment = segment.strip()
+        if not segment:
+            return
+        try:
+            member = json.loads("{" + segment + "}")
+        except json.JSONDecodeError as e:
+            logger.warning(f"⚠️ Could not parse streamed JSON member: {e.msg} in {segment[:80]!r}")
+            self.errors.append(e.msg)
+            return
+        for key, value in member.items():
+            self.result[key] = value
+            members.append((key, value))
@@ -0,0 +1,81 @@
+"""
+Fast JSON encoding for cached API responses.
+
+Cache hits return the stored bytes as-is, so a hot scenario is neither
+re-validated by pydantic nor re-encoded by FastAPI's stdlib encoder.
+orjson is used when installed, with the stdlib json module as a fallback.
+"""
+
+import json
+from typing import Any, Optional, Set
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode a JSON-compatible value to compact UTF-8 bytes.
+
+    Args:
+        value: dict / list / scalar (already in JSON mode)
+
+    Returns:
+        JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def to_json_bytes(value: Any, exclude: Optional[Set[str]] = None) -> bytes:
+    """
+    Encode a response the way FastAPI would (pydantic models by alias).
+
+    Args:
+        value: Pydantic model or JSON-compatible value
+        exclude: Model field names to leave out (models only)
+
+    Returns:
+        JSON bytes
+    """
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(mode="json", by_alias=True, exclude=exclude)
+    return dumps(value)
+
+
+def add_json_field(body: bytes, key: str, value: Any) -> bytes:
+    """
+    Append a field to an encoded JSON object without decoding it.
+
+    Args:
+        body: Encoded JSON object that does not contain `key`
+        key: Field name
+        value: JSON-compatible field value
+
+    Returns:
+        JSON bytes of the object with the extra field
+    """
+    field = dumps(key) + b":" + dumps(value)
+    body = body.strip()
+    if body == b"{}":
+        return b"{" + field + b"}"
+    return body[:-1] + b"," + field + b"}"
+
+
+def json_bytes_response(body: bytes, status_code: int = 200) -> Response:
+    """
+    Wrap pre-encoded JSON in a response that FastAPI sends untouched.
+
+    Args:
+        body: JSON bytes
+        status_code: HTTP status code
+
+    Returns:
+        Response with media type application/json
+    """
+    return Response(content=body, status_code=status_code, media_type="application/json")
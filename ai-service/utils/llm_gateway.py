@@ -0,0 +1,339 @@
+"""
+Async gateway for blocking model calls.
+
+Every Gemini / Vertex AI SDK call in the agents is synchronous. Calling it
+directly inside an `async def` freezes the uvicorn event loop for the whole
+10-30s generation, so no other request on the worker can make progress.
+
+The gateway runs those calls on a bounded thread pool and adds, per call site:
+- a concurrency limit (asyncio semaphore)
+- a timeout
+- latency / error / timeout metrics
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Per call site limits: max concurrent calls and timeout (seconds).
+# Call sites not listed here use LLM_DEFAULT_CONCURRENCY / LLM_DEFAULT_TIMEOUT.
+DEFAULT_CALL_SITE_LIMITS: Dict[str, Dict[str, float]] = {
+    "scenario": {"max_concurrency": 4, "timeout": 120.0},
+    "scenario_stream": {"max_concurrency": 4, "timeout": 120.0},
+    "derivations": {"max_concurrency": 4, "timeout": 120.0},
+    "conversation_boundary": {"max_concurrency": 16, "timeout": 15.0},
+    "conversation_answer": {"max_concurrency": 16, "timeout": 45.0},
+    "conversation_follow_ups": {"max_concurrency": 16, "timeout": 15.0},
+    "conversation_state": {"max_concurrency": 8, "timeout": 90.0},
+    "pyq_generate": {"max_concurrency": 4, "timeout": 90.0},
+    "pyq_enhance": {"max_concurrency": 8, "timeout": 45.0},
+    "exam_plan": {"max_concurrency": 2, "timeout": 120.0},
+    "learning_kit": {"max_concurrency": 4, "timeout": 120.0},
+    "upload_learn_ocr": {"max_concurrency": 4, "timeout": 30.0},
+    "upload_learn": {"max_concurrency": 4, "timeout": 60.0},
+    "flashcard_concepts": {"max_concurrency": 4, "timeout": 45.0},
+    "flashcard_image": {"max_concurrency": 10, "timeout": 90.0},
+    "pyq_ingest": {"max_concurrency": 2, "timeout": 120.0},
+    "chat": {"max_concurrency": 8, "timeout": 60.0},
+    "rag_retrieve": {"max_concurrency": 16, "timeout": 30.0},
+    "conversation_answer_stream": {"max_concurrency": 16, "timeout": 60.0},
+    "conversation_embed": {"max_concurrency": 16, "timeout": 10.0},
+}
+
+# Number of recent latencies kept per call site for percentile metrics
+LATENCY_WINDOW = 200
+
+
+class LLMGateway:
+    """Run blocking model calls off the event loop with limits and metrics."""
+
+    def __init__(
+        self,
+        max_workers: int,
+        default_concurrency: int,
+        default_timeout: float,
+        call_site_limits: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        """
+        Initialize the gateway.
+
+        Args:
+            max_workers: Size of the shared thread pool
+            default_concurrency: Concurrency limit for unlisted call sites
+            default_timeout: Timeout (seconds) for unlisted call sites
+            call_site_limits: Per call site {"max_concurrency": int, "timeout": float}
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="llm-gateway"
+        )
+        self.default_concurrency = default_concurrency
+        self.default_timeout = default_timeout
+        self.call_site_limits: Dict[str, Dict[str, float]] = dict(call_site_limits or {})
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    def configure_call_site(
+        self,
+        call_site: str,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> None:
+        """
+        Override the limits of a call site.
+
+        Args:
+            call_site: Call site name (e.g., "scenario", "pyq_enhance")
+            max_concurrency: Max concurrent calls for this call site
+            timeout: Timeout in seconds for this call site
+        """
+        limits = self.call_site_limits.setdefault(call_site, {})
+        if max_concurrency is not None:
+            limits["max_concurrency"] = max_concurrency
+            # Recreated with the new limit on next use
+            self._semaphores.pop(call_site, None)
+        if timeout is not None:
+            limits["timeout"] = timeout
+
+    def _get_semaphore(self, call_site: str) -> asyncio.Semaphore:
+        """Get (or lazily create) the semaphore for a call site."""
+        semaphore = self._semaphores.get(call_site)
+        if semaphore is None:
+            limit = int(self.call_site_limits.get(call_site, {}).get(
+                "max_concurrency", self.default_concurrency
+            ))
+            semaphore = asyncio.Semaphore(max(1, limit))
+            self._semaphores[call_site] = semaphore
+        return semaphore
+
+    def _get_timeout(self, call_site: str, timeout: Optional[float]) -> float:
+        """Resolve the timeout for a call."""
+        if timeout is not None:
+            return timeout
+        return float(self.call_site_limits.get(call_site, {}).get("timeout", self.default_timeout))
+
+    def _site_metrics(self, call_site: str) -> Dict[str, Any]:
+        """Get (or lazily create) the metrics record for a call site."""
+        metrics = self._metrics.get(call_site)
+        if metrics is None:
+            metrics = {
+                "calls": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "in_flight": 0,
+                "total_latency": 0.0,
+                "max_latency": 0.0,
+                "recent": deque(maxlen=LATENCY_WINDOW),
+            }
+            self._metrics[call_site] = metrics
+        return metrics
+
+    async def run(
+        self,
+        call_site: str,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Run a blocking callable on the gateway thread pool.
+
+        Args:
+            call_site: Call site name used for limits and metrics
+            func: Blocking callable (e.g., model.generate_content)
+            *args: Positional arguments for func
+            timeout: Optional timeout override in seconds
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            Whatever func returns
+
+        Raises:
+            asyncio.TimeoutError: If the call exceeds its timeout
+        """
+        semaphore = self._get_semaphore(call_site)
+        call_timeout = self._get_timeout(call_site, timeout)
+        metrics = self._site_metrics(call_site)
+        loop = asyncio.get_running_loop()
+
+        async with semaphore:
+            metrics["in_flight"] += 1
+            start = time.perf_counter()
+            try:
+                # NOTE: on timeout the worker thread keeps running until the SDK
+                # returns; the bounded pool caps how many such threads can pile up.
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self.executor, partial(func, *args, **kwargs)),
+                    timeout=call_timeout
+                )
+            except asyncio.TimeoutError:
+                metrics["timeouts"] += 1
+                logger.warning(f"⏱️ LLM call timed out after {call_timeout:.1f}s (call site: {call_site})")
+                raise
+            except Exception:
+                metrics["errors"] += 1
+                raise
+            finally:
+                latency = time.perf_counter() - start
+                metrics["in_flight"] -= 1
+                metrics["calls"] += 1
+                metrics["total_latency"] += latency
+                metrics["max_latency"] = max(metrics["max_latency"], latency)
+                metrics["recent"].append(latency)
+                logger.debug(f"LLM call '{call_site}' finished in {latency:.2f}s")
+
+    async def generate(
+        self,
+        model: Any,
+        prompt: Any,
+        call_site: str = "default",
+        generation_config: Optional[Any] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Async wrapper around `model.generate_content(...)`.
+
+        Args:
+            model: Vertex AI or google.generativeai GenerativeModel
+            prompt: Prompt text (or list of parts)
+            call_site: Call site name used for limits and metrics
+            generation_config: Generation config passed through to the SDK
+            timeout: Optional timeout override in seconds
+            **kwargs: Extra arguments for generate_content
+
+        Returns:
+            The SDK response object
+        """
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        return await self.run(call_site, model.generate_content, prompt, timeout=timeout, **kwargs)
+
+    async def stream(
+        self,
+        model: Any,
+        prompt: Any,
+        call_site: str = "default",
+        generation_config: Optional[Any] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[str]:
+        """
+        Async wrapper around `model.generate_content(..., stream=True)`.
+
+        The SDK's chunk iterator blocks, so it is drained on the gateway thread
+        pool and each chunk's text is handed to the event loop as it arrives.
+        The call site's concurrency slot is held until the stream ends.
+
+        Args:
+            model: Vertex AI or google.generativeai GenerativeModel
+            prompt: Prompt text (or list of parts)
+            call_site: Call site name used for limits and metrics
+            generation_config: Generation config passed through to the SDK
+            timeout: Optional timeout override for the whole stream, in seconds
+            **kwargs: Extra arguments for generate_content
+
+        Yields:
+            Text of each streamed chunk
+
+        Raises:
+            asyncio.TimeoutError: If the stream does not finish within its timeout
+        """
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+
+        semaphore = self._get_semaphore(call_site)
+        call_timeout = self._get_timeout(call_site, timeout)
+        metrics = self._site_metrics(call_site)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce() -> None:
+            try:
+                for chunk in model.generate_content(prompt, stream=True, **kwargs):
+                    if stop.is_set():
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk with no text part (e.g. safety-blocked or finish metadata)
+                        text = ""
+                    if text:
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        async with semaphore:
+            metrics["in_flight"] += 1
+            start = time.perf_counter()
+            deadline = loop.time() + call_timeout
+            loop.run_in_executor(self.executor, produce)
+            try:
+                while True:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - loop.time()))
+                    if item is done:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            except asyncio.TimeoutError:
+                metrics["timeouts"] += 1
+                logger.warning(f"⏱️ LLM stream timed out after {call_timeout:.1f}s (call site: {call_site})")
+                raise
+            except Exception:
+                metrics["errors"] += 1
+                raise
+            finally:
+                # Also reached when the consumer stops early (e.g. client disconnected)
+                stop.set()
+                latency = time.perf_counter() - start
+                metrics["in_flight"] -= 1
+                metrics["calls"] += 1
+                metrics["total_latency"] += latency
+                metrics["max_latency"] = max(metrics["max_latency"], latency)
+                metrics["recent"].append(latency)
+                logger.debug(f"LLM stream '{call_site}' finished in {latency:.2f}s")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get per call site latency metrics."""
+        report = {}
+        for call_site, metrics in self._metrics.items():
+            recent = sorted(metrics["recent"])
+            calls = metrics["calls"]
+            report[call_site] = {
+                "calls": calls,
+                "errors": metrics["errors"],
+                "timeouts": metrics["timeouts"],
+                "in_flight": metrics["in_flight"],
+                "avg_latency": round(metrics["total_latency"] / calls, 3) if calls else 0.0,
+                "max_latency": round(metrics["max_latency"], 3),
+                "p50_latency": round(recent[len(recent) // 2], 3) if recent else 0.0,
+                "p95_latency": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else 0.0,
+                "max_concurrency": int(self.call_site_limits.get(call_site, {}).get(
+                    "max_concurrency", self.default_concurrency
+                )),
+            }
+        return report
+
+
+# Global gateway shared by every agent
+llm_gateway = LLMGateway(
+    max_workers=settings.LLM_MAX_WORKERS,
+    default_concurrency=settings.LLM_DEFAULT_CONCURRENCY,
+    default_timeout=settings.LLM_DEFAULT_TIMEOUT,
+    call_site_limits=DEFAULT_CALL_SITE_LIMITS
+)
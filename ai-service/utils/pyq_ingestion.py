@@ -13,12 +13,12 @@ import io
 import base64
 import hashlib
 
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel, Part
-from google.oauth2 import service_account
+from vertexai.preview.generative_models import Part
 
 from config.settings import settings
 from rag.retriever import RAGRetriever
+from utils.clients import clients
+from utils.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -28,31 +28,16 @@ class PYQIngestion:
     
     def __init__(self, rag_retriever: RAGRetriever):
         self.rag_retriever = rag_retriever
-        self.vision_model = None
-        self.model = None  # Text model for question extraction
-        
-        # Initialize Gemini Vision model
-        if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-            try:
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    
-                    vertexai.init(
-                        project=settings.GCP_PROJECT_ID,
-                        location=settings.GCP_LOCATION,
-                        credentials=credentials
-                    )
-                    # Vision model for image analysis
-                    self.vision_model = GenerativeModel("gemini-2.0-flash-exp")
-                    # Text model for question extraction
-                    self.model = GenerativeModel(settings.GENERATION_MODEL)
-                    logger.info("✅ Gemini Vision and Text models initialized for PYQ ingestion")
-                else:
-                    logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-            except Exception as e:
-                logger.error(f"Failed to initialize Gemini models: {e}")
+    
+    @property
+    def vision_model(self):
+        """Shared Gemini model for image analysis."""
+        return clients.generative_model("gemini-2.0-flash-exp")
+    
+    @property
+    def model(self):
+        """Shared text model for question extraction."""
+        return clients.generative_model()
     
     async def ingest_pdf(self, pdf_path: str, subject: str = "science", grade: int = 10) -> Dict[str, Any]:
         """
@@ -93,7 +78,7 @@ class PYQIngestion:
                         continue
                     
                     # Split text into questions (simple heuristic)
-                    questions = self._split_into_questions(text)
+                    questions = await self._split_into_questions(text)
                     
                     # Try to extract images from page
                     images = self._extract_images_from_page(page, page_num, pdf_filename)
@@ -158,6 +143,8 @@ class PYQIngestion:
                         questions_ingested += 1
                         logger.debug(f"✅ Ingested question {questions_ingested} from page {page_num + 1}")
             
+            self.rag_retriever.save_lexical_index()
+            
             logger.info(f"🎉 Ingestion complete: {questions_ingested} questions, {images_extracted} images from {pdf_filename}")
             
             return {
@@ -182,7 +169,7 @@ class PYQIngestion:
         match = re.search(r'20\d{2}', filename)
         return int(match.group()) if match else None
     
-    def _split_into_questions(self, text: str) -> List[Dict[str, Any]]:
+    async def _split_into_questions(self, text: str) -> List[Dict[str, Any]]:
         """
         Use Gemini to intelligently extract questions from page text.
         This handles complex formatting better than regex.
@@ -217,7 +204,11 @@ RULES:
 
 Return empty array [] if no questions found."""
 
-            response = self.model.generate_content(prompt)
+            response = await llm_gateway.generate(
+                self.model,
+                prompt,
+                call_site="pyq_ingest"
+            )
             response_text = response.text.strip()
             
             # Clean JSON
@@ -379,7 +370,11 @@ Provide a detailed description including:
 Be specific and educational. This description will help students understand the diagram."""
             
             # Call Gemini Vision
-            response = self.vision_model.generate_content([prompt, image_part])
+            response = await llm_gateway.generate(
+                self.vision_model,
+                [prompt, image_part],
+                call_site="pyq_ingest"
+            )
             
             analysis = response.text.strip()
             logger.info(f"✅ Image analyzed: {len(analysis)} characters")
@@ -0,0 +1,76 @@
+"""
+Service readiness (alive vs ready).
+
+startup_event only schedules the slow startup work, so the process answers
+GET /health (liveness) as soon as it accepts connections. The index
+download/open, agents and warm-up then run in the background in stages, and
+GET /ready reports ready once they are done. Until then the readiness gate
+in main.py answers API requests with a fast 503 + Retry-After instead of
+letting them hang or hit half-initialised globals.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Startup stages, in order
+STAGES = (
+    "starting",
+    "downloading_index",
+    "opening_index",
+    "initializing_agents",
+    "warming_up",
+    "ready",
+    "failed",
+)
+
+
+class Readiness:
+    """Current startup stage of this worker."""
+
+    def __init__(self):
+        self.stage = "starting"
+        self.error: Optional[str] = None
+        self._stage_started = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self.stage == "ready"
+
+    def set_stage(self, stage: str) -> None:
+        """Move to the next startup stage."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown startup stage: {stage}")
+        self.stage = stage
+        self._stage_started = time.monotonic()
+        logger.info(f"🚦 Startup stage: {stage}")
+
+    def mark_ready(self) -> None:
+        self.set_stage("ready")
+
+    def mark_failed(self, error: str) -> None:
+        """Startup failed: the worker never becomes ready (and /health turns 503)."""
+        self.error = error
+        self.set_stage("failed")
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get the readiness status.
+
+        Returns:
+            Dict with status ("ready", "starting" or "failed"), stage,
+            seconds in the current stage and the startup error, if any
+        """
+        status = self.stage if self.stage in ("ready", "failed") else "starting"
+        return {
+            "status": status,
+            "stage": self.stage,
+            "stage_seconds": round(time.monotonic() - self._stage_started, 1),
+            "error": self.error,
+        }
+
+
+# Global readiness of this worker
+readiness = Readiness()
@@ -0,0 +1,310 @@
+"""
+Semantic answer cache for conversation questions.
+
+Many students ask the same question in different words ("why is the sky
+blue", "why does the sky look blue?") within one topic. Answers are stored
+with the question's embedding, in a separate index per scope (topic, grade,
+subject, simulation state); a new question whose embedding is within
+SEMANTIC_CACHE_THRESHOLD cosine similarity of a stored one gets the stored
+answer, skipping the boundary check, RAG retrieval, answer and follow-up calls.
+
+Entries are held in process (per worker) with:
+- a per-scope cap (SEMANTIC_CACHE_MAX_PER_TOPIC)
+- a global LRU cap (SEMANTIC_CACHE_MAX_ENTRIES)
+- a TTL (SEMANTIC_CACHE_TTL)
+A scope's embeddings are the rows of one float32 NumPy matrix, so a lookup
+is a single matrix-vector product however many answers the scope holds.
+NumPy is imported on first use, not when this module is imported.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from utils.topic_catalog import normalize_subject, topic_catalog
+
+logger = logging.getLogger(__name__)
+
+# (canonical topic, grade, subject, simulation state fingerprint)
+Scope = Tuple[str, int, str, str]
+
+
+def build_scope(topic: str, grade: int, subject: str, simulation_state: Optional[Dict[str, Any]]) -> Scope:
+    """
+    Build the scope a question is cached under.
+
+    The simulation state is part of the prompt, so answers are only shared
+    between students looking at the same simulation values.
+
+    Args:
+        topic: Current topic (resolved through the topic catalog)
+        grade: Grade level
+        subject: Subject area
+        simulation_state: Simulation values sent with the question
+
+    Returns:
+        Scope tuple
+    """
+    state = ""
+    if simulation_state:
+        encoded = json.dumps(simulation_state, sort_keys=True, default=str)
+        state = hashlib.sha1(encoded.encode("utf-8")).hexdigest()[:16]
+    return (topic_catalog.resolve(topic, subject), grade, normalize_subject(subject), state)
+
+
+def normalize_question(question: str) -> str:
+    """Normalise a question for the exact-match fast path."""
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+
+class _Entry:
+    """One cached answer (its embedding is a row of the scope's matrix)."""
+
+    __slots__ = ("question", "response", "created_at", "hits")
+
+    def __init__(self, question: str, response: Dict[str, Any], created_at: float):
+        self.question = question
+        self.response = response
+        self.created_at = created_at
+        self.hits = 0
+
+
+class _ScopeIndex:
+    """
+    Answers cached for one scope.
+
+    Unit-length embeddings are the first len(row_ids) rows of a float32
+    matrix (grown by doubling), with their creation times alongside; removing
+    an entry moves the last row into its place.
+    """
+
+    def __init__(self):
+        self.entries: Dict[int, _Entry] = {}
+        self.exact: Dict[str, int] = {}  # normalised question -> entry ID
+        self.matrix: Any = None  # (capacity, dimensions) float32
+        self.created: Any = None  # (capacity,) float64
+        self.row_ids: List[int] = []  # row -> entry ID
+        self.rows: Dict[int, int] = {}  # entry ID -> row
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return None if self.matrix is None else self.matrix.shape[1]
+
+    def add(self, entry_id: int, entry: _Entry, vector: Any) -> None:
+        """Add an entry with its unit-length embedding."""
+        import numpy as np
+
+        size = len(self.row_ids)
+        if self.matrix is None:
+            self.matrix = np.empty((8, len(vector)), dtype=np.float32)
+            self.created = np.empty(8, dtype=np.float64)
+        elif size == self.matrix.shape[0]:
+            self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+            self.created = np.concatenate([self.created, np.empty_like(self.created)])
+        self.matrix[size] = vector
+        self.created[size] = entry.created_at
+        self.row_ids.append(entry_id)
+        self.rows[entry_id] = size
+        self.entries[entry_id] = entry
+
+    def remove(self, entry_id: int) -> None:
+        """Drop an entry from the index."""
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return
+        if self.exact.get(entry.question) == entry_id:
+            del self.exact[entry.question]
+        row = self.rows.pop(entry_id)
+        last = len(self.row_ids) - 1
+        if row != last:
+            moved = self.row_ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.created[row] = self.created[last]
+            self.row_ids[row] = moved
+            self.rows[moved] = row
+        self.row_ids.pop()
+
+    def expired(self, cutoff: float) -> List[int]:
+        """IDs of entries created before cutoff."""
+        import numpy as np
+
+        rows = np.flatnonzero(self.created[:len(self.row_ids)] < cutoff)
+        return [self.row_ids[row] for row in rows]
+
+    def best_match(self, query: Any) -> Tuple[Optional[int], float]:
+        """Entry most similar to a unit-length query: (entry ID, cosine similarity)."""
+        if not self.row_ids:
+            return None, 0.0
+        scores = self.matrix[:len(self.row_ids)] @ query
+        row = int(scores.argmax())
+        return self.row_ids[row], float(scores[row])
+
+
+class SemanticAnswerCache:
+    """Per-scope nearest-neighbour cache of tutor answers."""
+
+    def __init__(self, threshold: float, ttl: int, max_entries: int, max_per_scope: int):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit (0-1)
+            ttl: Seconds an answer is served for
+            max_entries: Entries kept across all scopes (least recently used evicted first)
+            max_per_scope: Entries kept per scope
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_per_scope = max_per_scope
+        self._scopes: Dict[Scope, _ScopeIndex] = {}
+        self._lru: "OrderedDict[int, Scope]" = OrderedDict()
+        self._ids = count()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def lookup_exact(self, scope: Scope, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Find an answer to the same question text, without embedding it.
+
+        Args:
+            scope: Scope from build_scope
+            question: Student's question
+
+        Returns:
+            Cached ConversationResponse dict, or None
+        """
+        index = self._scopes.get(scope)
+        if index is None:
+            return None
+        entry_id = index.exact.get(normalize_question(question))
+        if entry_id is None or not self._is_live(scope, entry_id):
+            return None
+        self.stats["exact_hits"] += 1
+        return self._hit(entry_id, index.entries[entry_id])
+
+    def lookup(self, scope: Scope, embedding: Sequence[float]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Find the most similar cached question in a scope.
+
+        Args:
+            scope: Scope from build_scope
+            embedding: Embedding of the new question
+
+        Returns:
+            (cached ConversationResponse dict, similarity), or None
+        """
+        index = self._scopes.get(scope)
+        query = self._normalize(embedding)
+        best_id, best_score = None, 0.0
+        if index is not None and query is not None and index.dimensions == len(query):
+            for entry_id in index.expired(time.time() - self.ttl):
+                self._remove(scope, entry_id)
+            best_id, best_score = index.best_match(query)
+        if best_id is None or best_score < self.threshold:
+            self.stats["misses"] += 1
+            return None
+        self.stats["semantic_hits"] += 1
+        return self._hit(best_id, index.entries[best_id]), best_score
+
+    def store(self, scope: Scope, question: str, embedding: Sequence[float], response: Dict[str, Any]) -> None:
+        """
+        Cache an answer.
+
+        Args:
+            scope: Scope from build_scope
+            question: Student's question
+            embedding: Embedding of the question
+            response: ConversationResponse dict (model_dump)
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        index = self._scopes.get(scope)
+        if index is not None and index.dimensions != len(vector):
+            return  # Another embedding space than the scope's entries
+        key = normalize_question(question)
+        if index is not None and key in index.exact:
+            self._remove(scope, index.exact[key])
+        # Setdefault again: removing the scope's only entry drops the scope
+        index = self._scopes.setdefault(scope, _ScopeIndex())
+
+        entry_id = next(self._ids)
+        index.add(entry_id, _Entry(key, response, time.time()), vector)
+        index.exact[key] = entry_id
+        self._lru[entry_id] = scope
+        self.stats["stores"] += 1
+
+        while len(index.entries) > self.max_per_scope:
+            oldest = next(entry for entry in self._lru if self._lru[entry] == scope)
+            self._remove(scope, oldest)
+            self.stats["evictions"] += 1
+        while len(self._lru) > self.max_entries:
+            oldest, oldest_scope = next(iter(self._lru.items()))
+            self._remove(oldest_scope, oldest)
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        self._scopes.clear()
+        self._lru.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, size and hit rate."""
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._lru),
+            "scopes": len(self._scopes),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+    def _hit(self, entry_id: int, entry: _Entry) -> Dict[str, Any]:
+        """Record a hit and return the entry's answer."""
+        entry.hits += 1
+        self._lru.move_to_end(entry_id)
+        return entry.response
+
+    def _is_live(self, scope: Scope, entry_id: int) -> bool:
+        """Check an entry's TTL, removing it if it has expired."""
+        entry = self._scopes[scope].entries[entry_id]
+        if time.time() - entry.created_at < self.ttl:
+            return True
+        self._remove(scope, entry_id)
+        return False
+
+    def _remove(self, scope: Scope, entry_id: int) -> None:
+        """Remove an entry from its scope and the LRU."""
+        index = self._scopes.get(scope)
+        if index is not None:
+            index.remove(entry_id)
+            if not index.entries:
+                del self._scopes[scope]
+        self._lru.pop(entry_id, None)
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> Any:
+        """Scale to unit length (so a dot product is the cosine similarity); None for a zero vector."""
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if not norm:
+            return None
+        return vector / norm
+
+
+# Global cache shared by the conversation endpoints
+semantic_answer_cache = SemanticAnswerCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    max_per_scope=settings.SEMANTIC_CACHE_MAX_PER_TOPIC
+)
@@ -0,0 +1,206 @@
+"""
+Startup and import-time profile.
+
+Cold starts (every Cloud Run / Render scale-out) are dominated by module
+imports and startup_event work, so both are measured:
+- StartupProfile records how long main.py's imports and each startup phase
+  took, the time until the service was ready, and which heavy SDKs have
+  been imported so far (never by the imports themselves: they load in the
+  background startup stages or on first use). Exposed at
+  GET /api/startup/stats.
+- import_time_report() runs `python -X importtime -c "import main"` in a
+  fresh interpreter and sums the import cost per top-level package; the
+  CLI also flags any HEAVY_MODULES that the import pulled in.
+
+USAGE:
+    python -m utils.startup_profile            # top 25 packages by import time
+    python -m utils.startup_profile --top 50
+"""
+
+import logging
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Imported first thing by main.py, so this is (close to) interpreter start
+PROCESS_START = time.perf_counter()
+
+# Heavy optional SDKs that should only load on the first request needing them
+HEAVY_MODULES = (
+    "chromadb",
+    "numpy",
+    "vertexai",
+    "google.cloud.aiplatform",
+    "google.cloud.texttospeech",
+    "google.cloud.vision",
+    "google.cloud.storage",
+    "google.generativeai",
+    "PIL",
+    "PyPDF2",
+    "diskcache",
+)
+
+
+class StartupProfile:
+    """Wall-clock timings of one worker's startup."""
+
+    def __init__(self, started: float = PROCESS_START):
+        self.started = started
+        self.marks: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+
+    def _elapsed_ms(self, since: float) -> float:
+        return round((time.perf_counter() - since) * 1000, 1)
+
+    def mark(self, name: str) -> None:
+        """Record the time since process start under a name (e.g. "imports")."""
+        self.marks[name] = self._elapsed_ms(self.started)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block of startup work."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self._elapsed_ms(start)
+
+    def mark_ready(self) -> None:
+        """Record the time from process start until the service can take traffic."""
+        self.ready_ms = self._elapsed_ms(self.started)
+        slowest = sorted(self.phases.items(), key=lambda item: item[1], reverse=True)[:3]
+        logger.info(
+            f"⏱️ Ready in {self.ready_ms:.0f} ms (imports {self.marks.get('imports', 0):.0f} ms; "
+            f"slowest phases: {', '.join(f'{name} {ms:.0f} ms' for name, ms in slowest) or 'none'})"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the startup timings.
+
+        Returns:
+            Dict with marks_ms, phases_ms, time_to_ready_ms and the heavy
+            modules already loaded / still deferred in this worker
+        """
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        return {
+            "marks_ms": dict(self.marks),
+            "phases_ms": dict(self.phases),
+            "time_to_ready_ms": self.ready_ms,
+            "heavy_modules_loaded": loaded,
+            "heavy_modules_deferred": [name for name in HEAVY_MODULES if name not in loaded],
+        }
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    Sum `-X importtime` output per top-level package.
+
+    Args:
+        output: stderr of `python -X importtime ...`
+
+    Returns:
+        Rows sorted by self time: package, self_ms (time spent importing the
+        package's own modules) and modules (count)
+    """
+    packages: Dict[str, Dict[str, Any]] = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Header line
+        package = parts[2].strip().split(".")[0]
+        row = packages.setdefault(package, {"package": package, "self_ms": 0.0, "modules": 0})
+        row["self_ms"] += int(parts[0]) / 1000
+        row["modules"] += 1
+
+    rows = sorted(packages.values(), key=lambda row: row["self_ms"], reverse=True)
+    for row in rows:
+        row["self_ms"] = round(row["self_ms"], 1)
+    return rows
+
+
+def run_importtime(module: str = "main", python: str = sys.executable) -> str:
+    """
+    Import a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module: Module to import (run from the ai-service directory)
+        python: Interpreter to use
+
+    Returns:
+        The importtime output (stderr)
+
+    Raises:
+        RuntimeError: If the module fails to import
+    """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(Path(__file__).parent.parent),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        error = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"import {module} failed: {' '.join(error[-3:])}")
+    return result.stderr
+
+
+def heavy_modules_imported(output: str) -> List[str]:
+    """Entries of HEAVY_MODULES that appear in `-X importtime` output."""
+    imported = {line.rsplit("|", 1)[-1].strip() for line in output.splitlines() if line.startswith("import time:")}
+    return [name for name in HEAVY_MODULES if name in imported]
+
+
+def import_time_report(module: str = "main", python: str = sys.executable) -> List[Dict[str, Any]]:
+    """
+    Measure the import cost of a module in a fresh interpreter.
+
+    Args:
+        module: Module to import (run from the ai-service directory)
+        python: Interpreter to use
+
+    Returns:
+        Rows from parse_importtime()
+
+    Raises:
+        RuntimeError: If the module fails to import
+    """
+    return parse_importtime(run_importtime(module, python))
+
+
+# Global profile of this worker's startup
+startup_profile = StartupProfile()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    parser = argparse.ArgumentParser(description="Import cost per top-level package (python -X importtime)")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=25, help="Packages to list (default: 25)")
+    args = parser.parse_args()
+
+    output = run_importtime(args.module)
+    rows = parse_importtime(output)
+    total = sum(row["self_ms"] for row in rows)
+    logger.info(f"⏱️ import {args.module}: {total:.0f} ms over {sum(row['modules'] for row in rows)} modules")
+    logger.info(f"{'package':<28}{'ms':>10}{'share':>8}{'modules':>9}")
+    for row in rows[:args.top]:
+        share = row["self_ms"] / total if total else 0.0
+        logger.info(f"{row['package']:<28}{row['self_ms']:>10.1f}{share:>8.0%}{row['modules']:>9}")
+
+    heavy = heavy_modules_imported(output)
+    if heavy:
+        logger.warning(f"⚠️ Heavy SDKs imported by {args.module}: {', '.join(heavy)}")
+    else:
+        logger.info(f"✅ No heavy SDKs imported by {args.module} (deferred: {', '.join(HEAVY_MODULES)})")
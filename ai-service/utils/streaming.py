@@ -0,0 +1,63 @@
+"""
+Server-sent events (SSE) helpers for streaming endpoints.
+
+Agents yield (event, data) tuples; these helpers turn them into a
+`text/event-stream` response the browser's EventSource / fetch reader can consume.
+"""
+
+import json
+import logging
+from typing import Any, AsyncIterator, Tuple
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Headers that stop proxies (nginx, Render) from buffering the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format one server-sent event.
+
+    Args:
+        event: Event name (e.g., "token", "final")
+        data: JSON-serialisable payload or pydantic model
+
+    Returns:
+        SSE frame terminated by a blank line
+    """
+    if isinstance(data, BaseModel):
+        data = data.model_dump(mode="json", by_alias=True)
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """
+    Wrap an async iterator of (event, data) tuples in an SSE response.
+
+    An exception raised mid-stream is sent as an "error" event, since the
+    HTTP status has already gone out with the first event.
+
+    Args:
+        events: Async iterator yielding (event name, payload)
+
+    Returns:
+        StreamingResponse with media type text/event-stream
+    """
+    async def body() -> AsyncIterator[str]:
+        try:
+            async for event, data in events:
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"❌ Error while streaming: {e}")
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,255 @@
+"""
+Canonical NCERT topic catalog used to normalise cache keys.
+
+Clients send free-text topics, so "Reflection of light", "reflection of light "
+and "Light - Reflection" used to be three cache keys (and three Gemini
+generations). The catalog maps a topic to a stable ID:
+
+1. the text is normalised (case, punctuation, stopwords, plurals, word order)
+2. an exact match against known chapters and their aliases gives a catalog ID
+   like "physics.ray-optics"
+3. otherwise a close fuzzy match (typos, small wording changes) does
+4. otherwise the normalised text itself is the ID
+
+Resolution is deterministic and depends only on the catalog contents, so every
+worker builds the same key for the same request.
+"""
+
+import difflib
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words that do not change which chapter a topic refers to
+STOPWORDS = {"a", "an", "and", "the", "of", "in", "on", "to", "for", "with", "its", "chapter", "ch"}
+
+SUBJECT_ALIASES = {
+    "maths": "mathematics",
+    "math": "mathematics",
+    "phy": "physics",
+    "chem": "chemistry",
+    "bio": "biology",
+}
+
+# Common names for catalog chapters that normalisation alone cannot match
+TOPIC_ALIASES: Dict[Tuple[str, str], List[str]] = {
+    ("physics", "Electromagnetic Induction"): ["emi", "faraday law", "induction"],
+    ("physics", "Alternating Current"): ["ac", "ac circuits"],
+    ("physics", "Electromagnetic Waves"): ["em waves", "emw"],
+    ("physics", "Ray Optics"): ["reflection and refraction", "geometrical optics"],
+    ("physics", "Kinetic Theory"): ["kinetic theory of gases", "ktg"],
+    ("physics", "Oscillations and Waves"): ["shm", "simple harmonic motion"],
+    ("chemistry", "Chemical Bonding"): ["chemical bonding and molecular structure"],
+    ("chemistry", "Redox Reactions"): ["redox", "oxidation and reduction"],
+    ("chemistry", "Coordination Compounds"): ["complex compounds"],
+    ("mathematics", "Calculus - Limits"): ["limits and derivatives"],
+    ("mathematics", "Calculus - Integration"): ["integrals", "integral calculus"],
+    ("mathematics", "Linear Programming"): ["lpp"],
+    ("mathematics", "Differential Equations"): ["ode"],
+}
+
+# Minimum difflib ratio for a fuzzy match; high enough that neighbouring
+# chapters ("Wave Optics" / "Ray Optics") never collapse into one key
+FUZZY_CUTOFF = 0.88
+
+# Resolutions remembered per worker before the memo is reset
+MAX_MEMO = 4096
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalise free text into a stable, order-independent token string.
+
+    Args:
+        text: Topic or chapter name (e.g., "Light - Reflection")
+
+    Returns:
+        Sorted, singularised tokens joined by "-" (e.g., "light-reflection")
+    """
+    text = text.lower().replace("&", " and ")
+    tokens = re.findall(r"[a-z0-9]+", text)
+    words = set()
+    for token in tokens:
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        words.add(token)
+    return "-".join(sorted(words))
+
+
+def normalize_subject(subject: str) -> str:
+    """Normalise a subject name ("Maths " -> "mathematics")."""
+    subject = " ".join(re.findall(r"[a-z0-9]+", subject.lower()))
+    return SUBJECT_ALIASES.get(subject, subject)
+
+
+def slugify(text: str) -> str:
+    """Readable slug that keeps word order ("Ray Optics" -> "ray-optics")."""
+    return "-".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class TopicCatalog:
+    """Map free-text topics to canonical chapter IDs."""
+
+    def __init__(self):
+        self.chapters: Dict[str, Dict[str, Any]] = {}  # ID -> {"name", "subject", "grades"}
+        self.subjects: Set[str] = set()
+        self._index: Dict[str, Set[str]] = {}  # normalised name/alias -> IDs
+        self._memo: Dict[Tuple[str, Optional[str]], Tuple[str, str]] = {}
+        self.stats = {"exact": 0, "alias": 0, "fuzzy": 0, "unknown": 0}
+
+    def add_chapter(
+        self,
+        subject: str,
+        name: str,
+        grade: Optional[int] = None,
+        aliases: Iterable[str] = ()
+    ) -> str:
+        """
+        Register a chapter and its aliases.
+
+        Args:
+            subject: Subject name
+            name: Chapter name
+            grade: Grade the chapter is taught in (optional)
+            aliases: Other names for the chapter
+
+        Returns:
+            The chapter's catalog ID
+        """
+        subject = normalize_subject(subject)
+        chapter_id = f"{slugify(subject)}.{slugify(name)}"
+        chapter = self.chapters.setdefault(chapter_id, {"name": name, "subject": subject, "grades": set()})
+        if grade is not None:
+            chapter["grades"].add(grade)
+        self.subjects.add(subject)
+
+        names = [name, *aliases]
+        # "Calculus - Integration" is also asked for as "Integration"
+        if " - " in name:
+            names.extend(part for part in name.split(" - ")[1:])
+        for alias in names:
+            key = normalize_text(alias)
+            if key:
+                self._index.setdefault(key, set()).add(chapter_id)
+        self._memo.clear()
+        return chapter_id
+
+    def add_priority_data(self, priority_data: Dict[str, Dict[int, Dict[str, Any]]]) -> int:
+        """
+        Seed the catalog from NCERT_PRIORITY_DATA ({subject: {grade: {chapter: ...}}}).
+
+        Returns:
+            Number of chapters registered
+        """
+        count = 0
+        for subject, grades in priority_data.items():
+            for grade, chapters in grades.items():
+                for name in chapters:
+                    self.add_chapter(
+                        subject,
+                        name,
+                        grade,
+                        TOPIC_ALIASES.get((normalize_subject(subject), name), ())
+                    )
+                    count += 1
+        return count
+
+    def add_from_vector_store(self, vector_store: Any) -> int:
+        """
+        Seed the catalog from the chapter metadata of the indexed NCERT chunks.
+
+        Args:
+            vector_store: Vector store whose chunks carry subject/grade/chapter metadata
+
+        Returns:
+            Number of distinct chapters found
+        """
+        metadatas = vector_store.get_all_metadatas()
+        seen = set()
+        for meta in metadatas:
+            subject = str(meta.get("subject") or "")
+            chapter = str(meta.get("chapter") or "")
+            key = (subject, chapter, meta.get("grade"))
+            if key in seen or not subject or not chapter:
+                continue
+            seen.add(key)
+            # Chapters named after the book ("science") say nothing about the topic
+            if normalize_text(chapter) in ("", normalize_text(subject)):
+                continue
+            grade = meta.get("grade")
+            self.add_chapter(subject, chapter, grade if isinstance(grade, int) else None)
+        return len(seen)
+
+    def resolve(self, topic: str, subject: Optional[str] = None) -> str:
+        """
+        Resolve a topic to its canonical ID.
+
+        Args:
+            topic: Free-text topic, or an ID previously returned by resolve()
+            subject: Subject, used to pick between chapters with the same name
+
+        Returns:
+            Catalog ID ("physics.ray-optics"), or the normalised text if the
+            topic is not in the catalog
+        """
+        if topic in self.chapters:
+            return topic
+        subject = normalize_subject(subject) if subject else None
+        memo_key = (topic, subject)
+        memo = self._memo.get(memo_key)
+        if memo is None:
+            memo = self._resolve(normalize_text(topic), subject)
+            if len(self._memo) >= MAX_MEMO:
+                self._memo.clear()
+            self._memo[memo_key] = memo
+        resolved, kind = memo
+        self.stats[kind] += 1
+        return resolved
+
+    def _resolve(self, key: str, subject: Optional[str]) -> Tuple[str, str]:
+        """Look up a normalised topic: exact, then fuzzy, then itself. Returns (ID, match kind)."""
+        if not key:
+            return key, "unknown"
+
+        match = self._pick(self._index.get(key, set()), subject)
+        if match:
+            kind = "exact" if normalize_text(self.chapters[match]["name"]) == key else "alias"
+            return match, kind
+
+        candidates = [
+            candidate for candidate, ids in self._index.items()
+            if self._pick(ids, subject)
+        ]
+        for close in difflib.get_close_matches(key, candidates, n=1, cutoff=FUZZY_CUTOFF):
+            match = self._pick(self._index[close], subject)
+            logger.debug(f"Topic '{key}' matched '{close}' ({match})")
+            return match, "fuzzy"
+
+        return key, "unknown"
+
+    def _pick(self, ids: Set[str], subject: Optional[str]) -> Optional[str]:
+        """Choose one ID, narrowing by subject when several chapters share a name."""
+        if subject and subject in self.subjects:
+            ids = {chapter_id for chapter_id in ids if self.chapters[chapter_id]["subject"] == subject}
+        if len(ids) == 1:
+            return next(iter(ids))
+        # Ambiguous (e.g. "Thermodynamics" without a subject): no single chapter
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Catalog size and how topics have been resolved so far."""
+        resolved = sum(self.stats.values())
+        return {
+            "chapters": len(self.chapters),
+            "aliases": len(self._index),
+            "resolutions": dict(self.stats),
+            "catalog_match_rate": round((resolved - self.stats["unknown"]) / resolved, 3) if resolved else 0.0,
+        }
+
+
+# Global catalog, seeded at startup
+topic_catalog = TopicCatalog()
@@ -2,12 +2,9 @@
 Google Cloud Text-to-Speech Service
 """
 import logging
-import os
 import re
 from typing import Optional
-from google.cloud import texttospeech
-from google.oauth2 import service_account
-from config.settings import settings
+from utils.clients import clients
 
 logger = logging.getLogger(__name__)
 
@@ -132,24 +129,10 @@ def sanitize_text_for_tts(text: str) -> str:
 class TTSService:
     """Text-to-Speech service using Google Cloud TTS"""
     
-    def __init__(self):
-        self.client = None
-        self._initialize_client()
-    
-    def _initialize_client(self):
-        """Initialize Google Cloud TTS client"""
-        try:
-            if settings.GCP_PROJECT_ID and settings.GOOGLE_APPLICATION_CREDENTIALS:
-                if os.path.exists(settings.GOOGLE_APPLICATION_CREDENTIALS):
-                    credentials = service_account.Credentials.from_service_account_file(
-                        settings.GOOGLE_APPLICATION_CREDENTIALS
-                    )
-                    self.client = texttospeech.TextToSpeechClient(credentials=credentials)
-                    logger.info("✅ Google Cloud TTS client initialized")
-                else:
-                    logger.error(f"Credentials file not found: {settings.GOOGLE_APPLICATION_CREDENTIALS}")
-        except Exception as e:
-            logger.error(f"Failed to initialize TTS client: {e}")
+    @property
+    def client(self):
+        """Shared Google Cloud TTS client, created on first use (None if unavailable)"""
+        return clients.tts_client()
     
     def _chunk_text_by_bytes(self, text: str, max_bytes: int = 4800) -> list:
         """
@@ -232,6 +215,8 @@ class TTSService:
             logger.error("TTS client not initialized - check GCP credentials")
             raise Exception("TTS service not initialized")
         
+        from google.cloud import texttospeech
+        
         try:
             # Auto-select voice based on language if not provided
             if not voice_name:
@@ -107,6 +107,13 @@ export interface PYQQuestion {
   pageNumber?: number;
 }
 
+export interface DerivationsResponse {
+  topic: string;
+  grade: number;
+  formulasAndDerivationsMarkdown: string;
+  available: boolean;
+}
+
 export interface PYQResponse {
   questions: PYQQuestion[];
   totalCount: number;
@@ -257,6 +264,39 @@ export async function fetchPracticeQuestions(
   }
 }
 
+// Fetch formulas and derivations for a topic (generated separately from the scenario)
+export async function fetchDerivations(
+  topic: string,
+  grade: number,
+  subject: string,
+  token: string
+): Promise<DerivationsResponse> {
+  const language = useTranslationStore.getState().currentLanguage;
+  console.log(`📐 Fetching formulas and derivations for: ${topic}`);
+
+  const response = await fetch(`${API_URL}/ai/scenario/derivations`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Authorization': `Bearer ${token}`,
+      'x-language': language
+    },
+    body: JSON.stringify({
+      topic: topic,
+      grade: grade,
+      subject: subject
+    })
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.message || `HTTP ${response.status}: ${response.statusText}`);
+  }
+
+  const data = await response.json();
+  return data.data;
+}
+
 // Check AI service health
 export async function checkAIServiceHealth(): Promise<boolean> {
   try {
@@ -2,7 +2,7 @@
 import { create } from 'zustand';
 import { LearningScenario, findScenarioForQuestion } from './mockData';
 import { toast } from 'sonner';
-import { generateAIScenario, AIScenarioResponse, fetchPracticeQuestions, PYQResponse } from './aiService';
+import { generateAIScenario, AIScenarioResponse, fetchPracticeQuestions, fetchDerivations, PYQResponse } from './aiService';
 
 interface StudyNote {
   id: string;
@@ -288,6 +288,23 @@ export const useLearningStore = create<LearningState>((set, get) => ({
         description: aiData.title
       });
 
+      // Derivations are generated separately - load them without blocking the scenario
+      if (!scenario.derivations) {
+        fetchDerivations(topic, 10, 'science', token)
+          .then((derivations) => {
+            const { currentScenario } = get();
+            if (derivations.available && currentScenario?.id === scenario.id) {
+              set({
+                currentScenario: {
+                  ...currentScenario,
+                  derivations: derivations.formulasAndDerivationsMarkdown
+                }
+              });
+            }
+          })
+          .catch((error) => console.error('❌ Failed to load derivations:', error));
+      }
+
     } catch (error) {
       console.error('❌ Failed to generate AI scenario:', error);
       toast.error('AI service unavailable. Using legacy mode.');
@@ -93,6 +93,171 @@ router.post('/scenario/generate', authenticateToken, scenarioValidation, async (
   }
 });
 
+// @route   POST /api/ai/scenario/generate/stream
+// @desc    Stream scenario sections as they are generated (server-sent events, not translated)
+// @access  Private
+router.post('/scenario/generate/stream', authenticateToken, scenarioValidation, async (req, res) => {
+  try {
+    // Validate input
+    const errors = validationResult(req);
+    if (!errors.isEmpty()) {
+      return res.status(400).json({
+        success: false,
+        errors: errors.array()
+      });
+    }
+
+    const { grade, subject, topic, difficulty } = req.body;
+
+    console.log(`🤖 AI Service: Streaming scenario for ${subject} - ${topic} (Grade ${grade})`);
+
+    const response = await axios.post(`${AI_SERVICE_URL}/api/scenario/generate/stream`, {
+      grade,
+      subject,
+      topic,
+      student_id: req.user._id.toString(),
+      difficulty: difficulty || 'medium'
+    }, {
+      responseType: 'stream',
+      timeout: 300000
+    });
+
+    res.setHeader('Content-Type', 'text/event-stream');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('Connection', 'keep-alive');
+    res.setHeader('X-Accel-Buffering', 'no');
+    res.flushHeaders();
+
+    res.on('close', () => response.data.destroy());
+    response.data.pipe(res);
+
+  } catch (error) {
+    console.error('❌ AI Service Stream Error:', error.message);
+
+    if (error.code === 'ECONNREFUSED') {
+      return res.status(503).json({
+        success: false,
+        message: 'AI service is not available. Please ensure the AI service is running on port 8001.'
+      });
+    }
+
+    res.status(error.response?.status || 500).json({
+      success: false,
+      message: 'Failed to stream scenario',
+      error: error.message
+    });
+  }
+});
+
+// @route   POST /api/ai/scenario/derivations
+// @desc    Get formulas and derivations for a topic (shared across scenarios on the topic)
+// @access  Private
+router.post('/scenario/derivations', authenticateToken, async (req, res) => {
+  try {
+    const { grade, subject, topic } = req.body;
+
+    if (!grade || !topic) {
+      return res.status(400).json({
+        success: false,
+        message: 'Grade and topic are required'
+      });
+    }
+
+    const response = await axios.post(`${AI_SERVICE_URL}/api/scenario/derivations`, {
+      grade,
+      subject,
+      topic
+    }, {
+      timeout: 300000 // Derivations are a long (8k token) generation on a cold cache
+    });
+
+    // Translate response if requested
+    const targetLanguage = req.headers['x-language'] || 'en';
+    const translatedData = targetLanguage !== 'en'
+      ? await translateObject(response.data, targetLanguage)
+      : response.data;
+
+    res.json({
+      success: true,
+      data: translatedData
+    });
+
+  } catch (error) {
+    console.error('❌ AI Service Derivations Error:', error.message);
+
+    if (error.response) {
+      return res.status(error.response.status).json({
+        success: false,
+        message: error.response.data?.detail || 'AI service error',
+        error: error.response.data
+      });
+    }
+
+    res.status(500).json({
+      success: false,
+      message: 'Failed to get derivations',
+      error: error.message
+    });
+  }
+});
+
+// @route   POST /api/ai/conversation/guide/stream
+// @desc    Stream conversational guidance from AI (server-sent events, not translated)
+// @access  Private
+router.post('/conversation/guide/stream', authenticateToken, conversationValidation, async (req, res) => {
+  try {
+    // Validate input
+    const errors = validationResult(req);
+    if (!errors.isEmpty()) {
+      return res.status(400).json({
+        success: false,
+        errors: errors.array()
+      });
+    }
+
+    const { scenario_id, current_task_id, student_input, context, session_history } = req.body;
+
+    console.log(`🤖 AI Service: Streaming guidance for task ${current_task_id}`);
+
+    const response = await axios.post(`${AI_SERVICE_URL}/api/conversation/guide/stream`, {
+      scenario_id,
+      current_task_id,
+      student_input,
+      context: context || {},
+      session_history: session_history || []
+    }, {
+      responseType: 'stream',
+      timeout: 300000
+    });
+
+    res.setHeader('Content-Type', 'text/event-stream');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('Connection', 'keep-alive');
+    res.setHeader('X-Accel-Buffering', 'no');
+    res.flushHeaders();
+
+    // Stop generating if the student navigates away
+    res.on('close', () => response.data.destroy());
+    response.data.pipe(res);
+
+  } catch (error) {
+    console.error('❌ AI Service Stream Error:', error.message);
+
+    if (error.code === 'ECONNREFUSED') {
+      return res.status(503).json({
+        success: false,
+        message: 'AI service is not available'
+      });
+    }
+
+    res.status(error.response?.status || 500).json({
+      success: false,
+      message: 'Failed to stream guidance',
+      error: error.message
+    });
+  }
+});
+
 // @route   POST /api/ai/conversation/guide
 // @desc    Get conversational guidance from AI
 // @access  Private
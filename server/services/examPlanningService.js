@@ -332,7 +332,8 @@ async function buildCompleteLearningKit(dayPlan, examBoard, grade) {
         topic: topic.toLowerCase(),
         grade: grade,
         student_id: 'exam-planner',
-        difficulty: 'medium'
+        difficulty: 'medium',
+        includeDerivations: true // The learning kit needs formulas/derivations up front
       }, {
         timeout: 3000000
       });